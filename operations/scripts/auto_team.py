@@ -3,56 +3,41 @@
 from __future__ import annotations
 
 import argparse
+import contextvars
 import json
-import subprocess
 import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import date, datetime, timezone
 from pathlib import Path
 
+import run_log
+import runtime
+import task_store
+import worktree_pool
+
 ROOT = Path(__file__).resolve().parents[2]
 TASKS_DIR = ROOT / "operations" / "hub" / "tasks"
 REPORTS_DIR = ROOT / "deliverables" / "reports"
 RUNNER_PATH = Path(__file__).resolve().parent / "runner.py"
 
 
-def task_files() -> list[Path]:
-    return sorted(p for p in TASKS_DIR.glob("*.json") if p.name != "task-template.json")
+def store() -> task_store.TaskStore:
+    return task_store.get_store(TASKS_DIR)
 
 
 def read_task(task_id: str) -> dict:
-    p = TASKS_DIR / f"{task_id}.json"
-    if not p.exists():
+    task = store().get(task_id)
+    if task is None:
         raise ValueError(f"Task not found: {task_id}")
-    return json.loads(p.read_text(encoding="utf-8"))
+    return task
 
 
 def write_task(task: dict) -> None:
-    p = TASKS_DIR / f"{task['id']}.json"
-    p.write_text(json.dumps(task, indent=2) + "\n", encoding="utf-8")
-
-
-def all_tasks() -> list[dict]:
-    return [json.loads(p.read_text(encoding="utf-8")) for p in task_files()]
-
-
-def can_start(task: dict, tasks: list[dict]) -> bool:
-    deps = task.get("depends_on", [])
-    if not deps:
-        return True
-    by_id = {t["id"]: t for t in tasks}
-    return all(dep in by_id and by_id[dep].get("status") == "done" for dep in deps)
+    store().put(task)
 
 
-def latest_in_progress(tasks: list[dict]) -> dict | None:
-    in_progress = [t for t in tasks if t.get("status") == "in_progress"]
-    if not in_progress:
-        return None
-    in_progress.sort(key=lambda t: t.get("id", ""))
-    return in_progress[-1]
-
-
-def start_next_todo(tasks: list[dict]) -> dict | None:
-    candidate = next((t for t in tasks if t.get("status") == "todo" and can_start(t, tasks)), None)
+def start_next_todo() -> dict | None:
+    candidate = store().first_runnable()
     if candidate is None:
         return None
     candidate["status"] = "in_progress"
@@ -64,12 +49,13 @@ def run_runner(task_id: str, dry_run: bool) -> dict:
     cmd = [sys.executable, str(RUNNER_PATH), task_id]
     if dry_run:
         cmd.append("--dry-run")
-    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    proc, log = run_log.run(cmd, f"runner-{task_id}", cwd=ROOT, env=runtime.environ())
     return {
         "ok": proc.returncode == 0,
         "returncode": proc.returncode,
         "stdout": proc.stdout.strip(),
         "stderr": proc.stderr.strip(),
+        "log": log,
     }
 
 
@@ -125,6 +111,8 @@ def evaluate_and_qa(task: dict, runner_result: dict, runner_report: dict, skip_q
             details = "\n".join([x for x in [err, apply_err] if x]).strip()
             if details:
                 note = f"{note}\n{details}"
+        if runner_result.get("log"):
+            note = f"{note}\nFull runner log: {runner_result['log'].get('stderr')} / {runner_result['log'].get('stdout')}"
         report_path = qa_task(task, "FAIL", note)
         return {"qa": "FAIL", "note": note, "report": str(report_path.relative_to(ROOT))}
 
@@ -143,24 +131,10 @@ def evaluate_and_qa(task: dict, runner_result: dict, runner_report: dict, skip_q
     return {"qa": "CONDITIONAL", "note": note, "report": str(report_path.relative_to(ROOT))}
 
 
-def run(task_id: str | None, dry_run: bool, skip_qa: bool) -> int:
-    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
-    tasks = all_tasks()
-
-    selected = read_task(task_id) if task_id else latest_in_progress(tasks)
-    started_new = False
-    if selected is None:
-        selected = start_next_todo(tasks)
-        started_new = selected is not None
-
-    if selected is None:
-        print("No runnable task found")
-        return 0
-
-    task_id_value = str(selected["id"])
-    runner_result = run_runner(task_id_value, dry_run=dry_run)
+def finish_task(task_id_value: str, started_new: bool, runner_result: dict, skip_qa: bool) -> dict:
     runner_report = read_runner_report(task_id_value)
     fresh_task = read_task(task_id_value)
+    runtime.set_stage("qa")
     qa_result = evaluate_and_qa(fresh_task, runner_result, runner_report, skip_qa=skip_qa)
 
     summary = {
@@ -180,21 +154,117 @@ def run(task_id: str | None, dry_run: bool, skip_qa: bool) -> int:
 
     print(f"Autonomous run completed for {task_id_value}")
     print(f"Summary: {summary_path.relative_to(ROOT)}")
+    return summary
 
-    return 0 if qa_result.get("qa") != "FAIL" else 1
+
+def run(task_id: str | None, dry_run: bool, skip_qa: bool) -> int:
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    selected = read_task(task_id) if task_id else store().latest("in_progress")
+    started_new = False
+    if selected is None:
+        selected = start_next_todo()
+        started_new = selected is not None
+
+    if selected is None:
+        print("No runnable task found")
+        return 0
+
+    task_id_value = str(selected["id"])
+    runtime.set_stage("runner")
+    runner_result = run_runner(task_id_value, dry_run=dry_run)
+    summary = finish_task(task_id_value, started_new, runner_result, skip_qa)
+    return 0 if summary["tester"].get("qa") != "FAIL" else 1
+
+
+def claim_tasks(limit: int, claimed: set[str]) -> list[tuple[str, bool]]:
+    picked: list[tuple[str, bool]] = []
+    for task_id in reversed(store().ids(status="in_progress")):
+        if len(picked) >= limit:
+            return picked
+        if task_id not in claimed:
+            claimed.add(task_id)
+            picked.append((task_id, False))
+    while len(picked) < limit:
+        candidate = next((t for t in store().ready() if str(t["id"]) not in claimed), None)
+        if candidate is None:
+            break
+        candidate["status"] = "in_progress"
+        write_task(candidate)
+        claimed.add(str(candidate["id"]))
+        picked.append((str(candidate["id"]), True))
+    return picked
+
+
+def parallel_env(parallel: int) -> dict[str, str]:
+    """Env overrides that give each of ``parallel`` concurrent runners its own worktree.
+
+    Runners sharing one checkout would overwrite each other's changes and
+    check each other's edits, so the worktree pool is raised to at least
+    one slot per runner. Runs in the control repo (no TARGET_DIR) cannot be
+    isolated and are refused.
+    """
+    if parallel <= 1:
+        return {}
+    if not runtime.getenv("TARGET_DIR", "").strip():
+        raise ValueError("--parallel above 1 needs TARGET_DIR: runs in the control repo cannot be isolated")
+    if worktree_pool.pool_size() >= parallel:
+        return {}
+    return {"RUNNER_WORKTREE_POOL": str(parallel)}
 
 
-def parse_args() -> argparse.Namespace:
+def run_parallel(parallel: int, dry_run: bool, skip_qa: bool) -> int:
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    claimed: set[str] = set()
+    running: dict[Future, tuple[str, bool]] = {}
+    summaries: list[dict] = []
+    overrides = parallel_env(parallel)
+
+    with runtime.env_overrides(overrides), ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="auto-team") as pool:
+
+        def fill() -> None:
+            for task_id_value, started_new in claim_tasks(parallel - len(running), claimed):
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, run_runner, task_id_value, dry_run)] = (task_id_value, started_new)
+                print(f"Runner started for {task_id_value}")
+
+        runtime.set_stage("runner")
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task_id_value, started_new = running.pop(future)
+                summaries.append(finish_task(task_id_value, started_new, future.result(), skip_qa))
+            fill()
+
+    if not summaries:
+        print("No runnable task found")
+        return 0
+    failed = [s["task_id"] for s in summaries if s["tester"].get("qa") == "FAIL"]
+    print(f"Parallel run finished: {len(summaries)} task(s), {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Team autonomous cycle (lead + dev + tester)")
     parser.add_argument("task_id", nargs="?", help="Task ID (optional)")
     parser.add_argument("--dry-run", action="store_true", help="Runner dry-run")
     parser.add_argument("--skip-qa", action="store_true", help="Skip QA status update")
-    return parser.parse_args()
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Run up to N independent ready tasks concurrently until the board has no runnable task",
+    )
+    return parser.parse_args(argv)
 
 
-def main() -> int:
-    args = parse_args()
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
     try:
+        if args.parallel > 0 and not args.task_id:
+            return run_parallel(args.parallel, dry_run=args.dry_run, skip_qa=args.skip_qa)
         return run(args.task_id, dry_run=args.dry_run, skip_qa=args.skip_qa)
     except Exception as exc:  # noqa: BLE001
         print(str(exc), file=sys.stderr)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+
+import model_output
+
+
+def legacy_extract_diff(text: str) -> str:
+    match = re.search(r"```diff\s*(.*?)```", text, flags=re.DOTALL | re.IGNORECASE)
+    if match:
+        return match.group(1).strip() + "\n"
+    if "diff --git " in text:
+        return text[text.find("diff --git ") :].strip() + "\n"
+    if "--- " in text and "+++ " in text:
+        return text[text.find("--- ") :].strip() + "\n"
+    return ""
+
+
+def legacy_file_blocks(text: str) -> list[tuple[str, str]]:
+    pattern = re.compile(
+        r"^([A-Za-z0-9_./\-]+\.[A-Za-z0-9]+)[^\n]*\n```[A-Za-z0-9_-]*\n(.*?)\n```",
+        flags=re.MULTILINE | re.DOTALL,
+    )
+    return [(match.group(1).strip(), match.group(2) + "\n") for match in pattern.finditer(text)]
+
+
+def diff_output(size: int) -> str:
+    parts = ["Here is the patch.\n\n```diff\n"]
+    total = 0
+    index = 0
+    while total < size:
+        section = (
+            f"diff --git a/src/mod{index}.py b/src/mod{index}.py\n--- a/src/mod{index}.py\n+++ b/src/mod{index}.py\n"
+            f"@@ -10,4 +10,6 @@ def handler_{index}():\n     value = compute({index})\n-    return value\n"
+            f"+    if value is None:\n+        return {index}\n+    return value\n     # end\n \n"
+        )
+        parts.append(section)
+        total += len(section)
+        index += 1
+    parts.append("```\n\nThis keeps the handlers backwards compatible.\n")
+    return "".join(parts)
+
+
+def block_output(size: int) -> str:
+    parts = []
+    total = 0
+    index = 0
+    while total < size:
+        block = f"src/page{index}.tsx\n```tsx\n" + "".join(f"const v{n} = {n};\n" for n in range(40)) + "```\n\n"
+        parts.append(block)
+        total += len(block)
+        index += 1
+    return "".join(parts)
+
+
+def raw_output(size: int) -> str:
+    """Unfenced diff followed by prose: the legacy fallback keeps the prose, the parser stops at the diff's end."""
+    diff = diff_output(size).split("```diff\n", 1)[1].split("```", 1)[0]
+    return "Patch below.\n" + diff + "\nThat is all; " + "the handlers now return early. " * 200 + "\n"
+
+
+SHAPES = {"diff": diff_output, "blocks": block_output, "raw": raw_output}
+
+
+def timed(fn, text: str) -> float:
+    started = time.perf_counter()
+    fn(text)
+    return time.perf_counter() - started
+
+
+def bench(shape: str, megabytes: list[float]) -> list[dict]:
+    rows = []
+    for mb in megabytes:
+        text = SHAPES[shape](int(mb * 1024 * 1024))
+        parser = model_output.parse(text)
+        legacy = legacy_file_blocks if shape == "blocks" else legacy_extract_diff
+        rows.append(
+            {
+                "shape": shape,
+                "mb": round(len(text) / 1024 / 1024, 2),
+                "items": len(parser.blocks) if shape == "blocks" else len(parser.diff_files),
+                "single_pass_ms": round(timed(model_output.parse, text) * 1000, 1),
+                "legacy_ms": round(timed(legacy, text) * 1000, 1),
+                "bytes": len(json.dumps(parser.blocks)) if shape == "blocks" else len(parser.diff),
+                "legacy_bytes": len(json.dumps(legacy(text))) if shape == "blocks" else len(legacy(text)),
+            }
+        )
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark model output parsing against the legacy regexes")
+    parser.add_argument("--shape", choices=sorted(SHAPES), action="append", help="Output shape (repeatable, default all)")
+    parser.add_argument("--mb", type=float, nargs="+", default=[1, 2, 4, 8], help="Output sizes in MiB")
+    parser.add_argument("--json", action="store_true", help="Print JSON rows")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    rows = []
+    for shape in args.shape or sorted(SHAPES):
+        rows.extend(bench(shape, args.mb))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    print(f"{'shape':<8}{'MiB':>7}{'items':>8}{'single-pass ms':>16}{'ms/MiB':>8}{'legacy ms':>11}{'bytes':>11}{'legacy bytes':>14}")
+    for row in rows:
+        per_mb = row["single_pass_ms"] / row["mb"] if row["mb"] else 0.0
+        print(
+            f"{row['shape']:<8}{row['mb']:>7.2f}{row['items']:>8}{row['single_pass_ms']:>16.1f}{per_mb:>8.1f}"
+            f"{row['legacy_ms']:>11.1f}{row['bytes']:>11}{row['legacy_bytes']:>14}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import orchestrator_server
+
+
+class QuietHandler(orchestrator_server.Handler):
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+
+class LegacyHandler(QuietHandler):
+    protocol_version = "HTTP/1.0"
+
+
+def start_server(handler: type) -> tuple[orchestrator_server.BoundedThreadingHTTPServer, int]:
+    server = orchestrator_server.BoundedThreadingHTTPServer(("127.0.0.1", 0), handler, 256)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def send(conn: http.client.HTTPConnection, path: str) -> int:
+    if path == "/health":
+        conn.request("GET", "/health")
+    else:
+        conn.request("POST", "/event", json.dumps({"action": "list"}), {"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+
+def client(port: int, path: str, requests_per_client: int, keep_alive: bool) -> int:
+    ok = 0
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    for _ in range(requests_per_client):
+        if not keep_alive:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        if send(conn, path) == 200:
+            ok += 1
+        if not keep_alive:
+            conn.close()
+    conn.close()
+    return ok
+
+
+def bench(handler: type, path: str, requests: int, concurrency: int, keep_alive: bool) -> dict:
+    server, port = start_server(handler)
+    per_client = max(1, requests // concurrency)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ok = sum(pool.map(lambda _: client(port, path, per_client, keep_alive), range(concurrency)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    server.server_close()
+    return {"ok": ok, "total": per_client * concurrency, "seconds": round(elapsed, 3), "rps": round(ok / elapsed, 1)}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Throughput benchmark for orchestrator_server")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--paths", default="/health,list", help="Comma separated: /health, list")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    orchestrator_server.runtime.install_stream_proxies()
+    scenarios = [
+        ("http/1.0 (before)", LegacyHandler, False),
+        ("http/1.1 keep-alive", QuietHandler, True),
+    ]
+    results = []
+    for path in [p.strip() for p in args.paths.split(",") if p.strip()]:
+        for name, handler, keep_alive in scenarios:
+            row = {"path": path, "mode": name, **bench(handler, path, args.requests, args.concurrency, keep_alive)}
+            results.append(row)
+            print(f"{path:8} | {name:20} | {row['rps']:>8} req/s | {row['ok']}/{row['total']} ok | {row['seconds']}s")
+    return 0 if all(r["ok"] == r["total"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
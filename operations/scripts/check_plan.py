@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import runtime
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_RESULT_CACHE = ROOT / ".cache" / "check-results.json"
+DEFAULT_GRAPH_CACHE = ROOT / ".cache" / "import-graph.json"
+MAX_CACHE_ENTRIES = 2000
+MAX_SOURCE_BYTES = 512 * 1024
+PLACEHOLDER = "{targets}"
+PY_EXTS = (".py",)
+JS_EXTS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+DOC_EXTS = (".md", ".rst", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".webp")
+TEST_NAME_RE = re.compile(r"(^test_.*\.py$|_test\.py$|\.(test|spec)\.[cm]?[jt]sx?$)")
+PY_IMPORT_RE = re.compile(r"^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+\(?([\w, \t*]+)|import[ \t]+([\w., \t]+))", re.MULTILINE)
+JS_IMPORT_RE = re.compile(
+    r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*|\bexport\s+\*\s+from\s*)['"]([^'"\n]+)['"]"""
+)
+_CACHE_LOCK = threading.Lock()
+
+
+def selection_mode() -> str:
+    mode = runtime.getenv("RUNNER_TEST_SELECT", "auto").strip().lower() or "auto"
+    return mode if mode in {"auto", "map", "graph", "off"} else "auto"
+
+
+def cache_enabled() -> bool:
+    return runtime.getenv("RUNNER_CHECK_CACHE", "on").strip().lower() not in {"off", "0", "false", "no"}
+
+
+def result_cache_path() -> Path:
+    return Path(runtime.getenv("CHECK_RESULT_CACHE", "") or DEFAULT_RESULT_CACHE)
+
+
+def graph_cache_path() -> Path:
+    return Path(runtime.getenv("IMPORT_GRAPH_CACHE", "") or DEFAULT_GRAPH_CACHE)
+
+
+def check_paths(owner: str) -> list[str]:
+    key = "RUNNER_CHECK_PATHS_FRONTEND" if owner == "frontend" else "RUNNER_CHECK_PATHS"
+    return [part.strip().strip("/") for part in runtime.getenv(key, "").split(",") if part.strip().strip("/")]
+
+
+def _git(args: list[str], repo_root: Path, env: dict | None = None) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=repo_root, text=True, capture_output=True, check=False, env=env)
+
+
+def _load(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data, separators=(",", ":")) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def is_test(rel_path: str) -> bool:
+    name = posixpath.basename(rel_path)
+    if TEST_NAME_RE.search(name):
+        return True
+    return "/__tests__/" in f"/{rel_path}" and rel_path.endswith(JS_EXTS)
+
+
+def load_map(repo_root: Path) -> dict[str, list[str]]:
+    """RUNNER_TEST_MAP: JSON file (absolute, or relative to the target repo) of ``{"glob": ["target", ...]}``."""
+    value = runtime.getenv("RUNNER_TEST_MAP", "").strip()
+    if not value:
+        return {}
+    path = Path(value) if Path(value).is_absolute() else repo_root / value
+    data = _load(path)
+    return {str(glob): [str(t) for t in (targets if isinstance(targets, list) else [targets])] for glob, targets in data.items()}
+
+
+def list_files(repo_root: Path) -> list[str]:
+    proc = _git(["ls-files", "-co", "--exclude-standard"], repo_root)
+    return [line for line in proc.stdout.splitlines() if line] if proc.returncode == 0 else []
+
+
+def source_imports(path: Path, graph_cache: dict) -> tuple[list[list], bool]:
+    """Raw import specifiers of a source file, cached while (mtime_ns, size) are unchanged.
+
+    Returns (specs, cache_updated).
+    """
+    try:
+        st = path.stat()
+        key = str(path)
+        cached = graph_cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2], False
+        text = path.read_bytes()[:MAX_SOURCE_BYTES].decode("utf-8", errors="replace")
+    except OSError:
+        return [], False
+    specs: list[list] = []
+    if path.suffix in PY_EXTS:
+        for match in PY_IMPORT_RE.finditer(text):
+            if match.group(3):
+                specs.extend(["py", name.split(" as ")[0].strip()] for name in match.group(3).split(","))
+            else:
+                names = [name.split(" as ")[0].strip() for name in match.group(2).split(",")]
+                specs.append(["py", match.group(1), [name for name in names if name and name != "*"]])
+    else:
+        specs = [["js", spec] for spec in JS_IMPORT_RE.findall(text)]
+    graph_cache[key] = [st.st_mtime_ns, st.st_size, specs]
+    return specs, True
+
+
+def _resolve_py(rel_path: str, spec: list, files: set[str]) -> list[str]:
+    module = spec[1]
+    dots = len(module) - len(module.lstrip("."))
+    base_dirs = [posixpath.dirname(rel_path)]
+    if dots:
+        for _ in range(dots - 1):
+            base_dirs[0] = posixpath.dirname(base_dirs[0])
+    else:
+        base_dirs = ["", "src", posixpath.dirname(rel_path)]
+    parts = [part for part in module.lstrip(".").split(".") if part]
+    found: list[str] = []
+    for base in base_dirs:
+        stem = posixpath.join(base, *parts) if parts else base
+        for name in [""] + (spec[2] if len(spec) > 2 else []):
+            target = posixpath.join(stem, name) if name else stem
+            for candidate in (f"{target}.py", posixpath.join(target, "__init__.py")):
+                if candidate.lstrip("/") in files:
+                    found.append(candidate.lstrip("/"))
+    return found
+
+
+def _resolve_js(rel_path: str, spec: str, files: set[str]) -> list[str]:
+    if spec.startswith("@/"):
+        target = posixpath.join("src", spec[2:])
+    elif spec.startswith("."):
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(rel_path), spec))
+    else:
+        return []
+    candidates = [target] + [target + ext for ext in JS_EXTS] + [posixpath.join(target, "index" + ext) for ext in JS_EXTS]
+    return [candidate for candidate in candidates if candidate in files][:1]
+
+
+def import_graph(repo_root: Path) -> dict[str, set[str]]:
+    """Reverse import graph of the target repo: file -> files that import it."""
+    files = list_files(repo_root)
+    file_set = set(files)
+    cache_path = graph_cache_path()
+    with _CACHE_LOCK:
+        graph_cache = _load(cache_path)
+        updated = False
+        importers: dict[str, set[str]] = {}
+        for rel_path in files:
+            if not rel_path.endswith(PY_EXTS + JS_EXTS):
+                continue
+            specs, changed = source_imports(repo_root / rel_path, graph_cache)
+            updated = updated or changed
+            for spec in specs:
+                resolved = _resolve_py(rel_path, spec, file_set) if spec[0] == "py" else _resolve_js(rel_path, spec[1], file_set)
+                for dep in resolved:
+                    if dep != rel_path:
+                        importers.setdefault(dep, set()).add(rel_path)
+        if updated:
+            _save(cache_path, graph_cache)
+    return importers
+
+
+def tests_reaching(rel_path: str, importers: dict[str, set[str]]) -> set[str]:
+    seen = {rel_path}
+    queue = [rel_path]
+    tests: set[str] = set()
+    while queue:
+        current = queue.pop()
+        for parent in importers.get(current, ()):
+            if parent in seen:
+                continue
+            seen.add(parent)
+            if is_test(parent):
+                tests.add(parent)
+            queue.append(parent)
+    return tests
+
+
+def plan(changed: list[str] | None, repo_root: Path) -> dict:
+    """Decide which test targets cover ``changed``.
+
+    Returns {"mode": "full"|"selected"|"none", "targets", "reason", ...}.
+    Changed tests are targets themselves; other files are looked up in
+    RUNNER_TEST_MAP first, then followed through the import graph to the
+    tests that import them. A changed file nothing covers (other than
+    docs and images) forces a full run, so selection never hides a change.
+    """
+    started = time.monotonic()
+    mode = selection_mode()
+    result: dict = {"mode": "full", "targets": [], "selection": mode}
+    if mode == "off":
+        result["reason"] = "selection disabled"
+        return result
+    if changed is None:
+        result["reason"] = "changed files unknown"
+        return result
+    mapping = load_map(repo_root) if mode in {"auto", "map"} else {}
+    importers: dict[str, set[str]] | None = None
+    targets: set[str] = set()
+    uncovered: list[str] = []
+    for rel_path in changed:
+        if is_test(rel_path):
+            targets.add(rel_path)
+            continue
+        mapped = [target for glob, globs in mapping.items() if fnmatch.fnmatch(rel_path, glob) for target in globs]
+        if "*" in mapped:
+            result.update({"reason": f"{rel_path} maps to the full suite", "elapsed_ms": round((time.monotonic() - started) * 1000, 1)})
+            return result
+        if mapped:
+            targets.update(mapped)
+            continue
+        if mode in {"auto", "graph"}:
+            if importers is None:
+                importers = import_graph(repo_root)
+            reached = tests_reaching(rel_path, importers)
+            if reached:
+                targets.update(reached)
+                continue
+        if not rel_path.lower().endswith(DOC_EXTS):
+            uncovered.append(rel_path)
+    result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    if uncovered:
+        result.update({"reason": "no tests cover some changed files", "uncovered": uncovered[:20]})
+        return result
+    if not targets:
+        result.update({"mode": "none", "reason": "only docs or assets changed"})
+        return result
+    result.update({"mode": "selected", "targets": sorted(targets), "reason": f"{len(targets)} affected test targets"})
+    return result
+
+
+def render(command: str, targets: list[str]) -> str:
+    """Put ``targets`` into the command's ``{targets}`` placeholder (empty for a full run)."""
+    return command.replace(PLACEHOLDER, " ".join(shlex.quote(target) for target in targets)).strip()
+
+
+def tree_hash(repo_root: Path, paths: list[str] | None = None) -> str:
+    """Hash of the working tree as git would commit it (tracked and untracked, minus ignored files).
+
+    Uses a throwaway copy of the index (GIT_INDEX_FILE) so the real index
+    is untouched; unchanged files are not re-hashed thanks to its stat
+    data. With ``paths`` only those subtrees count.
+    """
+    index = _git(["rev-parse", "--git-path", "index"], repo_root).stdout.strip()
+    if not index:
+        return ""
+    index_path = Path(index) if Path(index).is_absolute() else repo_root / index
+    with tempfile.TemporaryDirectory(prefix="check-index-") as tmp:
+        tmp_index = Path(tmp) / "index"
+        if index_path.is_file():
+            shutil.copyfile(index_path, tmp_index)
+        env = {**runtime.environ(), "GIT_INDEX_FILE": str(tmp_index)}
+        if _git(["add", "-A"], repo_root, env).returncode != 0:
+            return ""
+        tree = _git(["write-tree"], repo_root, env).stdout.strip()
+    if not tree or not paths:
+        return tree
+    listing = _git(["ls-tree", "--full-tree", tree, "--", *paths], repo_root).stdout
+    return hashlib.sha1(listing.encode("utf-8")).hexdigest()
+
+
+def cache_key(command: str, tree: str) -> str:
+    return hashlib.sha256(f"{command}\0{tree}".encode("utf-8")).hexdigest()
+
+
+def lookup(tree: str, command: str, full_command: str) -> dict | None:
+    """Cached passing result for ``command`` on ``tree``; a passing full run also answers any selected run."""
+    if not cache_enabled() or not tree:
+        return None
+    with _CACHE_LOCK:
+        entries = _load(result_cache_path())
+    for key in dict.fromkeys((cache_key(command, tree), cache_key(full_command, tree))):
+        entry = entries.get(key)
+        if isinstance(entry, dict) and entry.get("ok"):
+            return entry
+    return None
+
+
+def store(tree: str, command: str, entry: dict) -> None:
+    """Remember a passing result; failures are never cached, so a flaky failure is rerun on the next check."""
+    if not cache_enabled() or not tree or not entry.get("ok"):
+        return
+    key = cache_key(command, tree)
+    path = result_cache_path()
+    with _CACHE_LOCK:
+        entries = _load(path)
+        entries[key] = {**entry, "at": datetime.now(timezone.utc).isoformat()}
+        if len(entries) > MAX_CACHE_ENTRIES:
+            for old in sorted(entries, key=lambda k: entries[k].get("at", ""))[: len(entries) - MAX_CACHE_ENTRIES]:
+                entries.pop(old, None)
+        _save(path, entries)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Preview affected-test selection and manage the check result cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    preview = sub.add_parser("plan", help="Show which test targets cover the given changed files")
+    preview.add_argument("--repo", default=runtime.getenv("TARGET_DIR", "."), help="Target repository (default TARGET_DIR)")
+    preview.add_argument("--tree", action="store_true", help="Also print the working tree hash")
+    preview.add_argument("files", nargs="*", help="Changed files, relative to the repository")
+    sub.add_parser("stats", help="Show cached check results")
+    sub.add_parser("clear", help="Delete cached check results and the import graph cache")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.command == "plan":
+        repo_root = Path(args.repo).resolve()
+        result = plan(args.files, repo_root)
+        if args.tree:
+            result["tree"] = tree_hash(repo_root)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0
+    if args.command == "stats":
+        entries = _load(result_cache_path())
+        passed = sum(1 for entry in entries.values() if entry.get("ok"))
+        print(json.dumps({"path": str(result_cache_path()), "entries": len(entries), "passed": passed, "failed": len(entries) - passed}, indent=2))
+        return 0
+    for path in (result_cache_path(), graph_cache_path()):
+        path.unlink(missing_ok=True)
+    print(json.dumps({"ok": True}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import check_plan
+import run_log
+import runtime
+
+COMMAND_SEPARATOR = ";;"
+DEFAULT_SHARD_TIMEOUT = 1800.0
+DEFAULT_TOTAL_TIMEOUT = 3600.0
+KILL_GRACE_SECONDS = 5.0
+TAIL_CHARS = 4000
+SHARD_TAIL_CHARS = 2000
+
+
+def _float(key: str, default: float) -> float:
+    try:
+        return float(runtime.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
+def machine_workers() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def workers() -> int:
+    try:
+        value = int(runtime.getenv("RUNNER_CHECK_WORKERS", "0") or 0)
+    except ValueError:
+        value = 0
+    return value if value > 0 else machine_workers()
+
+
+def shard_count() -> int:
+    try:
+        value = int(runtime.getenv("RUNNER_CHECK_SHARDS", "0") or 0)
+    except ValueError:
+        value = 0
+    return value if value > 0 else workers()
+
+
+def fail_fast() -> bool:
+    return runtime.getenv("RUNNER_CHECK_FAIL_FAST", "0").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def build_jobs(template: str, targets: list[str], shards: int | None = None) -> list[dict]:
+    """Expand a check command template into shard jobs.
+
+    ``;;`` separates independent commands. A command with ``{shard}`` runs
+    once per shard with ``{shard}``/``{shards}`` filled in (for runners
+    with native sharding, e.g. ``vitest --shard={shard}/{shards}``); a
+    command with ``{targets}`` and several selected targets gets them
+    split round-robin across shards; anything else is one job.
+    """
+    shards = shard_count() if shards is None else max(1, shards)
+    jobs: list[dict] = []
+    for command in (part.strip() for part in template.split(COMMAND_SEPARATOR)):
+        if not command:
+            continue
+        if "{shard}" in command:
+            rendered = check_plan.render(command, targets)
+            for index in range(1, shards + 1):
+                jobs.append({"command": rendered.replace("{shard}", str(index)).replace("{shards}", str(shards))})
+        elif check_plan.PLACEHOLDER in command and len(targets) > 1 and shards > 1:
+            count = min(shards, len(targets))
+            jobs.extend({"command": check_plan.render(command, targets[index::count])} for index in range(count))
+        else:
+            jobs.append({"command": check_plan.render(command, targets)})
+    for index, job in enumerate(jobs, start=1):
+        job["shard"] = index
+    return jobs
+
+
+def kill_groups(procs: list[subprocess.Popen]) -> None:
+    """SIGTERM each shard's whole process group, then SIGKILL whatever is left after a grace period."""
+    for proc in procs:
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(proc.pid, signal.SIGTERM)
+    deadline = time.monotonic() + KILL_GRACE_SECONDS
+    while any(proc.poll() is None for proc in procs) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    for proc in procs:
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+class ShardRun:
+    """Runs shard jobs on a bounded pool; every shard is its own process group so it can be killed whole."""
+
+    def __init__(self, cwd: Path, name: str, shard_timeout: float, total_timeout: float, stop_on_failure: bool) -> None:
+        self.cwd = cwd
+        self.name = name
+        self.shard_timeout = shard_timeout
+        self.deadline = time.monotonic() + total_timeout if total_timeout > 0 else None
+        self.stop_on_failure = stop_on_failure
+        self.cancel = threading.Event()
+        self.reason = ""
+        self._running: set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    def stop(self, reason: str) -> None:
+        with self._lock:
+            if self.cancel.is_set():
+                return
+            self.reason = reason
+            self.cancel.set()
+            running = list(self._running)
+        kill_groups(running)
+
+    def _timeout(self) -> float | None:
+        limits = [self.shard_timeout] if self.shard_timeout > 0 else []
+        if self.deadline is not None:
+            limits.append(max(0.0, self.deadline - time.monotonic()))
+        return min(limits) if limits else None
+
+    def run_job(self, job: dict) -> dict:
+        result = {"shard": job["shard"], "command": job["command"], "ok": False, "returncode": None}
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.stop("overall timeout")
+        started = time.monotonic()
+        if self.cancel.is_set():
+            return {**result, "cancelled": True, "elapsed_ms": 0.0}
+        logs = run_log.LogFiles(f"{self.name}-shard{job['shard']}")
+        proc = subprocess.Popen(
+            job["command"],
+            cwd=self.cwd,
+            shell=True,
+            stdout=logs.stdout,
+            stderr=logs.stderr,
+            env=runtime.environ(),
+            start_new_session=True,
+        )
+        with self._lock:
+            # A stop() that ran while this shard was spawning did not see it; kill it here instead.
+            self._running.add(proc)
+            stopped = self.cancel.is_set()
+        if stopped:
+            kill_groups([proc])
+        timed_out = False
+        try:
+            try:
+                proc.wait(timeout=self._timeout())
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                kill_groups([proc])
+                proc.wait()
+        finally:
+            with self._lock:
+                self._running.discard(proc)
+            logs.close()
+        stdout, stderr = logs.tails(TAIL_CHARS)
+        result.update(
+            {
+                "ok": proc.returncode == 0 and not timed_out,
+                "returncode": proc.returncode,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+                "stdout": stdout,
+                "stderr": stderr,
+                "log": logs.describe(),
+            }
+        )
+        if timed_out:
+            result["timed_out"] = True
+        elif self.cancel.is_set() and proc.returncode and proc.returncode < 0:
+            result["cancelled"] = True
+        return result
+
+    def run(self, jobs: list[dict], pool_size: int) -> list[dict]:
+        results: list[dict] = []
+        with ThreadPoolExecutor(max_workers=max(1, min(pool_size, len(jobs))), thread_name_prefix="check-shard") as pool:
+            # Each shard runs in a copy of the caller's context so per-request env overrides reach runtime.environ().
+            pending = {pool.submit(contextvars.copy_context().run, self.run_job, job) for job in jobs}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        results.append(result)
+                        if result.get("timed_out") and self.deadline is not None and time.monotonic() >= self.deadline:
+                            self.stop("overall timeout")
+                        elif not result["ok"] and not result.get("cancelled") and self.stop_on_failure:
+                            self.stop(f"fail-fast after shard {result['shard']}")
+            finally:
+                if pending:
+                    self.stop(self.reason or "interrupted")
+        return sorted(results, key=lambda item: item["shard"])
+
+
+def run(jobs: list[dict], cwd: Path, name: str = "checks") -> dict:
+    """Run shard jobs in parallel under per-shard and overall timeouts.
+
+    Returns the combined result (ok, returncode, stdout/stderr tails of
+    the first failing shard, or of all shards when everything passed)
+    plus per-shard results. Each shard's full output is in its own log
+    files (``log``); the top-level ``log`` is the first failing shard's.
+    """
+    started = time.monotonic()
+    pool_size = workers()
+    runner = ShardRun(
+        cwd,
+        name,
+        _float("RUNNER_CHECK_TIMEOUT", DEFAULT_SHARD_TIMEOUT),
+        _float("RUNNER_CHECK_TOTAL_TIMEOUT", DEFAULT_TOTAL_TIMEOUT),
+        fail_fast(),
+    )
+    shards = runner.run(jobs, pool_size)
+    failed = [shard for shard in shards if not shard["ok"] and not shard.get("cancelled")]
+    cancelled = [shard for shard in shards if shard.get("cancelled")]
+    if failed:
+        stdout, stderr = failed[0].get("stdout", ""), failed[0].get("stderr", "")
+    else:
+        stdout = "".join(shard.get("stdout", "") for shard in shards)
+        stderr = "".join(shard.get("stderr", "") for shard in shards)
+    result = {
+        "ok": not failed and not cancelled,
+        "returncode": failed[0]["returncode"] if failed else (None if cancelled else 0),
+        "stdout": stdout[-TAIL_CHARS:],
+        "stderr": stderr[-TAIL_CHARS:],
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        "workers": min(pool_size, len(jobs)),
+        "timed_out": any(shard.get("timed_out") for shard in shards),
+    }
+    logged = failed or (shards if len(shards) == 1 else [])
+    if logged and "log" in logged[0]:
+        result["log"] = logged[0]["log"]
+    if len(shards) > 1:
+        result["shards"] = [
+            {
+                **{key: value for key, value in shard.items() if key not in {"stdout", "stderr"}},
+                **({"stdout": shard["stdout"][-SHARD_TAIL_CHARS:], "stderr": shard["stderr"][-SHARD_TAIL_CHARS:]} if shard in failed else {}),
+            }
+            for shard in shards
+        ]
+    if cancelled:
+        result["stopped"] = runner.reason
+    return result
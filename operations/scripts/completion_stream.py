@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Callable, TextIO
+
+import model_output
+import runtime
+
+DEFAULT_ABORT_CHARS = 4000
+
+
+def abort_chars() -> int:
+    try:
+        return int(runtime.getenv("RUNNER_STREAM_ABORT_CHARS", str(DEFAULT_ABORT_CHARS)))
+    except ValueError:
+        return DEFAULT_ABORT_CHARS
+
+
+class LineParser:
+    """Feeds text chunks and hands complete lines to ``line``; ``close`` flushes the tail.
+
+    The base class accepts everything and never aborts; subclasses override
+    ``line``, ``started`` and ``finish`` as needed.
+    """
+
+    kind = "block"
+
+    def __init__(self, limit: int = DEFAULT_ABORT_CHARS) -> None:
+        self.limit = limit
+        self._partial = ""
+        self.seen_chars = 0
+        self.error = ""
+
+    def feed(self, text: str) -> None:
+        self.seen_chars += len(text)
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            if self.error:
+                return
+            self.line(line)
+        if not self.error and self.limit and self.seen_chars > self.limit and not self.started():
+            self.error = f"no {self.kind} started within {self.limit} chars"
+
+    def close(self) -> None:
+        if self._partial and not self.error:
+            self.line(self._partial)
+        self._partial = ""
+        self.finish()
+
+    def line(self, line: str) -> None:
+        pass
+
+    def started(self) -> bool:
+        return True
+
+    def finish(self) -> None:
+        pass
+
+
+class DiffStreamParser(LineParser):
+    """Streaming front end of model_output.OutputParser for Codex diffs.
+
+    Aborts on the first line inside a diff fence that is not valid diff
+    syntax, so a reply that went off the rails stops early.
+    """
+
+    kind = "diff"
+
+    def __init__(self, limit: int = DEFAULT_ABORT_CHARS) -> None:
+        super().__init__(limit)
+        self.output = model_output.OutputParser()
+
+    def line(self, line: str) -> None:
+        self.output.line(line)
+        if self.output.fenced.malformed:
+            self.error = f"malformed diff line: {self.output.fenced.malformed[:80]}"
+
+    def started(self) -> bool:
+        return self.output.diff_started
+
+    def finish(self) -> None:
+        self.output.finish()
+
+    @property
+    def diff(self) -> str:
+        return self.output.diff
+
+
+class FileBlockStreamParser(LineParser):
+    """Streaming front end of model_output.OutputParser for Kimi file blocks.
+
+    on_block receives (path, code) as soon as each block's fence closes.
+    """
+
+    kind = "file block"
+
+    def __init__(
+        self, on_block: Callable[[str, str], None] | None = None, limit: int = DEFAULT_ABORT_CHARS
+    ) -> None:
+        super().__init__(limit)
+        self.output = model_output.OutputParser(on_block=on_block)
+
+    def line(self, line: str) -> None:
+        self.output.line(line)
+
+    def started(self) -> bool:
+        return self.output.blocks_started
+
+    def finish(self) -> None:
+        self.output.finish()
+
+    @property
+    def blocks(self) -> list[tuple[str, str]]:
+        return self.output.blocks
+
+
+class StreamCollector:
+    """Consumes chat-completion SSE payloads for one generation.
+
+    Deltas are appended to the transcript file as they arrive and fed to the
+    parser; only the parser keeps what it extracted, the full text lives in
+    the transcript. ``on_data`` returns False (abort) once the parser
+    reports an error or the provider sends an error object. ``on_abort``
+    undoes side effects of the parser's callbacks and returns what it undid.
+    """
+
+    def __init__(
+        self, parser: LineParser, transcript: Path, on_abort: Callable[[], list[str]] | None = None
+    ) -> None:
+        self.parser = parser
+        self.transcript = transcript
+        self.on_abort = on_abort
+        self.usage: dict = {}
+        self.error = ""
+        self.started = time.monotonic()
+        self.first_token_ms: float | None = None
+        self.chars = 0
+        self._fh: TextIO | None = None
+
+    def on_data(self, data: str) -> bool:
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return True
+        if not isinstance(event, dict):
+            return True
+        if event.get("error"):
+            self.error = f"provider error: {json.dumps(event['error'])[:200]}"
+            return False
+        choice = (event.get("choices") or [{}])[0] or {}
+        usage = event.get("usage") or choice.get("usage")
+        if isinstance(usage, dict):
+            self.usage = {
+                "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+                "completion_tokens": int(usage.get("completion_tokens") or 0),
+            }
+        delta = (choice.get("delta") or {}).get("content") or ""
+        if delta:
+            if self.first_token_ms is None:
+                self.first_token_ms = round((time.monotonic() - self.started) * 1000, 1)
+            self.chars += len(delta)
+            if self._fh is None:
+                self.transcript.parent.mkdir(parents=True, exist_ok=True)
+                self._fh = open(self.transcript, "w", encoding="utf-8")
+            self._fh.write(delta)
+            self._fh.flush()
+            self.parser.feed(delta)
+            if self.parser.error:
+                self.error = self.parser.error
+                return False
+        return True
+
+    def finish(self) -> dict:
+        if not self.error:
+            self.parser.close()
+        if self._fh is not None:
+            self._fh.write("\n")
+            self._fh.close()
+        return {
+            "usage": self.usage,
+            "error": self.error,
+            "first_token_ms": self.first_token_ms,
+            "chars": self.chars,
+        }
+
+    def abort(self) -> list[str]:
+        return self.on_abort() if self.on_abort is not None else []
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import runtime
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_DIGEST_CACHE = ROOT / ".cache" / "context-digests.json"
+DEFAULT_BUDGET = 12000
+MAX_FILE_BYTES = 1024 * 1024
+_CACHE_LOCK = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def budget() -> int:
+    try:
+        return int(runtime.getenv("RUNNER_CONTEXT_TOKENS", str(DEFAULT_BUDGET)))
+    except ValueError:
+        return DEFAULT_BUDGET
+
+
+def digest_cache_path() -> Path:
+    return Path(runtime.getenv("CONTEXT_DIGEST_CACHE", "") or DEFAULT_DIGEST_CACHE)
+
+
+def load_digests(path: Path) -> dict[str, list]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_digests(path: Path, digests: dict[str, list]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(digests, separators=(",", ":")) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def decode(raw: bytes) -> str | None:
+    if b"\0" in raw[:8192]:
+        return None
+    text = raw[:MAX_FILE_BYTES].decode("utf-8", errors="replace")
+    return text + "\n... [file larger than 1 MiB, cut]\n" if len(raw) > MAX_FILE_BYTES else text
+
+
+def read_text(path: Path) -> str | None:
+    try:
+        return decode(path.read_bytes())
+    except OSError:
+        return None
+
+
+def describe(path: Path, digests: dict[str, list]) -> tuple[dict | None, bool]:
+    """Digest and token count for ``path``, reusing the cache while (mtime_ns, size) are unchanged.
+
+    Returns (info, cache_updated); ``info["text"]`` is only set when the file had to be read.
+    """
+    try:
+        st = path.stat()
+        key = str(path)
+        cached = digests.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return {"digest": cached[2], "tokens": cached[3], "binary": cached[4], "text": None}, False
+        raw = path.read_bytes()
+    except OSError:
+        return None, False
+    text = decode(raw)
+    raw_digest = hashlib.sha256(raw).hexdigest()[:16]
+    tokens = estimate_tokens(text) if text is not None else 0
+    digests[key] = [st.st_mtime_ns, st.st_size, raw_digest, tokens, text is None]
+    return {"digest": raw_digest, "tokens": tokens, "binary": text is None, "text": text}, True
+
+
+def truncate(text: str, tokens: int) -> tuple[str, int]:
+    """Keep whole leading lines that fit in ``tokens``; returns (text, dropped line count)."""
+    lines = text.splitlines(keepends=True)
+    kept: list[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "".join(kept), len(lines) - len(kept)
+
+
+def candidates(task: dict, control_root: Path, app_root: Path) -> list[tuple[str, str, Path]]:
+    """(role, relative path, absolute path) in rank order: target outputs first, then inputs."""
+    found: list[tuple[str, str, Path]] = []
+    seen: set[str] = set()
+    for rel_path in task.get("outputs") or []:
+        rel = str(rel_path)
+        if rel.startswith("/") or ".." in rel.split("/"):
+            continue
+        if rel not in seen and (app_root / rel).is_file():
+            seen.add(rel)
+            found.append(("output", rel, app_root / rel))
+    for rel_path in task.get("inputs") or []:
+        rel = str(rel_path)
+        if rel in seen or rel.startswith("/") or ".." in rel.split("/"):
+            continue
+        for base in (app_root, control_root):
+            if (base / rel).is_file():
+                seen.add(rel)
+                found.append(("input", rel, base / rel))
+                break
+    return found
+
+
+def pack(task: dict, control_root: Path, app_root: Path, limit: int | None = None) -> dict:
+    """Inline task outputs (current contents) and inputs into a prompt section under a token budget.
+
+    Outputs rank first because generated diffs must apply to them; inputs
+    follow in task order. A file that does not fit whole is cut at a line
+    boundary; files after the budget is spent are listed as omitted. Token
+    counts come from the digest cache, so omitted or unchanged files are not
+    re-read to plan the pack.
+    """
+    limit = budget() if limit is None else limit
+    summary: dict = {"budget": limit, "tokens": 0, "files": [], "text": ""}
+    if limit <= 0:
+        return summary
+
+    cache_path = digest_cache_path()
+    with _CACHE_LOCK:
+        digests = load_digests(cache_path)
+        described = []
+        updated = False
+        for role, rel, path in candidates(task, control_root, app_root):
+            info, changed = describe(path, digests)
+            described.append((role, rel, path, info))
+            updated = updated or changed
+        if updated:
+            save_digests(cache_path, digests)
+
+    sections: list[str] = []
+    remaining = limit
+    for role, rel, path, info in described:
+        if info is None or info["binary"]:
+            continue
+        entry = {"path": rel, "role": role, "digest": info["digest"], "tokens": info["tokens"]}
+        summary["files"].append(entry)
+        header_cost = estimate_tokens(f"--- BEGIN {rel} ({role}) ---\n--- END {rel} ---\n")
+        if remaining - header_cost <= 0:
+            entry["included_tokens"] = 0
+            entry["omitted"] = True
+            continue
+        text = info["text"] if info["text"] is not None else read_text(path) or ""
+        dropped = 0
+        if info["tokens"] > remaining - header_cost:
+            text, dropped = truncate(text, remaining - header_cost)
+        if text and not text.endswith("\n"):
+            text += "\n"
+        marker = f"... [truncated, {dropped} more lines]\n" if dropped else ""
+        sections.append(f"--- BEGIN {rel} ({role}) ---\n{text}{marker}--- END {rel} ---")
+        used = estimate_tokens(text) + header_cost
+        entry["included_tokens"] = used
+        entry["truncated"] = bool(dropped)
+        remaining -= used
+
+    summary["tokens"] = limit - remaining
+    if sections:
+        summary["text"] = "Context files (current contents):\n" + "\n".join(sections)
+    return summary
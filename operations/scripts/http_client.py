@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import http.client
+import json
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, TypeVar
+from urllib import parse, request
+
+import runtime
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 180.0
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_SECONDS = 30.0
+T = TypeVar("T")
+STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+def env_float(key: str, default: float) -> float:
+    try:
+        return float(runtime.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
+class ConnectionPool:
+    def __init__(self, scheme: str, host: str, port: int, tunnel: tuple[str, int] | None = None) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.tunnel = tunnel
+        self._idle: deque[tuple[http.client.HTTPConnection, float]] = deque()
+        self._lock = threading.Lock()
+
+    def _new(self, connect_timeout: float) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=connect_timeout)
+        if self.tunnel:
+            conn.set_tunnel(*self.tunnel)
+        return conn
+
+    def acquire(self, connect_timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        max_idle = env_float("HTTP_POOL_IDLE_SECONDS", DEFAULT_IDLE_SECONDS)
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used <= max_idle and conn.sock is not None:
+                    return conn, True
+                conn.close()
+        return self._new(connect_timeout), False
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        max_size = int(env_float("HTTP_POOL_SIZE", DEFAULT_POOL_SIZE))
+        with self._lock:
+            if len(self._idle) < max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            while self._idle:
+                self._idle.pop()[0].close()
+
+
+_POOLS: dict[tuple[str, str, int, tuple[str, int] | None], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def pool_for(url: str) -> tuple[ConnectionPool, str]:
+    parts = parse.urlsplit(url)
+    if parts.scheme not in {"http", "https"} or not parts.hostname:
+        raise ValueError(f"Unsupported URL: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    target = parts.path or "/"
+    if parts.query:
+        target = f"{target}?{parts.query}"
+
+    host, conn_port, tunnel = parts.hostname, port, None
+    proxy = request.getproxies().get(parts.scheme)
+    if proxy and not request.proxy_bypass(parts.hostname):
+        proxy_parts = parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+        host, conn_port = proxy_parts.hostname or "", proxy_parts.port or 8080
+        if parts.scheme == "https":
+            tunnel = (parts.hostname, port)
+        else:
+            target = url
+
+    key = (parts.scheme, host, conn_port, tunnel)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ConnectionPool(parts.scheme, host, conn_port, tunnel)
+    return pool, target
+
+
+def close_all() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _send(
+    pool: ConnectionPool,
+    target: str,
+    data: bytes,
+    headers: dict[str, str],
+    connect_timeout: float,
+    read_timeout: float,
+    reader: Callable[[http.client.HTTPResponse], tuple[T, bool]],
+) -> tuple[http.client.HTTPResponse, T, bool]:
+    conn, reused = pool.acquire(connect_timeout)
+    try:
+        if conn.sock is None:
+            conn.timeout = connect_timeout
+            conn.connect()
+        conn.sock.settimeout(read_timeout)
+        conn.request("POST", target, body=data, headers=headers)
+        resp = conn.getresponse()
+    except STALE_ERRORS:
+        conn.close()
+        if not reused:
+            raise
+        return _send(pool, target, data, headers, connect_timeout, read_timeout, reader)
+    except BaseException:
+        conn.close()
+        raise
+    try:
+        value, reusable = reader(resp)
+    except BaseException:
+        conn.close()
+        raise
+    if resp.will_close or not reusable:
+        conn.close()
+    else:
+        pool.release(conn)
+    return resp, value, reused
+
+
+def _prepare(
+    url: str, payload: dict, headers: dict[str, str] | None, read_timeout: float | None, connect_timeout: float | None
+) -> tuple[ConnectionPool, str, bytes, dict[str, str], float, float]:
+    pool, target = pool_for(url)
+    return (
+        pool,
+        target,
+        json.dumps(payload).encode("utf-8"),
+        {"Content-Type": "application/json", "Connection": "keep-alive", **(headers or {})},
+        connect_timeout or env_float("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT),
+        read_timeout or env_float("HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+    )
+
+
+def _failure(exc: Exception, elapsed_ms: float) -> dict:
+    error = f"timed out: {exc}" if isinstance(exc, socket.timeout) else str(exc)
+    return {"ok": False, "status": 0, "body": "", "error": error, "elapsed_ms": elapsed_ms}
+
+
+def post_json(
+    url: str,
+    payload: dict,
+    headers: dict[str, str] | None = None,
+    read_timeout: float | None = None,
+    connect_timeout: float | None = None,
+) -> dict:
+    """POST JSON over a pooled keep-alive connection.
+
+    Always returns a result dict: ok, status (0 on network errors), body,
+    elapsed_ms, reused and, when not ok, error.
+    """
+    started = time.monotonic()
+
+    def elapsed_ms() -> float:
+        return round((time.monotonic() - started) * 1000, 1)
+
+    try:
+        resp, raw, reused = _send(
+            *_prepare(url, payload, headers, read_timeout, connect_timeout), lambda r: (r.read(), True)
+        )
+    except Exception as exc:  # noqa: BLE001
+        return _failure(exc, elapsed_ms())
+
+    result = {
+        "ok": 200 <= resp.status < 300,
+        "status": resp.status,
+        "body": raw.decode("utf-8", errors="ignore"),
+        "elapsed_ms": elapsed_ms(),
+        "reused": reused,
+    }
+    if not result["ok"]:
+        result["error"] = f"HTTP Error {resp.status}: {resp.reason}"
+        if resp.getheader("Retry-After"):
+            result["retry_after"] = resp.getheader("Retry-After")
+    return result
+
+
+def post_sse(
+    url: str,
+    payload: dict,
+    on_data: Callable[[str], bool],
+    headers: dict[str, str] | None = None,
+    read_timeout: float | None = None,
+    connect_timeout: float | None = None,
+) -> dict:
+    """POST JSON and consume a text/event-stream response.
+
+    on_data receives each ``data:`` payload (without the ``[DONE]`` marker)
+    and returns False to abort; an aborted connection is closed instead of
+    being returned to the pool. Error responses are read whole and reported
+    like post_json.
+    """
+    started = time.monotonic()
+
+    def elapsed_ms() -> float:
+        return round((time.monotonic() - started) * 1000, 1)
+
+    stats = {"events": 0, "aborted": False, "first_event_ms": None}
+
+    def reader(resp: http.client.HTTPResponse) -> tuple[bytes, bool]:
+        if not 200 <= resp.status < 300:
+            return resp.read(), True
+        while True:
+            line = resp.readline()
+            if not line:
+                return b"", True
+            text = line.decode("utf-8", errors="ignore").strip()
+            if not text.startswith("data:"):
+                continue
+            data = text[5:].strip()
+            if data == "[DONE]":
+                resp.read()
+                return b"", True
+            stats["events"] += 1
+            if stats["first_event_ms"] is None:
+                stats["first_event_ms"] = elapsed_ms()
+            if not on_data(data):
+                stats["aborted"] = True
+                return b"", False
+
+    all_headers = {"Accept": "text/event-stream", **(headers or {})}
+    try:
+        resp, raw, reused = _send(*_prepare(url, payload, all_headers, read_timeout, connect_timeout), reader)
+    except Exception as exc:  # noqa: BLE001
+        return {**_failure(exc, elapsed_ms()), **stats}
+
+    ok = 200 <= resp.status < 300 and not stats["aborted"]
+    result = {
+        "ok": ok,
+        "status": resp.status,
+        "body": raw.decode("utf-8", errors="ignore"),
+        "elapsed_ms": elapsed_ms(),
+        "reused": reused,
+        **stats,
+    }
+    if not 200 <= resp.status < 300:
+        result["error"] = f"HTTP Error {resp.status}: {resp.reason}"
+        if resp.getheader("Retry-After"):
+            result["retry_after"] = resp.getheader("Retry-After")
+    return result
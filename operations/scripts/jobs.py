@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import contextlib
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+
+import runtime
+
+FINISHED_STATUS = {"succeeded", "failed"}
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def parse_limits(raw: str) -> dict[str, int]:
+    limits: dict[str, int] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        if key.strip() and value.strip().isdigit():
+            limits[key.strip()] = int(value.strip())
+    return limits
+
+
+class QueueFull(Exception):
+    def __init__(self, reason: str, retry_after: int, stats: dict) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.stats = stats
+
+
+class JobQueue:
+    def __init__(
+        self,
+        workers: int = 2,
+        retention: int = 200,
+        max_pending: int = 16,
+        limits: dict[str, int] | None = None,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.retention = max(1, retention)
+        self.max_pending = max(0, max_pending)
+        self.limits = dict(limits or {})
+        self._cond = threading.Condition()
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._runners: dict[str, Callable[[], dict]] = {}
+        self._lanes: dict[str, list[str]] = {}
+        self._pending: deque[str] = deque()
+        self._active: dict[str, int] = {}
+        self._durations: deque[float] = deque(maxlen=20)
+        self._threads: list[threading.Thread] = []
+
+    def limit_for(self, lane: str) -> int | None:
+        if lane in self.limits:
+            return self.limits[lane]
+        prefix = lane.split(":", 1)[0]
+        return self.limits.get(f"{prefix}:*") if ":" in lane else None
+
+    def _has_capacity(self, lanes: list[str]) -> bool:
+        for lane in lanes:
+            limit = self.limit_for(lane)
+            if limit is not None and self._active.get(lane, 0) >= limit:
+                return False
+        return True
+
+    def _acquire(self, lanes: list[str]) -> None:
+        for lane in lanes:
+            self._active[lane] = self._active.get(lane, 0) + 1
+
+    def _release(self, lanes: list[str]) -> None:
+        for lane in lanes:
+            self._active[lane] = max(0, self._active.get(lane, 0) - 1)
+        self._cond.notify_all()
+
+    def retry_after(self) -> int:
+        if not self._durations:
+            return 5
+        avg = sum(self._durations) / len(self._durations)
+        return max(1, math.ceil(avg * (len(self._pending) + 1) / self.workers))
+
+    @contextlib.contextmanager
+    def slot(self, lanes: list[str]) -> Iterator[None]:
+        with self._cond:
+            if not self._has_capacity(lanes):
+                raise QueueFull("lane_busy", self.retry_after(), self._stats())
+            self._acquire(lanes)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._release(lanes)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, action: str, command: list[str], fn: Callable[[], dict], lanes: list[str] | None = None) -> dict:
+        self.start()
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "action": action,
+            "command": command,
+            "lanes": list(lanes or []),
+            "status": "queued",
+            "stage": "queued",
+            "created_at": utc_now(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+        }
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull("queue_full", self.retry_after(), self._stats())
+            self._jobs[job_id] = job
+            self._runners[job_id] = fn
+            self._lanes[job_id] = job["lanes"]
+            self._pending.append(job_id)
+            self._prune()
+            self._cond.notify_all()
+            return dict(job)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, status: str | None = None, limit: int = 50) -> list[dict]:
+        with self._cond:
+            jobs = [dict(j) for j in reversed(self._jobs.values()) if status is None or j["status"] == status]
+        return [{k: v for k, v in j.items() if k != "result"} for j in jobs[:limit]]
+
+    def stats(self) -> dict:
+        with self._cond:
+            return self._stats()
+
+    def _stats(self) -> dict:
+        running = sum(1 for j in self._jobs.values() if j["status"] == "running")
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "running": running,
+            "workers": self.workers,
+            "lanes": {lane: count for lane, count in self._active.items() if count},
+        }
+
+    def _next_runnable(self) -> str | None:
+        for job_id in self._pending:
+            if self._has_capacity(self._lanes[job_id]):
+                self._pending.remove(job_id)
+                return job_id
+        return None
+
+    def _set(self, job_id: str, **fields: object) -> None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _prune(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in FINISHED_STATUS]
+        for jid in finished[: max(0, len(finished) - self.retention)]:
+            del self._jobs[jid]
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job_id = self._next_runnable()
+                while job_id is None:
+                    self._cond.wait()
+                    job_id = self._next_runnable()
+                fn = self._runners.pop(job_id)
+                lanes = self._lanes.pop(job_id)
+                self._acquire(lanes)
+            started = time.monotonic()
+            self._set(job_id, status="running", stage="starting", started_at=utc_now())
+            try:
+                with runtime.stage_hook(lambda stage, jid=job_id: self._set(jid, stage=stage)):
+                    result = fn()
+                status = "succeeded" if result.get("ok") else "failed"
+            except Exception as exc:  # noqa: BLE001
+                result = {"ok": False, "error": str(exc)}
+                status = "failed"
+            self._set(job_id, status=status, stage="finished", finished_at=utc_now(), result=result)
+            with self._cond:
+                self._durations.append(time.monotonic() - started)
+                self._release(lanes)
+                self._prune()
@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import re
+from typing import Callable
+
+HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+FILE_PATH_RE = re.compile(r"^([A-Za-z0-9_./\-]+\.[A-Za-z0-9]+)")
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+CODE_INFO_RE = re.compile(r"[A-Za-z0-9_-]*")
+DIFF_INFOS = {"diff", "patch", "udiff"}
+HEADER_PREFIXES = (
+    "index ",
+    "new file",
+    "deleted file",
+    "old mode",
+    "new mode",
+    "similarity",
+    "dissimilarity",
+    "rename ",
+    "copy ",
+    "Binary files",
+    "+++ ",
+)
+
+
+def safe_path(rel_path: str) -> bool:
+    return bool(rel_path) and not rel_path.startswith("/") and ".." not in rel_path.split("/")
+
+
+def _file_path(header: list[str]) -> str:
+    for prefix, strip in (("+++ ", "b/"), ("--- ", "a/")):
+        for line in header:
+            if line.startswith(prefix):
+                path = line[4:].split("\t", 1)[0].strip()
+                if path != "/dev/null":
+                    return path[2:] if path.startswith(strip) else path
+    parts = header[0].split() if header and header[0].startswith("diff --git ") else []
+    return parts[3][2:] if len(parts) > 3 and parts[3].startswith("b/") else ""
+
+
+class DiffBuilder:
+    """Splits diff lines into per-file sections, validating hunk line counts against their headers.
+
+    Fenced (``strict=False``) input is kept verbatim and every problem is
+    recorded. Raw (``strict=True``) input has no closing fence, so the hunk
+    counts decide where the diff ends: the first line that cannot continue
+    it ends the diff and ``line`` returns False, leaving trailing prose out.
+    Body lines directly after a complete hunk mean its header undercounts:
+    they are kept and recorded as an error, never cut off.
+    """
+
+    def __init__(self, strict: bool) -> None:
+        self.strict = strict
+        self.files: list[dict] = []
+        self.errors: list[str] = []
+        self.malformed = ""
+        self.active = False
+        self._header: list[str] = []
+        self._lines: list[str] = []
+        self._file_errors: list[str] = []
+        self._hunks = 0
+        self._hunk: list | None = None
+        self._overflow = False
+        self._adjacent = False
+        self._pending = ""
+
+    def _start_file(self, line: str) -> None:
+        self._end_file()
+        self.active = True
+        self._header = [line]
+        self._lines = [line]
+        self._file_errors = []
+        self._hunks = 0
+
+    def _error(self, message: str) -> None:
+        self._file_errors.append(message)
+
+    def _close_hunk(self) -> None:
+        if self._hunk is not None and (self._hunk[1] or self._hunk[2]):
+            self._error(f"{self._hunk[0]} is short by {self._hunk[1]} old and {self._hunk[2]} new lines")
+        self._hunk = None
+
+    def _end_file(self) -> None:
+        self._close_hunk()
+        if not self._lines:
+            return
+        path = _file_path(self._header)
+        errors = [f"{path or '?'}: {message}" for message in self._file_errors]
+        self.files.append({"path": path, "text": "\n".join(self._lines), "hunks": self._hunks, "errors": errors})
+        self.errors.extend(errors)
+        self._lines = []
+        self._header = []
+
+    def _hunk_line(self, line: str) -> bool:
+        hunk = self._hunk
+        tag = line[:1]
+        if tag == "\\":
+            pass
+        elif tag == "-" and hunk[1]:
+            hunk[1] -= 1
+        elif tag == "+" and hunk[2]:
+            hunk[2] -= 1
+        elif (tag == " " or not line) and hunk[1] and hunk[2]:
+            hunk[1] -= 1
+            hunk[2] -= 1
+        else:
+            return False
+        self._lines.append(line)
+        if not hunk[1] and not hunk[2]:
+            self._hunk = None
+            self._adjacent = True
+        return True
+
+    def line(self, line: str) -> bool:
+        adjacent, self._adjacent = self._adjacent, False
+        if self._hunk is not None:
+            if self._hunk_line(line):
+                return True
+            self._close_hunk()
+        if self._pending:
+            pending, self._pending = self._pending, ""
+            if line.startswith("+++ "):
+                self._start_file(pending)
+                self._header.append(line)
+                self._lines.append(line)
+                return True
+            if self.active:
+                self.end()
+            return self.line(line)
+        if not self.active and self.strict:
+            if line.startswith("diff --git "):
+                self._start_file(line)
+                return True
+            if line.startswith("--- "):
+                self._pending = line
+                return True
+            return False
+
+        match = HUNK_RE.match(line)
+        if line.startswith("diff --git "):
+            self._start_file(line)
+        elif line.startswith("--- ") and (self._hunks or not self.active):
+            if self.strict:
+                self._pending = line
+            else:
+                self._start_file(line)
+        elif match and self.active:
+            old_len = 1 if match.group(2) is None else int(match.group(2))
+            new_len = 1 if match.group(4) is None else int(match.group(4))
+            self._hunk = [match.group(0), old_len, new_len] if old_len or new_len else None
+            self._hunks += 1
+            self._overflow = False
+            self._lines.append(line)
+        elif self.active and not self._hunks and (line.startswith(HEADER_PREFIXES) or line.startswith("--- ")):
+            self._header.append(line)
+            self._lines.append(line)
+        elif self.active and line.startswith("\\"):
+            self._lines.append(line)
+        elif self.active and self._hunks and line[:1] in {" ", "+", "-"} and (adjacent or not self.strict):
+            # A body line straight after a full hunk means the header undercounts; keep it rather than cut the hunk.
+            if not self._overflow:
+                self._error("hunk has more lines than its header counts")
+                self._overflow = True
+            self._adjacent = True
+            self._lines.append(line)
+        elif self.strict:
+            self.end()
+            return False
+        elif not line.strip():
+            if self.active:
+                self._lines.append(line)
+        else:
+            self.malformed = self.malformed or line
+            self.errors.append(f"unexpected line in diff: {line[:80]}")
+            if self.active:
+                self._lines.append(line)
+        return True
+
+    def end(self) -> None:
+        """Close the current file section (end of a fence, or of a raw diff)."""
+        self._pending = ""
+        self._end_file()
+        self.active = False
+
+    @property
+    def started(self) -> bool:
+        return self.active or bool(self.files) or bool(self._pending)
+
+
+class OutputParser:
+    """Single pass over model output, one line at a time.
+
+    Recognises fenced blocks (backtick or tilde fences of any length; a
+    closing fence must be at least as long as the opener), diffs inside
+    ```diff/```patch fences or unlabelled fences that start like a diff, raw
+    diffs outside fences, and file blocks: a ``path/file.ext`` line directly
+    followed by a fenced code block (a diff fence after such a line counts
+    as both). Inside a code block, an opening fence with an info string
+    (```python) at least as long as the outer one nests until its own bare
+    closing fence, so markdown files that contain code blocks are kept whole.
+    """
+
+    def __init__(self, on_block: Callable[[str, str], None] | None = None) -> None:
+        self.on_block = on_block
+        self.blocks: list[tuple[str, str]] = []
+        self.errors: list[str] = []
+        self.fenced = DiffBuilder(strict=False)
+        self.raw = DiffBuilder(strict=True)
+        self._fence: dict | None = None
+        self._candidate: str | None = None
+
+    def feed_text(self, text: str) -> "OutputParser":
+        lines = text.split("\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        for line in lines:
+            self.line(line)
+        self.finish()
+        return self
+
+    def line(self, line: str) -> None:
+        if self._fence is not None:
+            self._fence_line(line)
+            return
+        if self.raw.line(line):
+            self._candidate = None
+            return
+        match = FENCE_RE.match(line)
+        if match and not (match.group(1)[0] == "`" and "`" in match.group(2)):
+            info = match.group(2).strip()
+            lang = info.split()[0].lower() if info else ""
+            path = self._candidate if CODE_INFO_RE.fullmatch(info) else None
+            kind = "diff" if lang in DIFF_INFOS else "code" if lang else "pending"
+            self._fence = {"marker": match.group(1), "kind": kind, "path": path, "lines": [], "depth": 0}
+            self._candidate = None
+            return
+        match = FILE_PATH_RE.match(line)
+        self._candidate = match.group(1).strip() if match else None
+
+    def _closes(self, line: str, marker: str) -> bool:
+        if marker[0] not in line[:4]:
+            return False
+        body = line.rstrip()
+        if len(body) - len(body.lstrip(" ")) > 3:
+            return False
+        body = body.lstrip(" ")
+        return len(body) >= len(marker) and body == marker[0] * len(body)
+
+    def _fence_line(self, line: str) -> None:
+        fence = self._fence
+        if fence["kind"] == "pending":
+            if not line.strip():
+                return
+            fence["kind"] = "diff" if line.startswith(("diff --git ", "--- ")) else "code"
+        if fence["kind"] == "diff":
+            if line[:1] == fence["marker"][0] and self._closes(line, fence["marker"]):
+                self.fenced.end()
+                self._close_code(fence)
+                self._fence = None
+                return
+            self.fenced.line(line)
+            if fence["path"] is not None:
+                fence["lines"].append(line)
+            return
+        marker = fence["marker"]
+        if marker[0] in line[:4]:
+            match = FENCE_RE.match(line)
+            if self._closes(line, marker):
+                if not fence["depth"]:
+                    self._close_code(fence)
+                    self._fence = None
+                    return
+                fence["depth"] -= 1
+            elif match and match.group(2).strip() and match.group(1)[0] == marker[0] and len(match.group(1)) >= len(marker):
+                fence["depth"] += 1
+        fence["lines"].append(line)
+
+    def _close_code(self, fence: dict) -> None:
+        rel_path = fence["path"]
+        if rel_path is None or not fence["lines"] or not safe_path(rel_path):
+            return
+        code = "\n".join(fence["lines"]) + "\n"
+        self.blocks.append((rel_path, code))
+        if self.on_block:
+            self.on_block(rel_path, code)
+
+    def finish(self) -> None:
+        fence, self._fence = self._fence, None
+        if fence is not None and fence["kind"] == "diff":
+            self.fenced.end()
+        if fence is not None and fence["path"]:
+            self.errors.append(f"unclosed code block for {fence['path']}")
+        self.raw.end()
+
+    @property
+    def diff_started(self) -> bool:
+        fence_is_diff = self._fence is not None and self._fence["kind"] == "diff"
+        return fence_is_diff or self.fenced.started or self.raw.started
+
+    @property
+    def blocks_started(self) -> bool:
+        return bool(self.blocks) or (self._fence is not None and self._fence["path"] is not None)
+
+    @property
+    def diff_files(self) -> list[dict]:
+        """Per-file sections of the diff: fenced diffs when present, otherwise raw ones."""
+        return self.fenced.files or self.raw.files
+
+    @property
+    def diff(self) -> str:
+        text = "\n".join(section["text"] for section in self.diff_files).strip()
+        return text + "\n" if text else ""
+
+    @property
+    def diff_errors(self) -> list[str]:
+        return (self.fenced if self.fenced.files else self.raw).errors
+
+
+def parse(text: str) -> OutputParser:
+    return OutputParser().feed_text(text)
+
+
+def extract_diff(text: str) -> str:
+    """All diff fences of a response joined in order (or the raw diff when there is no fence)."""
+    return parse(text).diff
+
+
+def parse_file_blocks(text: str) -> list[tuple[str, str]]:
+    """(path, code) for every ``path/file.ext`` line directly followed by a fenced code block."""
+    return parse(text).blocks
@@ -3,51 +3,43 @@
 from __future__ import annotations
 
 import json
-import os
 import sys
 from datetime import date
 from pathlib import Path
-from urllib import error, request
 
-ROOT = Path.cwd()
+import http_client
+import runtime
+import task_store
+import usage_log
+
+ROOT = Path(__file__).resolve().parents[2]
 TASKS_DIR = ROOT / "operations" / "hub" / "tasks"
 REPORTS_DIR = ROOT / "deliverables" / "reports"
 VALID_STATUS = {"todo", "in_progress", "review", "qa", "done", "blocked"}
 
-CODEX_DISPATCH_WEBHOOK = os.getenv("CODEX_DISPATCH_WEBHOOK", "")
-KIMI_DISPATCH_WEBHOOK = os.getenv("KIMI_DISPATCH_WEBHOOK", "")
-DISPATCH_API_TOKEN = os.getenv("DISPATCH_API_TOKEN", "")
-
 
 def ensure_dirs() -> None:
     TASKS_DIR.mkdir(parents=True, exist_ok=True)
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def task_files() -> list[Path]:
-    return sorted(
-        p for p in TASKS_DIR.glob("*.json") if p.name != "task-template.json"
-    )
-
-
-def read_task(path: Path) -> dict:
-    return json.loads(path.read_text(encoding="utf-8"))
+def store() -> task_store.TaskStore:
+    return task_store.get_store(TASKS_DIR)
 
 
 def write_task(task: dict) -> None:
-    path = TASKS_DIR / f"{task['id']}.json"
-    path.write_text(json.dumps(task, indent=2) + "\n", encoding="utf-8")
+    store().put(task)
 
 
 def all_tasks() -> list[dict]:
-    return [read_task(p) for p in task_files()]
+    return store().all()
 
 
 def find_task(task_id: str) -> dict:
-    path = TASKS_DIR / f"{task_id}.json"
-    if not path.exists():
+    task = store().get(task_id)
+    if task is None:
         raise ValueError(f"Task not found: {task_id}")
-    return read_task(path)
+    return task
 
 
 def print_usage() -> None:
@@ -56,6 +48,7 @@ def print_usage() -> None:
         "  python3 operations/scripts/orchestrate.py list\n"
         "  python3 operations/scripts/orchestrate.py validate\n"
         "  python3 operations/scripts/orchestrate.py next\n"
+        "  python3 operations/scripts/orchestrate.py ready\n"
         "  python3 operations/scripts/orchestrate.py cycle\n"
         "  python3 operations/scripts/orchestrate.py dispatch [TASK_ID]\n"
         "  python3 operations/scripts/orchestrate.py auto\n"
@@ -63,18 +56,10 @@ def print_usage() -> None:
         "  python3 operations/scripts/orchestrate.py move <TASK_ID> <STATUS>\n"
         "  python3 operations/scripts/orchestrate.py qa <TASK_ID> <PASS|CONDITIONAL|FAIL> [note]\n"
         "  python3 operations/scripts/orchestrate.py prompt <TASK_ID>\n"
+        "  python3 operations/scripts/orchestrate.py usage [SINCE_DAY] [UNTIL_DAY]\n"
     )
 
 
-def can_start(task: dict, tasks: list[dict]) -> bool:
-    deps = task.get("depends_on", [])
-    if not deps:
-        return True
-
-    by_id = {t["id"]: t for t in tasks}
-    return all(dep in by_id and by_id[dep].get("status") == "done" for dep in deps)
-
-
 def list_tasks() -> None:
     tasks = all_tasks()
     if not tasks:
@@ -117,6 +102,8 @@ def validate_tasks() -> None:
         if not isinstance(task.get("acceptance_criteria", []), list):
             errors.append(f"{task.get('id', '<unknown>')}: acceptance_criteria must be a list")
 
+    errors.extend(store().graph().errors())
+
     if errors:
         for err in errors:
             print(err, file=sys.stderr)
@@ -126,8 +113,7 @@ def validate_tasks() -> None:
 
 
 def next_task() -> None:
-    tasks = all_tasks()
-    candidate = next((t for t in tasks if t.get("status") == "todo" and can_start(t, tasks)), None)
+    candidate = store().first_runnable()
     if not candidate:
         print("No runnable todo task found.")
         return
@@ -139,6 +125,16 @@ def next_task() -> None:
     print(f"Handoff: {handoff.get('from', '-')} -> {handoff.get('to', '-')}")
 
 
+def ready_tasks() -> None:
+    ready = store().ready()
+    if not ready:
+        print("No runnable todo task found.")
+        return
+
+    for task in ready:
+        print(f"{task['id']} | {task.get('priority')} | {task.get('owner_agent')} | {task.get('title')}")
+
+
 def assign_task(task_id: str, agent: str) -> None:
     task = find_task(task_id)
     task["owner_agent"] = agent
@@ -240,8 +236,7 @@ def write_prompt_report(task: dict) -> Path:
 
 
 def run_cycle() -> str | None:
-    tasks = all_tasks()
-    candidate = next((t for t in tasks if t.get("status") == "todo" and can_start(t, tasks)), None)
+    candidate = store().first_runnable()
     if not candidate:
         print("No runnable todo task found.")
         return None
@@ -259,34 +254,27 @@ def run_cycle() -> str | None:
 def resolve_dispatch_target(task: dict) -> tuple[str, str]:
     owner = (task.get("owner_agent") or "").lower()
     if owner == "frontend":
-        return owner, KIMI_DISPATCH_WEBHOOK
-    return owner, CODEX_DISPATCH_WEBHOOK
+        return owner, runtime.getenv("KIMI_DISPATCH_WEBHOOK")
+    return owner, runtime.getenv("CODEX_DISPATCH_WEBHOOK")
 
 
 def post_json(url: str, payload: dict) -> tuple[int, str]:
-    data = json.dumps(payload).encode("utf-8")
-    headers = {"Content-Type": "application/json"}
-    if DISPATCH_API_TOKEN:
-        headers["Authorization"] = f"Bearer {DISPATCH_API_TOKEN}"
+    headers = {}
+    token = runtime.getenv("DISPATCH_API_TOKEN")
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
 
-    req = request.Request(url, data=data, headers=headers, method="POST")
-    try:
-        with request.urlopen(req, timeout=20) as resp:
-            body = resp.read().decode("utf-8", errors="ignore")
-            return resp.status, body
-    except error.HTTPError as exc:
-        body = exc.read().decode("utf-8", errors="ignore")
-        raise ValueError(f"Dispatch HTTP {exc.code}: {body}") from exc
-    except error.URLError as exc:
-        raise ValueError(f"Dispatch network error: {exc}") from exc
+    timeout = http_client.env_float("DISPATCH_TIMEOUT", 20.0)
+    res = http_client.post_json(url, payload, headers, read_timeout=timeout)
+    if res["ok"]:
+        return res["status"], res["body"]
+    if res["status"]:
+        raise ValueError(f"Dispatch HTTP {res['status']}: {res['body']}")
+    raise ValueError(f"Dispatch network error: {res['error']}")
 
 
 def get_latest_in_progress() -> dict | None:
-    tasks = [t for t in all_tasks() if t.get("status") == "in_progress"]
-    if not tasks:
-        return None
-    tasks.sort(key=lambda t: t.get("id", ""))
-    return tasks[-1]
+    return store().latest("in_progress")
 
 
 def dispatch_task(task_id: str | None = None) -> None:
@@ -349,14 +337,15 @@ def run_auto() -> None:
     print(f"Auto completed for {task_id}")
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
     ensure_dirs()
-    if len(sys.argv) < 2:
+    if not argv:
         print_usage()
         return 1
 
-    cmd = sys.argv[1]
-    args = sys.argv[2:]
+    cmd = argv[0]
+    args = argv[1:]
 
     try:
         if cmd == "list":
@@ -365,6 +354,8 @@ def main() -> int:
             validate_tasks()
         elif cmd == "next":
             next_task()
+        elif cmd == "ready":
+            ready_tasks()
         elif cmd == "cycle":
             run_cycle()
         elif cmd == "dispatch":
@@ -380,6 +371,9 @@ def main() -> int:
             qa_task(args[0], args[1], note)
         elif cmd == "prompt":
             prompt_for_task(args[0])
+        elif cmd == "usage":
+            rows = usage_log.aggregate(REPORTS_DIR, since=args[0] if args else None, until=args[1] if len(args) > 1 else None)
+            print(usage_log.format_report(rows))
         else:
             print_usage()
             return 1
@@ -2,13 +2,25 @@
 
 from __future__ import annotations
 
+import gzip
 import json
 import os
+import socket
 import subprocess
 import sys
+import threading
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import auto_team
+import jobs
+import orchestrate
+import run_log
+import runner
+import runtime
 
 ORCHESTRATE_PATH = Path(__file__).resolve().parent / "orchestrate.py"
 RUNNER_PATH = Path(__file__).resolve().parent / "runner.py"
@@ -19,6 +31,19 @@ TOKEN = os.getenv("ORCHESTRATOR_TOKEN", "")
 QA_SECRET = os.getenv("ORCHESTRATOR_QA_SECRET", "")
 HOST = os.getenv("ORCHESTRATOR_HOST", "0.0.0.0")
 PORT = int(os.getenv("ORCHESTRATOR_PORT", "8787"))
+EXEC_MODE = os.getenv("ORCHESTRATOR_EXEC_MODE", "inprocess").strip().lower() or "inprocess"
+KEEPALIVE_TIMEOUT = float(os.getenv("ORCHESTRATOR_KEEPALIVE_TIMEOUT", "15"))
+GZIP_MIN_BYTES = int(os.getenv("ORCHESTRATOR_GZIP_MIN_BYTES", "1024"))
+MAX_CONNECTIONS = int(os.getenv("ORCHESTRATOR_MAX_CONNECTIONS", "64"))
+OUTPUT_CHARS = int(os.getenv("ORCHESTRATOR_OUTPUT_CHARS", "65536"))
+ASYNC_ACTIONS = {"run", "autonomous"}
+DEFAULT_LIMITS = "run=4,autonomous=2,bootstrap=1,cycle=1,auto=1,dispatch=2,agent:*=1"
+JOBS = jobs.JobQueue(
+    workers=int(os.getenv("ORCHESTRATOR_JOB_WORKERS", "2")),
+    retention=int(os.getenv("ORCHESTRATOR_JOB_RETENTION", "200")),
+    max_pending=int(os.getenv("ORCHESTRATOR_MAX_PENDING", "16")),
+    limits=jobs.parse_limits(os.getenv("ORCHESTRATOR_ACTION_LIMITS", DEFAULT_LIMITS)),
+)
 
 
 def build_args(payload: dict) -> list[str]:
@@ -29,6 +54,10 @@ def build_args(payload: dict) -> list[str]:
         return ["validate"]
     if action == "next":
         return ["next"]
+    if action == "ready":
+        return ["ready"]
+    if action == "usage":
+        return ["usage", *[str(payload[k]) for k in ("since", "until") if payload.get(k)]]
     if action == "cycle":
         return ["cycle"]
     if action == "dispatch":
@@ -47,6 +76,8 @@ def build_args(payload: dict) -> list[str]:
         args = ["autonomous"]
         if task_id:
             args.append(task_id)
+        if payload.get("parallel"):
+            args.extend(["--parallel", str(int(payload["parallel"]))])
         return args
     if action == "bootstrap":
         args = ["bootstrap"]
@@ -109,6 +140,63 @@ def resolve_command(args: list[str]) -> list[str]:
     return [sys.executable, str(ORCHESTRATE_PATH), *args]
 
 
+def resolve_entrypoint(args: list[str]) -> tuple[Callable[[list[str]], int] | None, list[str]]:
+    if args and args[0] == "run":
+        return runner.main, args[1:]
+    if args and args[0] == "autonomous":
+        return auto_team.main, args[1:]
+    if args and args[0] == "bootstrap":
+        return None, args
+    return orchestrate.main, args
+
+
+def wants_isolation(payload: dict) -> bool:
+    return EXEC_MODE == "subprocess" or bool(payload.get("isolate"))
+
+
+def execute(args: list[str], env_overrides: dict[str, str], isolate: bool) -> tuple[subprocess.CompletedProcess, dict[str, str]]:
+    """Run a command in-process or as a subprocess and return its output tails.
+
+    Runs and autonomous cycles write their output to log files (the second
+    value); the short read/update actions keep it in memory and return no
+    log, so they cost no file I/O.
+    """
+    entrypoint, argv = resolve_entrypoint(args)
+    name = "-".join(args[:2]) or "command"
+    logged = bool(args) and args[0] in ASYNC_ACTIONS
+    if entrypoint is not None and not isolate:
+        if logged:
+            return run_log.invoke(entrypoint, argv, env_overrides, name, OUTPUT_CHARS)
+        result = runtime.invoke(entrypoint, argv, env_overrides)
+        return subprocess.CompletedProcess(argv, result.returncode, result.stdout[-OUTPUT_CHARS:], result.stderr[-OUTPUT_CHARS:]), {}
+
+    proc_env = os.environ.copy()
+    proc_env.update(env_overrides)
+    if logged:
+        return run_log.run(resolve_command(args), name, OUTPUT_CHARS, cwd=ROOT, env=proc_env)
+    proc = subprocess.run(resolve_command(args), cwd=ROOT, env=proc_env, text=True, capture_output=True, check=False)
+    return subprocess.CompletedProcess(proc.args, proc.returncode, proc.stdout[-OUTPUT_CHARS:], proc.stderr[-OUTPUT_CHARS:]), {}
+
+
+def owner_for(payload: dict) -> str:
+    task_id = payload.get("task_id")
+    try:
+        task = orchestrate.find_task(task_id) if task_id else orchestrate.get_latest_in_progress()
+    except ValueError:
+        task = None
+    if payload.get("action") == "autonomous" and not task_id:
+        return "auto"
+    return str((task or {}).get("owner_agent") or "unknown").lower()
+
+
+def lanes_for(payload: dict) -> list[str]:
+    action = str(payload.get("action"))
+    lanes = [action]
+    if action in ASYNC_ACTIONS:
+        lanes.append(f"agent:{owner_for(payload)}")
+    return lanes
+
+
 def build_env_overrides(payload: dict) -> dict[str, str]:
     env: dict[str, str] = {}
     mapping = {
@@ -123,32 +211,123 @@ def build_env_overrides(payload: dict) -> dict[str, str]:
     return env
 
 
+def command_result(args: list[str], env_overrides: dict[str, str], executed: tuple[subprocess.CompletedProcess, dict[str, str]]) -> dict:
+    result, log = executed
+    body: dict = {"ok": result.returncode == 0, "command": args, "stdout": result.stdout.strip()}
+    if result.returncode != 0:
+        body["stderr"] = result.stderr.strip()
+    if log:
+        body["log"] = log
+    body["env_overrides"] = env_overrides
+    return body
+
+
+def busy_response(exc: jobs.QueueFull) -> tuple[dict, dict[str, str]]:
+    body = {"ok": False, "error": exc.reason, "retry_after": exc.retry_after, "queue": exc.stats}
+    headers = {"Retry-After": str(exc.retry_after), "X-Queue-Depth": str(exc.stats.get("pending", 0))}
+    return body, headers
+
+
+class BoundedThreadingHTTPServer(ThreadingHTTPServer):
+    def __init__(self, server_address: tuple[str, int], handler: type, max_connections: int) -> None:
+        super().__init__(server_address, handler)
+        self._slots = threading.BoundedSemaphore(max(1, max_connections))
+
+    def process_request(self, request: socket.socket, client_address: tuple[str, int]) -> None:
+        if not self._slots.acquire(blocking=False):
+            body = json.dumps({"ok": False, "error": "too_many_connections", "retry_after": 1}).encode("utf-8")
+            head = (
+                "HTTP/1.1 429 Too Many Requests\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Retry-After: 1\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("ascii")
+            try:
+                request.sendall(head + body)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request: socket.socket, client_address: tuple[str, int]) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
 class Handler(BaseHTTPRequestHandler):
-    def _json(self, status: int, body: dict) -> None:
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
+    def _json(self, status: int, body: dict, headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        accepts_gzip = "gzip" in self.headers.get("Accept-Encoding", "").lower()
+        gzipped = GZIP_MIN_BYTES > 0 and accepts_gzip and len(data) >= GZIP_MIN_BYTES
+        if gzipped:
+            data = gzip.compress(data, compresslevel=5)
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Vary", "Accept-Encoding")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.end_headers()
-        self.wfile.write(json.dumps(body).encode("utf-8"))
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        content_length = int(self.headers.get("Content-Length", "0") or "0")
+        return self.rfile.read(content_length) if content_length > 0 else b""
+
+    def _authorized(self) -> bool:
+        if TOKEN and self.headers.get("X-Orchestrator-Token", "") != TOKEN:
+            self._json(HTTPStatus.UNAUTHORIZED, {"ok": False, "error": "invalid_token"})
+            return False
+        return True
 
     def do_GET(self) -> None:
-        if self.path == "/health":
-            self._json(HTTPStatus.OK, {"ok": True, "service": "orchestrator_server"})
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._json(HTTPStatus.OK, {"ok": True, "service": "orchestrator_server", "jobs": JOBS.stats()})
+            return
+        if url.path == "/jobs":
+            if not self._authorized():
+                return
+            query = parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            try:
+                limit = int(query.get("limit", ["50"])[0])
+            except ValueError:
+                limit = -1
+            if limit < 0:
+                self._json(HTTPStatus.BAD_REQUEST, {"ok": False, "error": "invalid_limit"})
+                return
+            self._json(HTTPStatus.OK, {"ok": True, "jobs": JOBS.list(status=status, limit=limit)})
+            return
+        if url.path.startswith("/jobs/"):
+            if not self._authorized():
+                return
+            job = JOBS.get(url.path[len("/jobs/") :])
+            if job is None:
+                self._json(HTTPStatus.NOT_FOUND, {"ok": False, "error": "job_not_found"})
+                return
+            self._json(HTTPStatus.OK, {"ok": True, "job": job})
             return
         self._json(HTTPStatus.NOT_FOUND, {"ok": False, "error": "not_found"})
 
     def do_POST(self) -> None:
+        raw = self._read_body()
         if self.path != "/event":
             self._json(HTTPStatus.NOT_FOUND, {"ok": False, "error": "not_found"})
             return
 
-        if TOKEN:
-            header_token = self.headers.get("X-Orchestrator-Token", "")
-            if header_token != TOKEN:
-                self._json(HTTPStatus.UNAUTHORIZED, {"ok": False, "error": "invalid_token"})
-                return
-
-        content_length = int(self.headers.get("Content-Length", "0"))
-        raw = self.rfile.read(content_length)
+        if not self._authorized():
+            return
 
         try:
             payload = json.loads(raw.decode("utf-8"))
@@ -158,48 +337,47 @@ class Handler(BaseHTTPRequestHandler):
                     return
             args = build_args(payload)
             env_overrides = build_env_overrides(payload)
+            isolate = wants_isolation(payload)
         except Exception as exc:
             self._json(HTTPStatus.BAD_REQUEST, {"ok": False, "error": str(exc)})
             return
 
-        proc_env = os.environ.copy()
-        proc_env.update(env_overrides)
-
-        result = subprocess.run(
-            resolve_command(args),
-            cwd=ROOT,
-            capture_output=True,
-            text=True,
-            env=proc_env,
-        )
-
-        if result.returncode != 0:
+        lanes = lanes_for(payload)
+        if payload.get("action") in ASYNC_ACTIONS and not payload.get("wait"):
+            try:
+                job = JOBS.submit(
+                    str(payload.get("action")),
+                    args,
+                    lambda: command_result(args, env_overrides, execute(args, env_overrides, isolate)),
+                    lanes=lanes,
+                )
+            except jobs.QueueFull as exc:
+                body, headers = busy_response(exc)
+                self._json(HTTPStatus.TOO_MANY_REQUESTS, body, headers=headers)
+                return
+            queue = JOBS.stats()
             self._json(
-                HTTPStatus.BAD_REQUEST,
-                {
-                    "ok": False,
-                    "command": args,
-                    "stdout": result.stdout.strip(),
-                    "stderr": result.stderr.strip(),
-                    "env_overrides": env_overrides,
-                },
+                HTTPStatus.ACCEPTED,
+                {"ok": True, "job": job, "queue": queue, "links": {"self": f"/jobs/{job['id']}"}},
+                headers={"Location": f"/jobs/{job['id']}", "X-Queue-Depth": str(queue["pending"])},
             )
             return
 
-        self._json(
-            HTTPStatus.OK,
-            {
-                "ok": True,
-                "command": args,
-                "stdout": result.stdout.strip(),
-                "env_overrides": env_overrides,
-            },
-        )
+        try:
+            with JOBS.slot(lanes):
+                body = command_result(args, env_overrides, execute(args, env_overrides, isolate))
+        except jobs.QueueFull as exc:
+            body, headers = busy_response(exc)
+            self._json(HTTPStatus.TOO_MANY_REQUESTS, body, headers=headers)
+            return
+        self._json(HTTPStatus.OK if body["ok"] else HTTPStatus.BAD_REQUEST, body)
 
 
 def main() -> int:
-    server = ThreadingHTTPServer((HOST, PORT), Handler)
-    print(f"orchestrator_server listening on http://{HOST}:{PORT}")
+    runtime.install_stream_proxies()
+    JOBS.start()
+    server = BoundedThreadingHTTPServer((HOST, PORT), Handler, MAX_CONNECTIONS)
+    print(f"orchestrator_server listening on http://{HOST}:{PORT} (exec_mode={EXEC_MODE})")
     server.serve_forever()
     return 0
 
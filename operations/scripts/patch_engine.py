@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+import runtime
+
+HUNK_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@(.*)$")
+DEFAULT_MAX_OFFSET = 1000
+
+
+def env_int(key: str, default: int) -> int:
+    try:
+        return int(runtime.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
+def fallback_enabled() -> bool:
+    return runtime.getenv("PATCH_FALLBACK", "3way").strip().lower() not in {"", "0", "off", "none", "no"}
+
+
+def _strip_prefix(path: str, prefix: str) -> str:
+    path = path.split("\t", 1)[0].strip()
+    return path[len(prefix) :] if path.startswith(prefix) else path
+
+
+def _section_path(header: list[str]) -> str:
+    new = next((_strip_prefix(line[4:], "b/") for line in header if line.startswith("+++ ")), "")
+    old = next((_strip_prefix(line[4:], "a/") for line in header if line.startswith("--- ")), "")
+    if new and new != "/dev/null":
+        return new
+    if old and old != "/dev/null":
+        return old
+    match = re.match(r"^diff --git a/(\S+) b/(\S+)", header[0]) if header else None
+    return match.group(2) if match else ""
+
+
+def parse_patch(diff_text: str) -> list[dict]:
+    """Split a unified diff into file sections: {"header", "path", "hunks"}.
+
+    Hunks keep only their old start line and body; lengths are recomputed
+    from the body because generated diffs often miscount them. A blank line
+    between hunk lines is read as an empty context line; trailing blank
+    lines are dropped.
+    """
+    lines = diff_text.splitlines()
+    files: list[dict] = []
+    current: dict | None = None
+    hunk: dict | None = None
+    blanks = 0
+    for index, line in enumerate(lines):
+        next_line = lines[index + 1] if index + 1 < len(lines) else ""
+        starts_file = line.startswith("diff --git ") or (
+            line.startswith("--- ") and next_line.startswith("+++ ") and (current is None or hunk is not None)
+        )
+        if starts_file:
+            current = {"header": [line], "path": "", "hunks": []}
+            files.append(current)
+            hunk = None
+            blanks = 0
+            continue
+        if current is None:
+            continue
+        match = HUNK_RE.match(line)
+        if match:
+            hunk = {"old_start": int(match.group(1)), "section": match.group(2), "lines": []}
+            current["hunks"].append(hunk)
+            blanks = 0
+        elif hunk is None:
+            if line:
+                current["header"].append(line)
+        elif line == "":
+            blanks += 1
+        elif line[:1] in {" ", "+", "-", "\\"}:
+            hunk["lines"].extend([" "] * blanks + [line])
+            blanks = 0
+        else:
+            hunk = None
+            blanks = 0
+    for section in files:
+        section["path"] = _section_path(section["header"])
+    return files
+
+
+def hunk_lengths(hunk: dict) -> tuple[int, int]:
+    old_len = sum(1 for line in hunk["lines"] if line[:1] in {" ", "-"})
+    new_len = sum(1 for line in hunk["lines"] if line[:1] in {" ", "+"})
+    return old_len, new_len
+
+
+def describe(section: dict) -> dict:
+    """Old/new paths and the kind of change a file section makes."""
+    header = section["header"]
+    old = next((_strip_prefix(line[4:], "a/") for line in header if line.startswith("--- ")), "")
+    new = next((_strip_prefix(line[4:], "b/") for line in header if line.startswith("+++ ")), "")
+    rename_from = next((line[len("rename from ") :].strip() for line in header if line.startswith("rename from ")), "")
+    rename_to = next((line[len("rename to ") :].strip() for line in header if line.startswith("rename to ")), "")
+    match = re.match(r"^diff --git a/(\S+) b/(\S+)", header[0]) if header else None
+    old_path = rename_from or (old if old and old != "/dev/null" else "") or (match.group(1) if match else "")
+    new_path = rename_to or (new if new and new != "/dev/null" else "") or (match.group(2) if match else "")
+    mode = next((line.split()[-1] for line in header if line.startswith(("new mode ", "new file mode "))), "")
+    return {
+        "old_path": old_path,
+        "new_path": new_path,
+        "added": old == "/dev/null" or any(line.startswith("new file mode") for line in header),
+        "deleted": new == "/dev/null" or any(line.startswith("deleted file mode") for line in header),
+        "mode": mode,
+        "binary": any(line.startswith(("Binary files", "GIT binary patch")) for line in header),
+    }
+
+
+def _safe(rel_path: str) -> bool:
+    return bool(rel_path) and not rel_path.startswith("/") and ".." not in rel_path.split("/")
+
+
+def _read(path: Path) -> tuple[list[str], str, bool] | None:
+    """(lines without EOL, EOL, ends with newline); None for binary or non-UTF-8 files."""
+    raw = path.read_bytes()
+    if b"\0" in raw[:8192]:
+        return None
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    eol = "\r\n" if "\r\n" in text[:65536] else "\n"
+    if not text:
+        return [], eol, True
+    lines = text.split("\n")
+    ends_newline = lines[-1] == ""
+    if ends_newline:
+        lines.pop()
+    if eol == "\r\n":
+        lines = [line[:-1] if line.endswith("\r") else line for line in lines]
+    return lines, eol, ends_newline
+
+
+def _find(norm: list[str], old: list[str], expected: int, low: int, max_offset: int) -> int:
+    """Nearest position >= low where ``old`` matches (trailing whitespace ignored), or -1."""
+    size = len(old)
+    high = len(norm) - size
+    if high < low:
+        return -1
+    first = old[0] if old else None
+    limit = max(expected - low, high - expected) if max_offset <= 0 else max_offset
+    for distance in range(limit + 1):
+        for pos in (expected + distance, expected - distance) if distance else (expected,):
+            if pos < low or pos > high:
+                continue
+            if first is not None and norm[pos] != first:
+                continue
+            if norm[pos : pos + size] == old:
+                return pos
+    return -1
+
+
+def apply_hunks(lines: list[str], hunks: list[dict], fuzz: int, max_offset: int) -> tuple[list[str] | None, list[dict], dict]:
+    """Apply hunks in order to ``lines``; returns (new lines or None, per-hunk results, end-of-file flags).
+
+    Each hunk is searched for at its declared line, shifted by the offset of
+    the previous hunk, then progressively further away (up to max_offset
+    lines, 0 for no limit). With fuzz N, up to N leading and trailing context
+    lines may be ignored, like patch(1). Added lines lose trailing
+    whitespace, as with ``git apply --whitespace=fix``.
+    """
+    norm = [line.rstrip() for line in lines]
+    out: list[str] = []
+    results: list[dict] = []
+    cursor = 0
+    shift = 0
+    eof: dict = {}
+    failed = False
+    for hunk in sorted(hunks, key=lambda h: h["old_start"]):
+        body = [line for line in hunk["lines"] if line[:1] in {" ", "+", "-"}]
+        for index, line in enumerate(hunk["lines"]):
+            if line.startswith("\\") and index:
+                previous = hunk["lines"][index - 1][:1]
+                if previous in {" ", "-"}:
+                    eof["old_no_newline"] = True
+                if previous in {" ", "+"}:
+                    eof["new_no_newline"] = True
+        lead = next((i for i, line in enumerate(body) if line[:1] != " "), len(body))
+        trail = next((i for i, line in enumerate(reversed(body)) if line[:1] != " "), len(body))
+        # A pure insertion's old_start names the line it goes after, not the first line it covers.
+        base = max(hunk["old_start"] - 1, 0) if any(line[:1] != "+" for line in body) else hunk["old_start"]
+        expected = base + shift
+        result = {"old_start": hunk["old_start"], "ok": False}
+        for level in range(fuzz + 1):
+            cut_lead, cut_trail = min(level, lead), min(level, trail)
+            if level and (cut_lead, cut_trail) == (min(level - 1, lead), min(level - 1, trail)):
+                break
+            trimmed = body[cut_lead : len(body) - cut_trail]
+            old = [line[1:].rstrip() for line in trimmed if line[:1] in {" ", "-"}]
+            pos = _find(norm, old, min(max(expected + cut_lead, cursor), len(norm)), cursor, max_offset)
+            if pos < 0:
+                continue
+            out.extend(lines[cursor:pos])
+            source = pos
+            for line in trimmed:
+                if line[:1] == " ":
+                    out.append(lines[source])
+                    source += 1
+                elif line[:1] == "-":
+                    source += 1
+                else:
+                    out.append(line[1:].rstrip())
+            shift = pos - cut_lead - base
+            result.update({"ok": True, "applied_at": pos + 1, "offset": shift, "fuzz": level})
+            cursor = source
+            eof["touches_end"] = source == len(lines)
+            break
+        if not result["ok"]:
+            failed = True
+        results.append(result)
+    out.extend(lines[cursor:])
+    return (None if failed else out), results, eof
+
+
+def plan(files: list[dict], repo_root: Path, fuzz: int | None = None, max_offset: int | None = None) -> list[dict]:
+    """Check every file section against ``repo_root`` in memory; nothing is written.
+
+    Each result carries ok/error, per-hunk results and, when ok, the new
+    content (``content``: str, or None for a deletion) to write. Sections
+    are applied in order, like ``git apply``: a section for a path an
+    earlier section already changed sees that change.
+    """
+    fuzz = env_int("PATCH_FUZZ", 0) if fuzz is None else fuzz
+    max_offset = env_int("PATCH_MAX_OFFSET", DEFAULT_MAX_OFFSET) if max_offset is None else max_offset
+    results: list[dict] = []
+    # Content of paths changed by earlier sections (None once deleted or renamed away).
+    staged: dict[str, tuple[list[str], str, bool] | None] = {}
+
+    def exists(rel_path: str) -> bool:
+        return staged[rel_path] is not None if rel_path in staged else (repo_root / rel_path).exists()
+
+    for section in files:
+        info = describe(section)
+        path = info["new_path"] or info["old_path"]
+        result: dict = {"path": path, "ok": False, "hunks": []}
+        if info["old_path"] and info["new_path"] and info["old_path"] != info["new_path"]:
+            result["old_path"] = info["old_path"]
+        results.append(result)
+        result["status"] = (
+            "added" if info["added"] else "deleted" if info["deleted"] else "renamed" if "old_path" in result else "modified"
+        )
+        if not all(_safe(p) for p in (info["old_path"], info["new_path"]) if p) or not path:
+            result["error"] = f"{path or '?'}: unsafe or missing path"
+            continue
+        if info["binary"]:
+            result["error"] = f"{path}: binary patches are not supported in-process"
+            result["unsupported"] = True
+            continue
+        source_path = info["old_path"] or path
+        source = repo_root / source_path
+        if info["added"]:
+            if exists(path):
+                result["error"] = f"{path}: already exists in working directory"
+                continue
+            current: tuple[list[str], str, bool] | None = ([], "\n", True)
+        elif source_path in staged:
+            current = staged[source_path]
+            if current is None:
+                result["error"] = f"{source_path}: No such file or directory"
+                continue
+        elif not source.is_file():
+            result["error"] = f"{info['old_path'] or path}: No such file or directory"
+            continue
+        else:
+            current = _read(source)
+            if current is None:
+                result["error"] = f"{path}: not a UTF-8 text file"
+                result["unsupported"] = True
+                continue
+        lines, eol, ends_newline = current
+        new_lines, hunk_results, eof = apply_hunks(lines, section["hunks"], fuzz, max_offset)
+        result["hunks"] = hunk_results
+        if new_lines is None:
+            failed = next(h for h in hunk_results if not h["ok"])
+            result["error"] = f"patch failed: {path}:{failed['old_start']}"
+            continue
+        if info["deleted"]:
+            if new_lines:
+                result["error"] = f"{path}: deleted file still has contents"
+                continue
+            result["content"] = None
+        else:
+            if eof.get("touches_end") and (eof.get("new_no_newline") or eof.get("old_no_newline")):
+                ends_newline = not eof.get("new_no_newline")
+            text = eol.join(new_lines)
+            result["content"] = text + eol if new_lines and ends_newline else text
+        if info["mode"]:
+            result["mode"] = info["mode"]
+        if "old_path" in result and exists(path):
+            result["error"] = f"{path}: already exists in working directory"
+            continue
+        result["ok"] = True
+        staged[path] = None if info["deleted"] else (new_lines, eol, ends_newline)
+        if "old_path" in result:
+            staged[result["old_path"]] = None
+    return results
+
+
+def _write(path: Path, content: str, mode: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    previous = path.stat().st_mode & 0o7777 if path.exists() else None
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as fh:
+        fh.write(content)
+    if mode:
+        os.chmod(tmp, int(mode, 8) & 0o7777)
+    elif previous is not None:
+        os.chmod(tmp, previous)
+    os.replace(tmp, path)
+
+
+def write(results: list[dict], repo_root: Path) -> None:
+    for result in results:
+        target = repo_root / result["path"]
+        if result["content"] is None:
+            target.unlink(missing_ok=True)
+            continue
+        mode = result.get("mode", "")
+        if "old_path" in result and not mode:
+            mode = oct((repo_root / result["old_path"]).stat().st_mode & 0o7777)[2:]
+        _write(target, result["content"], mode)
+        if "old_path" in result:
+            (repo_root / result["old_path"]).unlink(missing_ok=True)
+
+
+def git_3way(diff_text: str, repo_root: Path, dry_run: bool) -> dict:
+    """``git apply --3way`` (check first, so a conflicted merge never touches the tree); the index is left as it was."""
+    base = ["git", "apply", "--3way", "--whitespace=fix"]
+    check = subprocess.run(base + ["--check", "-"], cwd=repo_root, input=diff_text, text=True, capture_output=True, check=False)
+    output = (check.stdout + check.stderr).strip()
+    if check.returncode != 0 or "with conflicts" in output:
+        return {"ok": False, "returncode": check.returncode or 1, "stdout": check.stdout.strip(), "stderr": check.stderr.strip()}
+    if dry_run:
+        return {"ok": True, "returncode": 0, "stdout": check.stdout.strip(), "stderr": check.stderr.strip()}
+    # --3way updates the index; snapshot it so whatever the user had staged survives.
+    index = subprocess.run(["git", "rev-parse", "--git-path", "index"], cwd=repo_root, text=True, capture_output=True, check=False)
+    index_path = repo_root / index.stdout.strip() if index.returncode == 0 and index.stdout.strip() else None
+    snapshot = index_path.with_name(f"{index_path.name}.patch-engine.{os.getpid()}") if index_path else None
+    had_index = bool(index_path and index_path.is_file())
+    if had_index:
+        shutil.copy2(index_path, snapshot)
+    try:
+        proc = subprocess.run(base + ["-"], cwd=repo_root, input=diff_text, text=True, capture_output=True, check=False)
+    finally:
+        if had_index:
+            os.replace(snapshot, index_path)
+        elif index_path is not None:
+            index_path.unlink(missing_ok=True)
+    return {"ok": proc.returncode == 0, "returncode": proc.returncode, "stdout": proc.stdout.strip(), "stderr": proc.stderr.strip()}
+
+
+def changed_paths(results: list[dict]) -> list[str]:
+    paths: list[str] = []
+    for result in results:
+        for path in (result.get("old_path"), result["path"]):
+            if path and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def apply_patch(
+    diff_text: str,
+    repo_root: Path,
+    dry_run: bool = False,
+    fallback: bool | None = None,
+    fuzz: int | None = None,
+    max_offset: int | None = None,
+) -> dict:
+    """Parse, check and apply a unified diff in-process, all files or none.
+
+    Returns git-apply-like fields (ok, returncode, stdout, stderr) plus
+    per-file and per-hunk results and the changed files taken from the diff
+    itself. When a hunk cannot be placed, or the patch is binary, ``git
+    apply --3way`` is tried instead (PATCH_FALLBACK=none disables it).
+    """
+    files = parse_patch(diff_text)
+    results = plan(files, repo_root, fuzz, max_offset) if files else []
+    report = {
+        "ok": bool(results) and all(result["ok"] for result in results),
+        "engine": "native",
+        "dry_run": dry_run,
+        "files": [{k: v for k, v in result.items() if k != "content"} for result in results],
+        "changed_files": changed_paths(results),
+        "diff_bytes": len(diff_text.encode("utf-8")),
+    }
+    errors = [f"error: {result['error']}" for result in results if not result["ok"]]
+    if not files:
+        errors.append("error: No valid patches in input")
+    if report["ok"]:
+        if not dry_run:
+            write(results, repo_root)
+        report.update({"returncode": 0, "stdout": "", "stderr": ""})
+        return report
+    report.update({"returncode": 1, "stdout": "", "stderr": "\n".join(errors)})
+
+    if files and (fallback_enabled() if fallback is None else fallback):
+        git_result = git_3way(diff_text, repo_root, dry_run)
+        report["fallback"] = git_result
+        if git_result["ok"]:
+            report.update({"ok": True, "engine": "git-3way", "returncode": 0, "stdout": git_result["stdout"], "stderr": ""})
+    return report
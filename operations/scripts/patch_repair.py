@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import difflib
+from pathlib import Path
+
+import patch_engine
+import runtime
+
+DEFAULT_ROUNDS = 2
+CONTEXT_LINES = 15
+WHOLE_FILE_LINES = 120
+
+
+def rounds() -> int:
+    try:
+        return max(0, int(runtime.getenv("RUNNER_REPAIR_ROUNDS", str(DEFAULT_ROUNDS))))
+    except ValueError:
+        return DEFAULT_ROUNDS
+
+
+def format_file(section: dict, hunks: list[dict] | None = None) -> str:
+    """Render a file section (optionally only ``hunks``) with recomputed hunk headers."""
+    out = list(section["header"])
+    delta = 0
+    for hunk in sorted(section["hunks"] if hunks is None else hunks, key=lambda h: h["old_start"]):
+        old_len, new_len = patch_engine.hunk_lengths(hunk)
+        new_start = hunk["old_start"] + delta + (1 if old_len == 0 else 0)
+        out.append(f"@@ -{hunk['old_start']},{old_len} +{max(new_start, 1 if new_len else 0)},{new_len} @@{hunk['section']}")
+        out.extend(hunk["lines"])
+        delta += new_len - old_len
+    return "\n".join(out) + "\n"
+
+
+def format_patch(files: list[dict]) -> str:
+    return "".join(format_file(section) for section in files)
+
+
+def triage(files: list[dict], repo_root: Path) -> tuple[list[dict], list[dict]]:
+    """Split a patch into (accepted, rejected) hunk entries {"section", "hunk", "error"}.
+
+    Each file is checked whole first; only files that fail are checked hunk
+    by hunk. Checks run in memory through patch_engine, with no git
+    fallback, so triage never touches the working tree.
+    """
+    accepted: list[dict] = []
+    rejected: list[dict] = []
+    for section in files:
+        result = patch_engine.plan([section], repo_root)[0]
+        if result["ok"]:
+            accepted.extend({"section": section, "hunk": hunk, "error": ""} for hunk in section["hunks"])
+            continue
+        if not section["hunks"] or not result["hunks"]:
+            rejected.append({"section": section, "hunk": None, "error": result["error"]})
+            continue
+        for hunk in section["hunks"]:
+            single = patch_engine.plan([{**section, "hunks": [hunk]}], repo_root)[0]
+            entry = {"section": section, "hunk": hunk, "error": single.get("error", "")}
+            (accepted if single["ok"] else rejected).append(entry)
+    return accepted, rejected
+
+
+def file_context(repo_root: Path, rel_path: str, hunk: dict | None) -> str:
+    """Numbered current lines around ``hunk`` (the whole file when it is short)."""
+    if not rel_path or rel_path.startswith("/") or ".." in rel_path.split("/"):
+        return "Current file: (path outside the repository)"
+    path = repo_root / rel_path
+    if not path.is_file():
+        return "Current file: (does not exist)"
+    lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
+    if not lines:
+        return "Current file: (empty)"
+    start, end = 1, len(lines)
+    if len(lines) > WHOLE_FILE_LINES and hunk is not None:
+        old_len, _ = patch_engine.hunk_lengths(hunk)
+        start = min(len(lines), max(1, hunk["old_start"] - CONTEXT_LINES))
+        end = min(len(lines), hunk["old_start"] + old_len + CONTEXT_LINES)
+    width = len(str(end))
+    body = "\n".join(f"{n:>{width}}| {lines[n - 1]}" for n in range(start, end + 1))
+    return f"Current file, lines {start}-{end} of {len(lines)}:\n{body}"
+
+
+def repair_prompt(task: dict, rejected: list[dict], repo_root: Path) -> str:
+    parts = [
+        f"Task {task.get('id')}: {task.get('title')}",
+        "Some hunks of your patch did not apply; the rest of the patch was accepted and is kept as is.",
+        "Return corrected versions of ONLY the rejected hunks below as a unified git diff (file headers and",
+        "@@ hunks) in one ```diff fenced block. Context and removed lines must match the current file exactly.",
+    ]
+    for index, entry in enumerate(rejected, start=1):
+        section, hunk = entry["section"], entry["hunk"]
+        reason = entry["error"].splitlines()[0] if entry["error"] else "does not apply"
+        body = format_file({"header": section["header"], "hunks": [hunk] if hunk else []})
+        parts.extend(
+            [
+                "",
+                f"### Rejected hunk {index}: {section['path']} ({reason})",
+                "```diff",
+                body.rstrip("\n"),
+                "```",
+                file_context(repo_root, section["path"], hunk),
+            ]
+        )
+    return "\n".join(parts) + "\n"
+
+
+def _likeness(old: dict, new: dict) -> tuple[float, int]:
+    ratio = difflib.SequenceMatcher(None, old["lines"], new["lines"], autojunk=False).ratio()
+    return ratio, -abs(old["old_start"] - new["old_start"])
+
+
+def _add_hunk(target: dict, hunk: dict) -> None:
+    if all(hunk["lines"] != kept["lines"] for kept in target["hunks"]):
+        target["hunks"].append(hunk)
+
+
+def merge(accepted: list[dict], rejected: list[dict], repaired: list[dict]) -> list[dict]:
+    """Accepted hunks plus, for every rejected hunk, its repaired version (or the old one if none came back).
+
+    Each repaired hunk replaces the rejected hunk of its file it most
+    resembles. Rejected hunks nothing was returned for are carried over
+    unchanged, so the next triage rejects them again instead of the patch
+    silently losing them. Repaired sections for files that had nothing
+    rejected are ignored, so a reply that repeats accepted hunks cannot
+    apply them twice.
+    """
+    replacements: dict[str, list[dict]] = {}
+    for section in repaired:
+        replacements.setdefault(section["path"], []).append(section)
+
+    merged: dict[str, dict] = {}
+    for entry in accepted:
+        section = entry["section"]
+        merged.setdefault(section["path"], {**section, "hunks": []})["hunks"].append(entry["hunk"])
+    pending: dict[str, list[dict]] = {}
+    for entry in rejected:
+        pending.setdefault(entry["section"]["path"], []).append(entry)
+    for path, entries in pending.items():
+        sections = replacements.get(path, [])
+        target = merged.setdefault(path, {**(sections[0] if sections else entries[0]["section"]), "hunks": []})
+        unanswered = [entry["hunk"] for entry in entries if entry["hunk"] is not None]
+        for replacement in sections:
+            for hunk in replacement["hunks"]:
+                if unanswered:
+                    unanswered.remove(max(unanswered, key=lambda old: _likeness(old, hunk)))
+                _add_hunk(target, hunk)
+        for hunk in unanswered:
+            _add_hunk(target, hunk)
+    return list(merged.values())
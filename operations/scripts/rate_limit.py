@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import runtime
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_DB = ROOT / ".cache" / "rate_limits.sqlite3"
+DEFAULT_LIMITS = "kimi=30:200000,openai=60:400000"
+DEFAULT_EXPECTED_COMPLETION = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def env_number(key: str, default: float) -> float:
+    try:
+        return float(runtime.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
+def db_path() -> Path:
+    return Path(runtime.getenv("RATE_LIMIT_DB", "") or DEFAULT_DB)
+
+
+def parse_limits(spec: str) -> dict[str, tuple[float, float]]:
+    """``provider[/model]=RPM:TPM`` entries, comma separated; 0 disables one side."""
+    limits: dict[str, tuple[float, float]] = {}
+    for item in spec.split(","):
+        name, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        if not name.strip():
+            continue
+        try:
+            limits[name.strip()] = (float(rpm or 0), float(tpm or 0))
+        except ValueError:
+            continue
+    return limits
+
+
+def buckets_for(provider: str, model: str) -> list[tuple[str, float, str]]:
+    """(bucket name, per-minute capacity, unit) for every configured limit covering provider/model."""
+    limits = parse_limits(runtime.getenv("LLM_RATE_LIMITS", DEFAULT_LIMITS))
+    found: list[tuple[str, float, str]] = []
+    for scope in (provider, f"{provider}/{model}"):
+        rpm, tpm = limits.get(scope, (0.0, 0.0))
+        if rpm > 0:
+            found.append((f"{scope}:rpm", rpm, "requests"))
+        if tpm > 0:
+            found.append((f"{scope}:tpm", tpm, "tokens"))
+    return found
+
+
+def estimate_tokens(payload: dict) -> int:
+    chars = sum(len(str(m.get("content") or "")) for m in payload.get("messages") or [] if isinstance(m, dict))
+    return chars // 4 + int(env_number("LLM_RATE_EXPECTED_COMPLETION", DEFAULT_EXPECTED_COMPLETION))
+
+
+def connect() -> sqlite3.Connection:
+    path = db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _levels(conn: sqlite3.Connection, buckets: list[tuple[str, float, str]], now: float) -> dict[str, float]:
+    levels: dict[str, float] = {}
+    for name, capacity, _ in buckets:
+        row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            levels[name] = capacity
+        else:
+            levels[name] = min(capacity, row[0] + (now - row[1]) * capacity / 60.0)
+    return levels
+
+
+def _store(conn: sqlite3.Connection, levels: dict[str, float], now: float) -> None:
+    conn.executemany(
+        "INSERT INTO buckets(name, tokens, updated_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+        [(name, tokens, now) for name, tokens in levels.items()],
+    )
+
+
+def acquire(provider: str, model: str, tokens: int) -> tuple[float, str]:
+    """Block until one request and ``tokens`` fit every bucket; returns (seconds waited, error)."""
+    buckets = buckets_for(provider, model)
+    if not buckets:
+        return 0.0, ""
+    max_wait = env_number("LLM_RATE_MAX_WAIT", 300.0)
+    waited = 0.0
+    conn = connect()
+    try:
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = _levels(conn, buckets, now)
+                delay = 0.0
+                for name, capacity, unit in buckets:
+                    need = 1.0 if unit == "requests" else min(float(tokens), capacity)
+                    if levels[name] < need:
+                        delay = max(delay, (need - levels[name]) * 60.0 / capacity)
+                if delay == 0.0:
+                    for name, capacity, unit in buckets:
+                        levels[name] -= 1.0 if unit == "requests" else min(float(tokens), capacity)
+                    _store(conn, levels, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if delay == 0.0:
+                return waited, ""
+            if waited + delay > max_wait:
+                return waited, f"Rate limit for {provider}/{model} needs {delay:.1f}s more (LLM_RATE_MAX_WAIT={max_wait:g}s)"
+            time.sleep(delay)
+            waited += delay
+    finally:
+        conn.close()
+
+
+def settle(provider: str, model: str, estimated: int, result: dict) -> None:
+    """Correct token buckets with the real usage; a 429 drains the provider's buckets for everyone."""
+    buckets = buckets_for(provider, model)
+    if not buckets:
+        return
+    usage = result.get("usage") if isinstance(result.get("usage"), dict) else {}
+    actual = int(usage.get("prompt_tokens") or 0) + int(usage.get("completion_tokens") or 0)
+    throttled = int(result.get("status") or 0) == 429
+    if not throttled and not actual:
+        return
+    conn = connect()
+    try:
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = _levels(conn, buckets, now)
+            for name, capacity, unit in buckets:
+                if throttled:
+                    levels[name] = min(levels[name], 0.0)
+                elif unit == "tokens":
+                    levels[name] = min(capacity, levels[name] + estimated - actual)
+            _store(conn, levels, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect or reset shared LLM rate-limit buckets")
+    parser.add_argument("command", choices=["status", "reset"])
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    conn = connect()
+    try:
+        if args.command == "reset":
+            conn.execute("DELETE FROM buckets")
+        rows = conn.execute("SELECT name, tokens, updated_at FROM buckets ORDER BY name").fetchall()
+    finally:
+        conn.close()
+    limits = parse_limits(runtime.getenv("LLM_RATE_LIMITS", DEFAULT_LIMITS))
+    print(json.dumps({"limits": limits, "buckets": {name: round(tokens, 1) for name, tokens, _ in rows}}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Iterator
+
+import runtime
+
+DEFAULT_TTL = 60.0
+DEFAULT_FILTER = ""
+STATE_FILE = "runner-sync.json"
+
+
+def ttl() -> float:
+    try:
+        return float(runtime.getenv("RUNNER_SYNC_TTL", str(DEFAULT_TTL)))
+    except ValueError:
+        return DEFAULT_TTL
+
+
+def clone_filter() -> str:
+    value = runtime.getenv("RUNNER_CLONE_FILTER", DEFAULT_FILTER).strip()
+    return "" if value.lower() in {"", "none", "off", "0"} else value
+
+
+def clone_depth() -> int:
+    try:
+        return max(0, int(runtime.getenv("RUNNER_CLONE_DEPTH", "0") or 0))
+    except ValueError:
+        return 0
+
+
+def reference_repo() -> str:
+    return runtime.getenv("RUNNER_REFERENCE_REPO", "").strip()
+
+
+def _git(args: list[str], cwd: Path) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, text=True, capture_output=True, check=False)
+
+
+class Timings:
+    """Collects per-step durations (ms) for the sync report."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.steps: dict[str, float] = {}
+
+    def run(self, step: str, args: list[str], cwd: Path) -> subprocess.CompletedProcess:
+        started = time.monotonic()
+        proc = _git(args, cwd)
+        self.steps[step] = round(self.steps.get(step, 0.0) + (time.monotonic() - started) * 1000, 1)
+        return proc
+
+    def report(self) -> dict[str, float]:
+        return {**self.steps, "total": round((time.monotonic() - self.started) * 1000, 1)}
+
+
+@contextlib.contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Serialize syncs of one checkout across threads and processes, so a waiting runner reuses the fresh fetch."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def read_state(app_root: Path) -> dict:
+    try:
+        data = json.loads((app_root / ".git" / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_state(app_root: Path, state: dict) -> None:
+    path = app_root / ".git" / STATE_FILE
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def current_branch(app_root: Path) -> str:
+    try:
+        head = (app_root / ".git" / "HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return ""
+    return head[len("ref: refs/heads/") :] if head.startswith("ref: refs/heads/") else ""
+
+
+def update_mirror(mirror: Path, target_repo: str, timings: Timings) -> str:
+    """Create or refresh the local reference mirror; returns a warning, or "" when it is usable."""
+    if (mirror / "HEAD").exists():
+        proc = timings.run("mirror_fetch", ["-C", str(mirror), "fetch", "--prune", "origin"], mirror.parent)
+        return proc.stderr.strip() if proc.returncode != 0 else ""
+    mirror.parent.mkdir(parents=True, exist_ok=True)
+    proc = timings.run("mirror_clone", ["clone", "--mirror", target_repo, str(mirror)], mirror.parent)
+    return proc.stderr.strip() if proc.returncode != 0 else ""
+
+
+def clone(target_repo: str, app_root: Path, branch: str, timings: Timings, report: dict) -> bool:
+    args = ["clone"]
+    blob_filter = clone_filter()
+    depth = clone_depth()
+    if blob_filter:
+        args.append(f"--filter={blob_filter}")
+        report["filter"] = blob_filter
+    if depth:
+        args += ["--depth", str(depth), "--branch", branch]
+        report["depth"] = depth
+    mirror = reference_repo()
+    if mirror:
+        warning = update_mirror(Path(mirror).expanduser(), target_repo, timings)
+        if warning:
+            report["reference_warning"] = warning
+        else:
+            args += ["--reference-if-able", str(Path(mirror).expanduser()), "--dissociate"]
+            report["reference"] = mirror
+    app_root.parent.mkdir(parents=True, exist_ok=True)
+    proc = timings.run("clone", [*args, target_repo, str(app_root)], app_root.parent)
+    if proc.returncode != 0:
+        report.update({"ok": False, "error": "git clone failed", "stderr": proc.stderr.strip()})
+        return False
+    report["cloned"] = True
+    return True
+
+
+def sync(target_repo: str, app_root: Path, branch: str, update_checkout: bool = True) -> dict:
+    """Bring ``app_root`` up to date with ``origin/<branch>``, doing as little as possible.
+
+    The fetch is skipped while the last successful one (same remote) is
+    younger than RUNNER_SYNC_TTL seconds. The checkout is fast-forwarded
+    only when it is behind the last fetch (``fetched_at`` vs ``updated_at``
+    in the state file), so a warm sync is a couple of file reads. First-time
+    clones use RUNNER_CLONE_FILTER (partial clone, opt-in),
+    RUNNER_CLONE_DEPTH (shallow) and RUNNER_REFERENCE_REPO (local mirror
+    to borrow objects from). ``update_checkout=False`` only fetches.
+    """
+    report: dict = {"ok": True, "target_dir": str(app_root), "branch": branch}
+    if target_repo:
+        report["target_repo"] = target_repo
+    timings = Timings()
+    with locked(app_root.with_name(f".{app_root.name}.sync.lock")):
+        if not app_root.exists() or not (app_root / ".git").exists():
+            if not target_repo:
+                return {"ok": False, "error": "TARGET_DIR set but TARGET_REPO missing"}
+            if not clone(target_repo, app_root, branch, timings, report):
+                report["timings_ms"] = timings.report()
+                return report
+
+        state = read_state(app_root) if (app_root / ".git").is_dir() else {}
+        if target_repo and state.get("remote") != target_repo and not report.get("cloned"):
+            timings.run("set_url", ["remote", "set-url", "origin", target_repo], app_root)
+
+        age = time.time() - float(state.get("fetched_at") or 0)
+        fresh = report.get("cloned") or (state.get("remote") == (target_repo or state.get("remote")) and age < ttl())
+        fetched = False
+        if fresh:
+            report["fetch_skipped"] = True
+            if not report.get("cloned"):
+                report["fetch_age_s"] = round(age, 1)
+        else:
+            depth = clone_depth()
+            fetch = timings.run("fetch", ["fetch", "origin", *(["--depth", str(depth)] if depth else [])], app_root)
+            if fetch.returncode != 0:
+                report["fetch_warning"] = fetch.stderr.strip()
+            else:
+                fetched = True
+        if fetched or report.get("cloned"):
+            now = time.time()
+            state = {
+                "fetched_at": now,
+                "remote": target_repo or state.get("remote", ""),
+                # A fresh clone is already at the tip; a fetch leaves the checkout behind until it is merged.
+                "updated_at": now if report.get("cloned") else state.get("updated_at", 0),
+                "updated_branch": branch if report.get("cloned") else state.get("updated_branch", ""),
+            }
+
+        if update_checkout:
+            switched = False
+            if current_branch(app_root) != branch:
+                checkout = timings.run("checkout", ["checkout", branch], app_root)
+                if checkout.returncode != 0:
+                    report["checkout_warning"] = checkout.stderr.strip()
+                else:
+                    switched = True
+            # Fast-forward whenever the checkout has not caught up with the last fetch, even if this sync skipped
+            # fetching (a fetch-only sync, e.g. in worktree pool mode, may have moved origin/<branch>).
+            behind = bool(state.get("fetched_at")) and (
+                state.get("updated_at") != state.get("fetched_at") or state.get("updated_branch") != branch
+            )
+            if fetched or switched or behind:
+                merge = timings.run("merge", ["merge", "--ff-only", f"origin/{branch}"], app_root)
+                if merge.returncode != 0:
+                    report["pull_warning"] = merge.stderr.strip()
+                elif state.get("fetched_at"):
+                    state.update({"updated_at": state["fetched_at"], "updated_branch": branch})
+        if state and (app_root / ".git").is_dir() and state != read_state(app_root):
+            write_state(app_root, state)
+    report["timings_ms"] = timings.report()
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sync a target checkout the way the runner does and print the report")
+    parser.add_argument("--repo", default=runtime.getenv("TARGET_REPO", ""), help="Remote URL or path (default TARGET_REPO)")
+    parser.add_argument("--dir", default=runtime.getenv("TARGET_DIR", ""), help="Checkout directory (default TARGET_DIR)")
+    parser.add_argument("--branch", default=runtime.getenv("TARGET_BRANCH", "main") or "main", help="Branch (default TARGET_BRANCH)")
+    parser.add_argument("--fetch-only", action="store_true", help="Do not switch or fast-forward the checkout")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.dir:
+        print(json.dumps({"ok": False, "error": "--dir or TARGET_DIR is required"}))
+        return 1
+    report = sync(args.repo, Path(args.dir).expanduser(), args.branch, update_checkout=not args.fetch_only)
+    print(json.dumps(report, indent=2))
+    return 0 if report.get("ok") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import runtime
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_DIR = ROOT / ".cache" / "llm-responses"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+MODES = ("off", "read", "write", "readwrite", "replay")
+CACHED_FIELDS = ("status", "body", "parsed", "usage", "model")
+
+
+def mode() -> str:
+    value = runtime.getenv("RUNNER_CACHE", "off").strip().lower() or "off"
+    if value not in MODES:
+        raise ValueError(f"RUNNER_CACHE must be one of {', '.join(MODES)}: {value}")
+    return value
+
+
+def reads(current: str) -> bool:
+    return current in {"read", "readwrite", "replay"}
+
+
+def writes(current: str) -> bool:
+    return current in {"write", "readwrite"}
+
+
+def cache_dir() -> Path:
+    return Path(runtime.getenv("LLM_CACHE_DIR", "") or DEFAULT_CACHE_DIR)
+
+
+def max_bytes() -> int:
+    try:
+        return int(runtime.getenv("LLM_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+    except ValueError:
+        return DEFAULT_MAX_BYTES
+
+
+def cache_key(endpoint: str, payload: dict) -> str:
+    material = {
+        "endpoint": endpoint,
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "temperature": payload.get("temperature"),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def entry_path(key: str, root: Path | None = None) -> Path:
+    root = root or cache_dir()
+    return root / key[:2] / f"{key}.json"
+
+
+def get(key: str, root: Path | None = None) -> dict | None:
+    path = entry_path(key, root)
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    response = entry.get("response") if isinstance(entry, dict) else None
+    return response if isinstance(response, dict) else None
+
+
+def put(key: str, endpoint: str, response: dict, root: Path | None = None, content: str | None = None) -> Path:
+    """Write the cacheable fields of ``response``; ``content`` overrides its assistant text (streamed replies)."""
+    root = root or cache_dir()
+    path = entry_path(key, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    parsed = response.get("parsed") if isinstance(response.get("parsed"), dict) else {}
+    if content is None:
+        content = parsed.get("content")
+    entry = {
+        "key": key,
+        "endpoint": endpoint,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "response": {
+            **{field: response[field] for field in CACHED_FIELDS if field in response},
+            "parsed": {"content": content} if content is not None else {},
+            "ok": True,
+        },
+    }
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(entry, separators=(",", ":")) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    prune(root, max_bytes())
+    return path
+
+
+def entries(root: Path) -> list[tuple[float, int, Path]]:
+    found: list[tuple[float, int, Path]] = []
+    for path in root.glob("*/*.json"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        found.append((st.st_mtime, st.st_size, path))
+    return found
+
+
+def prune(root: Path, limit: int) -> int:
+    """Evict least recently used entries until the cache fits in ``limit`` bytes."""
+    if limit <= 0:
+        return 0
+    found = entries(root)
+    total = sum(size for _, size, _ in found)
+    removed = 0
+    for _, size, path in sorted(found):
+        if total <= limit:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def lookup(endpoint: str, payload: dict) -> dict | None:
+    """Cached response for this call, a replay-miss error, or None to call the API.
+
+    Hits keep the original ``usage`` for reference but carry ``cached: True``
+    so usage accounting does not bill them again.
+    """
+    current = mode()
+    if not reads(current):
+        return None
+    key = cache_key(endpoint, payload)
+    cached = get(key)
+    if cached is not None:
+        return {**cached, "elapsed_ms": 0.0, "cached": True, "cache": {"mode": current, "hit": True, "key": key}}
+    if current == "replay":
+        return {
+            "ok": False,
+            "status": 0,
+            "body": "",
+            "error": f"Cache miss in replay mode: {key}",
+            "cache": {"mode": current, "hit": False, "key": key},
+        }
+    return None
+
+
+def store(endpoint: str, payload: dict, response: dict, content: str | None = None) -> None:
+    """Record a fresh response; pass ``content`` when the reply text is not in ``response`` (streaming)."""
+    current = mode()
+    if current == "off":
+        return
+    key = cache_key(endpoint, payload)
+    response["cache"] = {"mode": current, "hit": False, "key": key}
+    if writes(current) and response.get("ok") and not response.get("error"):
+        put(key, endpoint, response, content=content)
+        response["cache"]["stored"] = True
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LLM response cache maintenance")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    parser.add_argument("--max-bytes", type=int, help="prune: size limit (defaults to LLM_CACHE_MAX_BYTES)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    root = cache_dir()
+    if args.command == "stats":
+        found = entries(root)
+        print(json.dumps({"dir": str(root), "entries": len(found), "bytes": sum(s for _, s, _ in found)}, indent=2))
+    elif args.command == "prune":
+        print(f"Removed {prune(root, args.max_bytes if args.max_bytes is not None else max_bytes())} entries")
+    else:
+        found = entries(root)
+        for _, _, path in found:
+            path.unlink(missing_ok=True)
+        print(f"Removed {len(found)} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
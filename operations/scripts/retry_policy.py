@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+import runtime
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_STATE_DIR = ROOT / ".cache" / "circuits"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+BREAKER_STATUS = {0, 404, 500, 502, 503, 504}
+
+
+def env_number(key: str, default: float) -> float:
+    try:
+        return float(runtime.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
+def state_dir() -> Path:
+    return Path(runtime.getenv("CIRCUIT_STATE_DIR", "") or DEFAULT_STATE_DIR)
+
+
+def parse_retry_after(value: object) -> float | None:
+    text = str(value or "").strip()
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable(result: dict) -> bool:
+    if result.get("ok") or result.get("events") or result.get("local"):
+        return False
+    status = int(result.get("status") or 0)
+    if status == 0:
+        return bool(result.get("error"))
+    return status in RETRYABLE_STATUS
+
+
+def is_breaker_failure(result: dict) -> bool:
+    if result.get("ok") or result.get("events") or result.get("local"):
+        return False
+    return int(result.get("status") or 0) in BREAKER_STATUS
+
+
+def backoff_delay(attempt: int, result: dict) -> float:
+    cap = env_number("HTTP_RETRY_MAX_DELAY", 30.0)
+    retry_after = parse_retry_after(result.get("retry_after"))
+    if retry_after is not None:
+        return min(retry_after, cap)
+    base = env_number("HTTP_RETRY_BASE_DELAY", 0.5)
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+@contextmanager
+def _locked_state(provider: str) -> Iterator[dict]:
+    root = state_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / f"{provider}.json"
+    with open(root / f"{provider}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                state = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                state = {}
+            before = dict(state)
+            yield state
+            if state != before:
+                tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(state, indent=2) + "\n", encoding="utf-8")
+                os.replace(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def circuit_allows(provider: str) -> tuple[bool, dict]:
+    """Closed: allow. Open: refuse until open_until. Afterwards one half-open probe is let through."""
+    now = time.time()
+    with _locked_state(provider) as state:
+        if state.get("state") != "open":
+            return True, state
+        if now < float(state.get("open_until") or 0):
+            return False, dict(state)
+        if now < float(state.get("probe_until") or 0):
+            return False, dict(state)
+        state["probe_until"] = now + env_number("CIRCUIT_PROBE_SECONDS", 60.0)
+        return True, dict(state)
+
+
+def record_outcome(provider: str, result: dict) -> dict:
+    threshold = int(env_number("CIRCUIT_FAILURE_THRESHOLD", 5))
+    now = time.time()
+    with _locked_state(provider) as state:
+        if result.get("local"):
+            # Nothing reached the provider (e.g. the rate-limit wait cap was hit): the breaker learns nothing.
+            # A half-open probe that ended this way gives its slot back so the next call can probe.
+            state.pop("probe_until", None)
+            return dict(state)
+        if not is_breaker_failure(result):
+            if result.get("ok") or state.get("state") == "open":
+                state.clear()
+                state.update({"state": "closed", "failures": 0})
+            return dict(state)
+        state["failures"] = int(state.get("failures") or 0) + 1
+        state["last_error"] = str(result.get("error") or result.get("status"))[:200]
+        state["last_failure_at"] = now
+        if threshold > 0 and (state["failures"] >= threshold or state.get("state") == "open"):
+            state["state"] = "open"
+            state["open_until"] = now + env_number("CIRCUIT_COOLDOWN_SECONDS", 300.0)
+            state.pop("probe_until", None)
+        return dict(state)
+
+
+def call(provider: str, send: Callable[[], dict]) -> dict:
+    """Run ``send`` under the provider's circuit breaker with jittered exponential backoff.
+
+    Transport errors, 429 and 5xx are retried up to HTTP_RETRY_ATTEMPTS times,
+    honouring Retry-After; streams that already delivered events and local
+    failures (``local``: nothing was sent) are never retried. The result
+    gains attempts and retry_wait_ms.
+    """
+    allowed, state = circuit_allows(provider)
+    if not allowed:
+        until = datetime.fromtimestamp(float(state.get("open_until") or 0), timezone.utc).isoformat()
+        return {
+            "ok": False,
+            "status": 0,
+            "body": "",
+            "error": f"Circuit open for {provider} until {until}: {state.get('last_error', '')}",
+            "circuit": "open",
+            "local": True,
+            "attempts": 0,
+            "retry_wait_ms": 0.0,
+        }
+
+    max_retries = int(env_number("HTTP_RETRY_ATTEMPTS", 3))
+    waited = 0.0
+    attempt = 0
+    while True:
+        result = send()
+        attempt += 1
+        state = record_outcome(provider, result)
+        if not is_retryable(result) or attempt > max_retries or state.get("state") == "open":
+            break
+        delay = backoff_delay(attempt - 1, result)
+        time.sleep(delay)
+        waited += delay
+    result["attempts"] = attempt
+    result["retry_wait_ms"] = round(waited * 1000, 1)
+    if state.get("state") == "open":
+        result["circuit"] = "open"
+    return result
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect or reset provider circuit breakers")
+    parser.add_argument("command", choices=["status", "reset"])
+    parser.add_argument("provider", nargs="?", help="Provider name (default: all)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    root = state_dir()
+    providers = [args.provider] if args.provider else sorted(p.stem for p in root.glob("*.json"))
+    for provider in providers:
+        with _locked_state(provider) as state:
+            if args.command == "reset":
+                state.clear()
+                state.update({"state": "closed", "failures": 0})
+            print(f"{provider}: {json.dumps(state)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
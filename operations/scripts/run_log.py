@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import collections
+import io
+import itertools
+import os
+import re
+import subprocess
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import runtime
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_LOG_DIR = ROOT / "deliverables" / "logs"
+DEFAULT_TAIL_CHARS = 4000
+DEFAULT_MAX_FILES = 1000
+PRUNE_EVERY = 100
+_SEQ = itertools.count(1)
+_PRUNE_LOCK = threading.Lock()
+
+
+def log_dir() -> Path:
+    return Path(runtime.getenv("RUN_LOG_DIR", "") or DEFAULT_LOG_DIR)
+
+
+def max_files() -> int:
+    try:
+        return int(runtime.getenv("RUN_LOG_MAX_FILES", str(DEFAULT_MAX_FILES)))
+    except ValueError:
+        return DEFAULT_MAX_FILES
+
+
+def display(path: Path) -> str:
+    try:
+        return str(path.relative_to(ROOT))
+    except ValueError:
+        return str(path)
+
+
+def prune(directory: Path) -> None:
+    """Keep only the newest RUN_LOG_MAX_FILES log files (``0`` keeps everything)."""
+    limit = max_files()
+    if limit <= 0:
+        return
+    with _PRUNE_LOCK:
+        try:
+            files = sorted(directory.glob("*.log"), key=lambda p: p.name)
+        except OSError:
+            return
+        for old in files[: max(0, len(files) - limit)]:
+            old.unlink(missing_ok=True)
+
+
+def new_paths(name: str) -> dict[str, Path]:
+    """Fresh stdout/stderr log paths for one run, e.g. ``20261018T120000Z-checks-T-042-4711-3.stdout.log``.
+
+    The directory is pruned on the first run of a process and then every
+    PRUNE_EVERY runs, not on each one.
+    """
+    directory = log_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    seq = next(_SEQ)
+    if seq % PRUNE_EVERY == 1:
+        prune(directory)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", name).strip("-")[:60] or "run"
+    base = f"{stamp}-{slug}-{os.getpid()}-{seq}"
+    return {"stdout": directory / f"{base}.stdout.log", "stderr": directory / f"{base}.stderr.log"}
+
+
+def tail(path: Path, chars: int = DEFAULT_TAIL_CHARS) -> str:
+    """Last ``chars`` characters of a log file, reading at most 4 bytes per character from its end."""
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            fh.seek(max(0, size - chars * 4))
+            data = fh.read()
+    except OSError:
+        return ""
+    return data.decode("utf-8", errors="replace")[-chars:]
+
+
+class LogFiles:
+    """Open log files for one child process: pass ``stdout``/``stderr`` to Popen so the child writes straight to disk.
+
+    Nothing of the output is held in memory; ``tails`` reads the bounded
+    ends back once the child is done.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.paths = new_paths(name)
+        self.stdout = open(self.paths["stdout"], "wb")
+        self.stderr = open(self.paths["stderr"], "wb")
+
+    def close(self) -> None:
+        self.stdout.close()
+        self.stderr.close()
+
+    def __enter__(self) -> "LogFiles":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def tails(self, chars: int = DEFAULT_TAIL_CHARS) -> tuple[str, str]:
+        for fh in (self.stdout, self.stderr):
+            if not fh.closed:
+                fh.flush()
+        return tail(self.paths["stdout"], chars), tail(self.paths["stderr"], chars)
+
+    def describe(self) -> dict[str, str]:
+        return {key: display(path) for key, path in self.paths.items()}
+
+
+def run(
+    args: list[str] | str, name: str, chars: int = DEFAULT_TAIL_CHARS, **kwargs
+) -> tuple[subprocess.CompletedProcess, dict[str, str]]:
+    """``subprocess.run`` with output streamed to log files; the result carries only the last ``chars`` of each."""
+    with LogFiles(name) as logs:
+        proc = subprocess.run(args, stdout=logs.stdout, stderr=logs.stderr, check=False, **kwargs)
+        stdout, stderr = logs.tails(chars)
+    return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr), logs.describe()
+
+
+class TailWriter(io.TextIOBase):
+    """Text stream that writes through to a log file and keeps only the last ``chars`` characters in a ring buffer.
+
+    ``getvalue`` returns the tail, so it can stand in for ``io.StringIO``
+    when capturing in-process output.
+    """
+
+    def __init__(self, path: Path, chars: int = DEFAULT_TAIL_CHARS) -> None:
+        self.path = path
+        self.chars = chars
+        self._fh = open(path, "w", encoding="utf-8", errors="replace")
+        self._chunks: collections.deque[str] = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, s: str) -> int:
+        with self._lock:
+            self._fh.write(s)
+            kept = s[-self.chars:]
+            self._chunks.append(kept)
+            self._size += len(kept)
+            while self._chunks and self._size - len(self._chunks[0]) >= self.chars:
+                self._size -= len(self._chunks.popleft())
+        return len(s)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._fh.flush()
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._fh.close()
+
+    def getvalue(self) -> str:
+        with self._lock:
+            return "".join(self._chunks)[-self.chars:]
+
+
+def invoke(
+    main: Callable[[list[str]], int], argv: list[str], env: dict[str, str], name: str, chars: int = DEFAULT_TAIL_CHARS
+) -> tuple[subprocess.CompletedProcess, dict[str, str]]:
+    """``runtime.invoke`` with in-process output written to log files; the result carries only the tails."""
+    paths = new_paths(name)
+    out, err = TailWriter(paths["stdout"], chars), TailWriter(paths["stderr"], chars)
+    try:
+        result = runtime.invoke(main, argv, env, out, err)
+    finally:
+        out.close()
+        err.close()
+    return result, {key: display(path) for key, path in paths.items()}
@@ -3,14 +3,37 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
+import contextvars
 import json
 import os
-import re
+import queue
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from urllib import error, request
+from typing import Callable, Iterator
+
+import check_plan
+import check_shards
+import completion_stream
+import context_pack
+import http_client
+import model_output
+import patch_engine
+import patch_repair
+import rate_limit
+import repo_sync
+import response_cache
+import retry_policy
+import runtime
+import task_store
+import usage_log
+import worktree_pool
 
 CONTROL_ROOT = Path(__file__).resolve().parents[2]
 TASKS_DIR = CONTROL_ROOT / "operations" / "hub" / "tasks"
@@ -30,32 +53,24 @@ def load_env_file(path: Path) -> None:
 
 
 def read_task(task_id: str) -> dict:
-    p = TASKS_DIR / f"{task_id}.json"
-    if not p.exists():
+    task = task_store.get_store(TASKS_DIR).get(task_id)
+    if task is None:
         raise ValueError(f"Task not found: {task_id}")
-    return json.loads(p.read_text(encoding="utf-8"))
+    return task
 
 
 def write_task(task: dict) -> None:
-    p = TASKS_DIR / f"{task.get('id')}.json"
-    p.write_text(json.dumps(task, indent=2) + "\n", encoding="utf-8")
+    task_store.get_store(TASKS_DIR).put(task)
 
 
 def latest_in_progress_task() -> dict:
-    tasks = []
-    for p in TASKS_DIR.glob("*.json"):
-        if p.name == "task-template.json":
-            continue
-        task = json.loads(p.read_text(encoding="utf-8"))
-        if task.get("status") == "in_progress":
-            tasks.append(task)
-    if not tasks:
+    task = task_store.get_store(TASKS_DIR).latest("in_progress")
+    if task is None:
         raise ValueError("No in_progress task found")
-    tasks.sort(key=lambda t: t.get("id", ""))
-    return tasks[-1]
+    return task
 
 
-def render_prompts(task: dict) -> tuple[str, str]:
+def render_prompts(task: dict, context: str = "") -> tuple[str, str]:
     codex_lines = [
         f"You are the {task.get('owner_agent')} agent for task {task.get('id')}.",
         f"Task title: {task.get('title')}",
@@ -75,6 +90,8 @@ def render_prompts(task: dict) -> tuple[str, str]:
             "- Ensure output files listed above are created/updated.",
         ]
     )
+    if context:
+        codex_lines.extend(["", context])
 
     kimi_lines = [
         "Role: Frontend UI Agent (Kimi 2.5)",
@@ -84,39 +101,114 @@ def render_prompts(task: dict) -> tuple[str, str]:
         "Example: src/todo/ui/TodoCard.tsx then ```tsx ... ```.",
         "No explanations outside code blocks.",
     ]
+    if context:
+        kimi_lines.extend(["", context])
     return "\n".join(codex_lines), "\n".join(kimi_lines)
 
 
-def post_json(url: str, payload: dict, headers: dict[str, str], timeout: int = 180) -> dict:
-    req = request.Request(
-        url,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json", **headers},
-        method="POST",
-    )
+def extract_token_usage(body: str) -> dict:
     try:
-        with request.urlopen(req, timeout=timeout) as resp:
-            body = resp.read().decode("utf-8", errors="ignore")
-            return {"ok": True, "status": resp.status, "body": body}
-    except error.HTTPError as exc:
-        return {
-            "ok": False,
-            "status": exc.code,
-            "body": exc.read().decode("utf-8", errors="ignore"),
-            "error": str(exc),
-        }
-    except Exception as exc:  # noqa: BLE001
-        return {"ok": False, "status": 0, "body": "", "error": str(exc)}
+        usage = json.loads(body).get("usage") or {}
+    except Exception:  # noqa: BLE001
+        return {}
+    if not isinstance(usage, dict):
+        return {}
+    return {
+        "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or 0),
+    }
 
 
-def call_kimi(prompt: str) -> dict:
-    api_key = os.getenv("KIMI_API_KEY", "")
-    if not api_key:
-        return {"ok": False, "error": "KIMI_API_KEY missing"}
+def send_completion(provider: str, payload: dict, send: Callable[[], dict], usage_of: Callable[[dict], dict]) -> dict:
+    """Send under the shared rate limiter and the provider's retry policy; reports rate_limit_wait_ms."""
+    model = str(payload.get("model") or "")
+    estimated = rate_limit.estimate_tokens(payload)
+    waited = 0.0
+
+    def attempt() -> dict:
+        nonlocal waited
+        wait, error = rate_limit.acquire(provider, model, estimated)
+        waited += wait
+        if error:
+            return {"ok": False, "status": 0, "body": "", "error": error, "local": True}
+        res = send()
+        rate_limit.settle(provider, model, estimated, {**res, "usage": usage_of(res)})
+        return res
+
+    res = retry_policy.call(provider, attempt)
+    res["rate_limit_wait_ms"] = round(waited * 1000, 1)
+    return res
+
+
+def stream_enabled() -> bool:
+    return runtime.getenv("RUNNER_STREAM", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def open_stream(task: dict, target: str, app_root: Path) -> completion_stream.StreamCollector:
+    limit = completion_stream.abort_chars()
+    transcript = REPORTS_DIR / f"{task.get('id')}-{target}-raw.md"
+    if target == "kimi":
+        originals: dict[str, bytes | None] = {}
+        parser = completion_stream.FileBlockStreamParser(
+            on_block=lambda rel_path, code: write_kimi_files([(rel_path, code)], app_root, originals), limit=limit
+        )
+        return completion_stream.StreamCollector(parser, transcript, on_abort=lambda: restore_files(originals, app_root))
+    return completion_stream.StreamCollector(completion_stream.DiffStreamParser(limit=limit), transcript)
 
-    base_url = os.getenv("KIMI_BASE_URL", "https://api.moonshot.ai/v1")
-    model = os.getenv("KIMI_MODEL", "kimi-k2.5")
-    kimi_temperature = float(os.getenv("KIMI_TEMPERATURE", "1"))
+
+def stream_completion(
+    provider: str, url: str, payload: dict, headers: dict[str, str], stream: completion_stream.StreamCollector
+) -> dict:
+    res = send_completion(
+        provider,
+        payload,
+        lambda: http_client.post_sse(url, {**payload, "stream": True}, stream.on_data, headers),
+        lambda _: stream.usage,
+    )
+    streamed = stream.finish()
+    res["usage"] = streamed["usage"] or extract_token_usage(res.get("body", ""))
+    if streamed["chars"]:
+        res["transcript"] = str(stream.transcript.relative_to(CONTROL_ROOT))
+    res["stream"] = {
+        "events": res.pop("events", 0),
+        "first_event_ms": res.pop("first_event_ms", None),
+        "first_token_ms": streamed["first_token_ms"],
+        "chars": streamed["chars"],
+    }
+    res.pop("aborted", None)
+    # The full reply is in the transcript; only what the parser extracted is kept.
+    parsed: dict = {}
+    if isinstance(stream.parser, completion_stream.DiffStreamParser):
+        parsed["diff"] = stream.parser.diff
+    elif isinstance(stream.parser, completion_stream.FileBlockStreamParser):
+        parsed["files"] = [rel_path for rel_path, _ in stream.parser.blocks]
+        parsed["files_bytes"] = sum(len(code.encode("utf-8")) for _, code in stream.parser.blocks)
+    res["parsed"] = parsed
+    if streamed["error"]:
+        res["ok"] = False
+        res["error"] = f"Stream aborted: {streamed['error']}"
+    if not res.get("ok"):
+        reverted = stream.abort()
+        if reverted:
+            parsed["reverted_files"] = reverted
+    return res
+
+
+def transcript_text(res: dict) -> str | None:
+    """Full text of a streamed reply, read back from its transcript; None when ``res`` was not streamed."""
+    if "stream" not in res:
+        return None
+    if not res.get("transcript"):
+        return ""
+    # StreamCollector.finish() terminates the transcript with one extra newline.
+    return (CONTROL_ROOT / res["transcript"]).read_text(encoding="utf-8").removesuffix("\n")
+
+
+def call_kimi(prompt: str, stream: completion_stream.StreamCollector | None = None) -> dict:
+    api_key = runtime.getenv("KIMI_API_KEY", "")
+    base_url = runtime.getenv("KIMI_BASE_URL", "https://api.moonshot.ai/v1")
+    model = runtime.getenv("KIMI_MODEL", "kimi-k2.5")
+    kimi_temperature = float(runtime.getenv("KIMI_TEMPERATURE", "1"))
     url = f"{base_url.rstrip('/')}/chat/completions"
 
     payload = {
@@ -131,22 +223,39 @@ def call_kimi(prompt: str) -> dict:
         "temperature": kimi_temperature,
     }
 
-    res = post_json(url, payload, {"Authorization": f"Bearer {api_key}"})
-    if not res.get("ok"):
-        return res
+    cached = response_cache.lookup(url, payload)
+    if cached is not None:
+        return cached
+    if not api_key:
+        return {"ok": False, "error": "KIMI_API_KEY missing"}
 
-    try:
-        parsed = json.loads(res.get("body", "{}"))
-        content = parsed["choices"][0]["message"]["content"]
-        res["parsed"] = {"content": content}
-    except Exception:  # noqa: BLE001
-        pass
+    if stream is not None:
+        res = stream_completion("kimi", url, payload, {"Authorization": f"Bearer {api_key}"}, stream)
+    else:
+        res = send_completion(
+            "kimi",
+            payload,
+            lambda: http_client.post_json(url, payload, {"Authorization": f"Bearer {api_key}"}),
+            lambda r: extract_token_usage(r.get("body", "")),
+        )
+        res["usage"] = extract_token_usage(res.get("body", ""))
+        if res.get("ok"):
+            try:
+                parsed = json.loads(res.get("body", "{}"))
+                content = parsed["choices"][0]["message"]["content"]
+                res["parsed"] = {"content": content}
+            except Exception:  # noqa: BLE001
+                pass
+    res["model"] = model
+    response_cache.store(url, payload, res, content=transcript_text(res))
     return res
 
 
-def call_codex(prompt: str, task: dict) -> dict:
-    webhook = os.getenv("CODEX_DISPATCH_WEBHOOK", "")
-    bearer = os.getenv("DISPATCH_API_TOKEN", "")
+def call_codex(
+    prompt: str, task: dict, stream: completion_stream.StreamCollector | None = None, temperature: float = 0.1
+) -> dict:
+    webhook = runtime.getenv("CODEX_DISPATCH_WEBHOOK", "")
+    bearer = runtime.getenv("DISPATCH_API_TOKEN", "")
 
     if webhook:
         payload = {
@@ -158,14 +267,13 @@ def call_codex(prompt: str, task: dict) -> dict:
             "outputs": task.get("outputs", []),
         }
         headers = {"Authorization": f"Bearer {bearer}"} if bearer else {}
-        return post_json(webhook, payload, headers)
-
-    openai_key = os.getenv("OPENAI_API_KEY", "")
-    if not openai_key:
-        return {"ok": False, "error": "No CODEX_DISPATCH_WEBHOOK or OPENAI_API_KEY configured"}
+        res = retry_policy.call("codex-webhook", lambda: http_client.post_json(webhook, payload, headers))
+        res["model"] = "codex-webhook"
+        return res
 
-    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    model = os.getenv("CODEX_MODEL", "gpt-4.1-mini")
+    openai_key = runtime.getenv("OPENAI_API_KEY", "")
+    base_url = runtime.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    model = runtime.getenv("CODEX_MODEL", "gpt-4.1-mini")
     url = f"{base_url.rstrip('/')}/chat/completions"
     payload = {
         "model": model,
@@ -176,22 +284,37 @@ def call_codex(prompt: str, task: dict) -> dict:
             },
             {"role": "user", "content": prompt},
         ],
-        "temperature": 0.1,
+        "temperature": temperature,
     }
-    return post_json(url, payload, {"Authorization": f"Bearer {openai_key}"})
+    cached = response_cache.lookup(url, payload)
+    if cached is not None:
+        return cached
+    if not openai_key:
+        return {"ok": False, "error": "No CODEX_DISPATCH_WEBHOOK or OPENAI_API_KEY configured"}
+
+    if stream is not None:
+        res = stream_completion(
+            "openai",
+            url,
+            {**payload, "stream_options": {"include_usage": True}},
+            {"Authorization": f"Bearer {openai_key}"},
+            stream,
+        )
+    else:
+        res = send_completion(
+            "openai",
+            payload,
+            lambda: http_client.post_json(url, payload, {"Authorization": f"Bearer {openai_key}"}),
+            lambda r: extract_token_usage(r.get("body", "")),
+        )
+        res["usage"] = extract_token_usage(res.get("body", ""))
+    res["model"] = model
+    response_cache.store(url, payload, res, content=transcript_text(res))
+    return res
 
 
 def append_usage(entry: dict) -> None:
-    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
-    usage_path = REPORTS_DIR / f"usage-{datetime.now(timezone.utc).date().isoformat()}.json"
-    usage = []
-    if usage_path.exists():
-        try:
-            usage = json.loads(usage_path.read_text(encoding="utf-8"))
-        except Exception:  # noqa: BLE001
-            usage = []
-    usage.append(entry)
-    usage_path.write_text(json.dumps(usage, indent=2) + "\n", encoding="utf-8")
+    usage_log.append(entry, REPORTS_DIR)
 
 
 def run_cmd(args: list[str], cwd: Path) -> subprocess.CompletedProcess:
@@ -199,43 +322,21 @@ def run_cmd(args: list[str], cwd: Path) -> subprocess.CompletedProcess:
 
 
 def sync_target_repo() -> tuple[Path, dict]:
-    target_repo = os.getenv("TARGET_REPO", "").strip()
-    target_dir = os.getenv("TARGET_DIR", "").strip()
-    branch = os.getenv("TARGET_BRANCH", "main").strip() or "main"
+    target_repo = runtime.getenv("TARGET_REPO", "").strip()
+    target_dir = runtime.getenv("TARGET_DIR", "").strip()
+    branch = runtime.getenv("TARGET_BRANCH", "main").strip() or "main"
 
     if not target_dir:
         return CONTROL_ROOT, {"ok": True, "mode": "control_root"}
 
     app_root = Path(target_dir).expanduser()
-    report: dict = {"ok": True, "target_dir": str(app_root), "branch": branch}
-
-    if target_repo:
-        report["target_repo"] = target_repo
-
-    if not app_root.exists() or not (app_root / ".git").exists():
-        if not target_repo:
-            return CONTROL_ROOT, {"ok": False, "error": "TARGET_DIR set but TARGET_REPO missing"}
-        app_root.parent.mkdir(parents=True, exist_ok=True)
-        clone = run_cmd(["git", "clone", target_repo, str(app_root)], cwd=CONTROL_ROOT)
-        if clone.returncode != 0:
-            return CONTROL_ROOT, {"ok": False, "error": "git clone failed", "stderr": clone.stderr.strip()}
-        report["cloned"] = True
-
-    if target_repo:
-        run_cmd(["git", "-C", str(app_root), "remote", "set-url", "origin", target_repo], cwd=CONTROL_ROOT)
-
-    fetch = run_cmd(["git", "-C", str(app_root), "fetch", "origin"], cwd=CONTROL_ROOT)
-    if fetch.returncode != 0:
-        report["fetch_warning"] = fetch.stderr.strip()
-
-    checkout = run_cmd(["git", "-C", str(app_root), "checkout", branch], cwd=CONTROL_ROOT)
-    if checkout.returncode != 0:
-        report["checkout_warning"] = checkout.stderr.strip()
-
-    pull = run_cmd(["git", "-C", str(app_root), "pull", "--ff-only", "origin", branch], cwd=CONTROL_ROOT)
-    if pull.returncode != 0:
-        report["pull_warning"] = pull.stderr.strip()
-
+    pooled = worktree_pool.pool_size()
+    # With a worktree pool, runs happen in leased worktrees; the shared checkout itself is only fetched.
+    report = repo_sync.sync(target_repo, app_root, branch, update_checkout=not pooled)
+    if not report.get("ok"):
+        return CONTROL_ROOT, report
+    if pooled:
+        report["worktree_pool"] = pooled
     return app_root, report
 
 
@@ -247,75 +348,54 @@ def extract_assistant_content(body: str) -> str:
         return ""
 
 
-def extract_diff(text: str) -> str:
-    match = re.search(r"```diff\s*(.*?)```", text, flags=re.DOTALL | re.IGNORECASE)
-    if match:
-        return match.group(1).strip() + "\n"
-
-    if "diff --git " in text:
-        idx = text.find("diff --git ")
-        return text[idx:].strip() + "\n"
-
-    if "--- " in text and "+++ " in text:
-        idx = text.find("--- ")
-        return text[idx:].strip() + "\n"
-
-    return ""
-
-
-def changed_files(repo_root: Path) -> list[str]:
-    proc = run_cmd(["git", "diff", "--name-only"], cwd=repo_root)
-    if proc.returncode != 0:
-        return []
-    return [line.strip() for line in proc.stdout.splitlines() if line.strip()]
-
-
 def apply_diff(diff_text: str, repo_root: Path) -> dict:
-    proc = subprocess.run(
-        ["git", "apply", "--whitespace=fix", "-"],
-        cwd=repo_root,
-        input=diff_text,
-        text=True,
-        capture_output=True,
-        check=False,
-    )
-    ok = proc.returncode == 0
-    return {
-        "ok": ok,
-        "returncode": proc.returncode,
-        "stdout": proc.stdout.strip(),
-        "stderr": proc.stderr.strip(),
-        "changed_files": changed_files(repo_root) if ok else [],
-    }
+    return patch_engine.apply_patch(diff_text, repo_root)
 
 
-def maybe_run_checks(task: dict, repo_root: Path) -> dict:
+def check_command(task: dict) -> str:
     owner = (task.get("owner_agent") or "").lower()
     if owner == "frontend":
-        cmd = os.getenv("RUNNER_TEST_COMMAND_FRONTEND", "").strip()
-    else:
-        cmd = os.getenv("RUNNER_TEST_COMMAND", "").strip()
+        return runtime.getenv("RUNNER_TEST_COMMAND_FRONTEND", "").strip()
+    return runtime.getenv("RUNNER_TEST_COMMAND", "").strip()
+
 
+def maybe_run_checks(task: dict, repo_root: Path, changed: list[str] | None = None) -> dict:
+    cmd = check_command(task)
     if not cmd:
         return {"ok": True, "skipped": True, "reason": "RUNNER_TEST_COMMAND not set"}
 
-    proc = subprocess.run(
-        cmd,
-        cwd=repo_root,
-        shell=True,
-        text=True,
-        capture_output=True,
-        check=False,
-    )
-    return {
-        "ok": proc.returncode == 0,
-        "skipped": False,
-        "command": cmd,
-        "returncode": proc.returncode,
-        "stdout": proc.stdout[-4000:],
-        "stderr": proc.stderr[-4000:],
-        "task_id": task.get("id"),
-    }
+    selection = check_plan.plan(changed, repo_root)
+    if selection["mode"] == "none":
+        return {"ok": True, "skipped": True, "reason": selection["reason"], "plan": selection, "task_id": task.get("id")}
+    if selection["mode"] == "selected" and check_plan.PLACEHOLDER not in cmd:
+        selection.update({"mode": "full", "reason": "command has no {targets} placeholder"})
+    full_command = check_plan.render(cmd, [])
+    command = check_plan.render(cmd, selection["targets"] if selection["mode"] == "selected" else [])
+    owner = (task.get("owner_agent") or "").lower()
+    tree = check_plan.tree_hash(repo_root, check_plan.check_paths(owner)) if check_plan.cache_enabled() else ""
+    cached = check_plan.lookup(tree, command, full_command)
+    if cached is not None:
+        return {
+            "ok": bool(cached.get("ok")),
+            "skipped": False,
+            "cached": True,
+            "command": cached.get("command", command),
+            "returncode": cached.get("returncode"),
+            "stdout": cached.get("stdout", ""),
+            "stderr": cached.get("stderr", ""),
+            "cached_at": cached.get("at"),
+            "tree": tree,
+            "plan": selection,
+            "task_id": task.get("id"),
+        }
+
+    targets = selection["targets"] if selection["mode"] == "selected" else []
+    result = {"ok": False, "skipped": False, "cached": False, "command": command}
+    result.update(check_shards.run(check_shards.build_jobs(cmd, targets), repo_root, f"checks-{task.get('id')}"))
+    if not result["timed_out"] and result.get("stopped") != "overall timeout":
+        check_plan.store(tree, command, {key: result[key] for key in ("ok", "command", "returncode", "stdout", "stderr", "elapsed_ms")})
+    result.update({"tree": tree, "plan": selection, "task_id": task.get("id")})
+    return result
 
 
 def set_task_status(task_id: str, status: str) -> dict:
@@ -327,16 +407,18 @@ def set_task_status(task_id: str, status: str) -> dict:
 
 
 def run_codex_automation(task: dict, codex_response: dict, app_root: Path) -> dict:
-    body = codex_response.get("body", "")
-    content = extract_assistant_content(body)
-    diff_text = extract_diff(content)
+    parsed = codex_response.get("parsed") if isinstance(codex_response.get("parsed"), dict) else {}
+    content = parsed.get("content") or extract_assistant_content(codex_response.get("body", ""))
+    output = None if "diff" in parsed else model_output.parse(content)
+    diff_text = parsed["diff"] if output is None else output.diff
 
-    if not content:
+    if not content and not (output is None and codex_response.get("transcript")):
         return {"ok": False, "error": "No assistant content in Codex response"}
 
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
     raw_path = REPORTS_DIR / f"{task.get('id')}-codex-raw.md"
-    raw_path.write_text(content + "\n", encoding="utf-8")
+    if not codex_response.get("transcript"):
+        raw_path.write_text(content + "\n", encoding="utf-8")
 
     if not diff_text:
         return {
@@ -345,36 +427,124 @@ def run_codex_automation(task: dict, codex_response: dict, app_root: Path) -> di
             "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
         }
 
+    automation = apply_and_check(task, diff_text, app_root, str(raw_path.relative_to(CONTROL_ROOT)))
+    if not automation.get("ok") and "checks" not in automation:
+        automation["raw_content"] = content
+        automation["diff"] = diff_text
+        if output is not None and output.diff_errors:
+            automation["diff_errors"] = output.diff_errors[:20]
+    return automation
+
+
+def apply_and_check(task: dict, diff_text: str, app_root: Path, raw_report: str) -> dict:
+    runtime.set_stage("apply")
     apply_result = apply_diff(diff_text, app_root)
     if not apply_result.get("ok"):
         return {
             "ok": False,
             "error": "Failed to apply generated diff",
             "apply": apply_result,
-            "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
-            "raw_content": content,
+            "raw_report": raw_report,
         }
 
-    check_result = maybe_run_checks(task, app_root)
+    runtime.set_stage("checks")
+    check_result = maybe_run_checks(task, app_root, apply_result.get("changed_files"))
     if not check_result.get("ok"):
         return {
             "ok": False,
             "error": "Checks failed after applying diff",
             "apply": apply_result,
             "checks": check_result,
-            "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
+            "raw_report": raw_report,
         }
 
     status_result = set_task_status(str(task.get("id")), "review")
     return {
         "ok": True,
-        "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
+        "raw_report": raw_report,
         "apply": apply_result,
         "checks": check_result,
         "status_update": status_result,
     }
 
 
+def reprompt_codex(task: dict, codex_prompt: str, automation: dict, app_root: Path, stream: bool) -> tuple[dict, list[dict]]:
+    first_err = automation.get("apply", {}).get("stderr", "") if isinstance(automation.get("apply"), dict) else ""
+    retry_prompt = (
+        f"{codex_prompt}\n\n"
+        "Your previous patch failed to apply.\n"
+        f"Apply error: {first_err}\n"
+        "Return a corrected unified git diff only in one ```diff fenced block."
+    )
+    runtime.set_stage("retry")
+    retry_stream = open_stream(task, "codex", app_root) if stream else None
+    retry_response = call_codex(retry_prompt, task, retry_stream)
+    if not retry_response.get("ok"):
+        return automation, [retry_response]
+    retry_automation = run_codex_automation(task, retry_response, app_root)
+    retry_automation.pop("raw_content", None)
+    retry_automation.pop("diff", None)
+    retry_automation["retried"] = True
+    retry_automation["first_error"] = first_err
+    return retry_automation, [retry_response]
+
+
+def repair_codex_patch(task: dict, codex_prompt: str, automation: dict, app_root: Path, stream: bool) -> tuple[dict, list[dict]]:
+    """Re-prompt only for the hunks git rejected, then apply accepted and repaired hunks as one patch.
+
+    Runs up to RUNNER_REPAIR_ROUNDS rounds; each round sends the rejected
+    hunks with the current file lines around them instead of the whole task
+    prompt. Hunk headers are recounted first, so a patch whose only fault was
+    miscounted line numbers applies without another call. Falls back to a
+    full re-prompt when the patch has no parseable hunks.
+    """
+    first_err = automation.get("apply", {}).get("stderr", "") if isinstance(automation.get("apply"), dict) else ""
+    files = patch_engine.parse_patch(automation.pop("diff", ""))
+    automation.pop("raw_content", None)
+    if not any(section["hunks"] for section in files):
+        return reprompt_codex(task, codex_prompt, automation, app_root, stream)
+
+    runtime.set_stage("repair")
+    responses: list[dict] = []
+    rounds: list[dict] = []
+    limit = patch_repair.rounds()
+    while True:
+        accepted, rejected = patch_repair.triage(files, app_root)
+        if not rejected or len(rounds) >= limit:
+            break
+        response = call_codex(patch_repair.repair_prompt(task, rejected, app_root), task)
+        responses.append(response)
+        parsed = response.get("parsed") if isinstance(response.get("parsed"), dict) else {}
+        content = parsed.get("content") or extract_assistant_content(response.get("body", ""))
+        repaired = patch_engine.parse_patch(model_output.extract_diff(content)) if response.get("ok") else []
+        rounds.append(
+            {
+                "rejected": [f"{e['section']['path']}:{e['hunk']['old_start'] if e['hunk'] else 0}" for e in rejected],
+                "accepted_hunks": len(accepted),
+                "repaired_hunks": sum(len(section["hunks"]) for section in repaired),
+                "ok": bool(response.get("ok")),
+                "elapsed_ms": response.get("elapsed_ms", 0),
+                **({"error": response["error"]} if response.get("error") else {}),
+            }
+        )
+        if not repaired:
+            break
+        files = patch_repair.merge(accepted, rejected, repaired)
+
+    repair = {"first_error": first_err, "rounds": rounds, "rejected_hunks": len(rejected)}
+    if rejected:
+        automation["repair"] = repair
+        automation["error"] = f"Failed to apply generated diff: {len(rejected)} hunk(s) still rejected after repair"
+        return automation, responses
+
+    merged_diff = patch_repair.format_patch(files)
+    repair_path = REPORTS_DIR / f"{task.get('id')}-codex-repaired.diff"
+    repair_path.write_text(merged_diff, encoding="utf-8")
+    repaired_automation = apply_and_check(task, merged_diff, app_root, automation.get("raw_report", ""))
+    repaired_automation["repair"] = {**repair, "diff": str(repair_path.relative_to(CONTROL_ROOT))}
+    return repaired_automation, responses
+
+
 def extract_kimi_content(kimi_response: dict) -> str:
     parsed = kimi_response.get("parsed", {})
     if isinstance(parsed, dict) and isinstance(parsed.get("content"), str):
@@ -384,57 +554,67 @@ def extract_kimi_content(kimi_response: dict) -> str:
     return extract_assistant_content(body)
 
 
-def parse_kimi_file_blocks(text: str) -> list[tuple[str, str]]:
-    blocks: list[tuple[str, str]] = []
-    pattern = re.compile(
-        r"^([A-Za-z0-9_./\-]+\.[A-Za-z0-9]+)[^\n]*\n```[A-Za-z0-9_-]*\n(.*?)\n```",
-        flags=re.MULTILINE | re.DOTALL,
-    )
-
-    for match in pattern.finditer(text):
-        rel_path = match.group(1).strip()
-        code = match.group(2)
-        if rel_path.startswith("/") or ".." in rel_path.split("/"):
-            continue
-        blocks.append((rel_path, code + "\n"))
-
-    return blocks
-
-
-def write_kimi_files(blocks: list[tuple[str, str]], app_root: Path) -> list[str]:
+def write_kimi_files(
+    blocks: list[tuple[str, str]], app_root: Path, originals: dict[str, bytes | None] | None = None
+) -> list[str]:
+    """Write file blocks under ``app_root``; ``originals`` collects each path's prior bytes (None if new)."""
     changed: list[str] = []
     for rel_path, code in blocks:
         target = app_root / rel_path
+        if originals is not None and rel_path not in originals:
+            originals[rel_path] = target.read_bytes() if target.is_file() else None
         target.parent.mkdir(parents=True, exist_ok=True)
         target.write_text(code, encoding="utf-8")
         changed.append(rel_path)
     return changed
 
 
+def restore_files(originals: dict[str, bytes | None], app_root: Path) -> list[str]:
+    """Undo write_kimi_files: put back prior contents and remove files that did not exist."""
+    for rel_path, data in originals.items():
+        target = app_root / rel_path
+        if data is None:
+            target.unlink(missing_ok=True)
+        else:
+            target.write_bytes(data)
+    return sorted(originals)
+
+
 def run_kimi_automation(task: dict, kimi_response: dict, app_root: Path) -> dict:
-    content = extract_kimi_content(kimi_response)
-    if not content:
+    parsed = kimi_response.get("parsed") if isinstance(kimi_response.get("parsed"), dict) else {}
+    streamed = bool(kimi_response.get("transcript")) and "files" in parsed
+    content = "" if streamed else extract_kimi_content(kimi_response)
+    if not streamed and not content:
         return {"ok": False, "error": "No assistant content in Kimi response"}
 
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
     raw_path = REPORTS_DIR / f"{task.get('id')}-kimi-raw.md"
-    raw_path.write_text(content + "\n", encoding="utf-8")
+    if not streamed:
+        raw_path.write_text(content + "\n", encoding="utf-8")
 
-    blocks = parse_kimi_file_blocks(content)
-    if not blocks:
+    blocks = [] if streamed else model_output.parse_file_blocks(content)
+    if not blocks and not (streamed and parsed["files"]):
         return {
             "ok": False,
             "error": "Kimi response does not contain file code blocks",
             "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
         }
 
-    changed = write_kimi_files(blocks, app_root)
-    check_result = maybe_run_checks(task, app_root)
+    runtime.set_stage("apply")
+    if streamed:
+        changed = list(parsed["files"])
+        files_bytes = int(parsed.get("files_bytes") or 0)
+    else:
+        changed = write_kimi_files(blocks, app_root)
+        files_bytes = sum(len(code.encode("utf-8")) for _, code in blocks)
+    runtime.set_stage("checks")
+    check_result = maybe_run_checks(task, app_root, changed)
     if not check_result.get("ok"):
         return {
             "ok": False,
             "error": "Checks failed after writing Kimi files",
             "changed_files": changed,
+            "files_bytes": files_bytes,
             "checks": check_result,
             "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
         }
@@ -444,25 +624,250 @@ def run_kimi_automation(task: dict, kimi_response: dict, app_root: Path) -> dict
         "ok": True,
         "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
         "changed_files": changed,
+        "files_bytes": files_bytes,
         "checks": check_result,
         "status_update": status_result,
     }
 
 
-def run(task_id: str | None, dry_run: bool) -> int:
+def check_diff(diff_text: str, repo_root: Path) -> dict:
+    result = patch_engine.apply_patch(diff_text, repo_root, dry_run=True)
+    return {"ok": result["ok"], "engine": result["engine"], "stderr": result["stderr"]}
+
+
+@contextlib.contextmanager
+def isolated_worktree(repo_root: Path) -> Iterator[Path]:
+    """Detached worktree holding the current working-tree state of repo_root, untracked files included.
+
+    The state is snapshotted as a tree through a throwaway index
+    (check_plan.tree_hash) and checked out with ``read-tree -u``, so a
+    candidate is checked against the same files it will be applied to.
+    """
+    tree = check_plan.tree_hash(repo_root)
+    path = Path(tempfile.mkdtemp(prefix="runner-worktree-"))
+    add = run_cmd(["git", "worktree", "add", "--detach", str(path), "HEAD"], cwd=repo_root)
+    if add.returncode != 0:
+        shutil.rmtree(path, ignore_errors=True)
+        raise RuntimeError(f"git worktree add failed: {add.stderr.strip()}")
+    try:
+        if tree:
+            snapshot = run_cmd(["git", "read-tree", "-u", "--reset", tree], cwd=path)
+            if snapshot.returncode != 0:
+                raise RuntimeError(f"git read-tree failed: {snapshot.stderr.strip()}")
+        yield path
+    finally:
+        run_cmd(["git", "worktree", "remove", "--force", str(path)], cwd=repo_root)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def candidate_count() -> int:
+    try:
+        return max(1, int(runtime.getenv("RUNNER_CANDIDATES", "1")))
+    except ValueError:
+        return 1
+
+
+def candidate_temperatures(count: int) -> list[float]:
+    high = float(runtime.getenv("RUNNER_CANDIDATE_TEMPERATURE", "0.8"))
+    if count == 1:
+        return [0.1]
+    return [round(0.1 + (high - 0.1) * index / (count - 1), 3) for index in range(count)]
+
+
+_CANDIDATE_THREADS: set[threading.Thread] = set()
+ABANDONED_WAIT_SECONDS = 30.0
+
+
+def candidate_summary(index: int, response: dict, apply_check: dict) -> dict:
+    summary = {
+        "index": index,
+        "ok": bool(response.get("ok")),
+        "status": response.get("status", 0),
+        "elapsed_ms": response.get("elapsed_ms", 0),
+        "usage": response.get("usage") or {},
+        "apply_check": apply_check,
+    }
+    if response.get("cached"):
+        summary["cached"] = True
+    if response.get("error"):
+        summary["error"] = response["error"]
+    return summary
+
+
+def bill_abandoned_candidate(task: dict, index: int, response: dict) -> None:
+    """Usage row for a candidate that finished after the run stopped waiting for it."""
+    usage = {} if response.get("cached") else response.get("usage") or {}
+    append_usage(
+        {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "task_id": task.get("id"),
+            "target": "codex",
+            "owner_agent": (task.get("owner_agent") or "").lower(),
+            "ok": bool(response.get("ok")),
+            "status": response.get("status", 0),
+            "dry_run": False,
+            "model": response.get("model", ""),
+            "latency_ms": float(response.get("elapsed_ms") or 0),
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "abandoned_candidate": index,
+        }
+    )
+
+
+def wait_abandoned_candidates(timeout: float = ABANDONED_WAIT_SECONDS) -> None:
+    """Give abandoned candidate requests up to ``timeout`` seconds to finish and bill themselves before exit."""
+    deadline = time.monotonic() + timeout
+    for worker in list(_CANDIDATE_THREADS):
+        worker.join(max(0.0, deadline - time.monotonic()))
+
+
+def run_codex_candidates(task: dict, prompt: str, app_root: Path, count: int) -> dict:
+    """Request ``count`` Codex patches concurrently; the first that applies and passes checks wins.
+
+    Each worker validates its own patch with ``git apply --check`` as soon as
+    its response arrives. Checks run in an isolated worktree so a failing
+    candidate never touches app_root; only the winner is applied there.
+    Requests still in flight when a winner is found are abandoned; each
+    bills itself with its own usage row once it completes.
+    """
+    arrivals: queue.Queue = queue.Queue()
+    cancelled = threading.Event()
+    handoff = threading.Lock()
+
+    def generate(index: int, temperature: float) -> None:
+        response: dict = {"ok": False, "status": 0}
+        content = diff_text = ""
+        apply_check: dict = {"ok": False, "stderr": "candidate not checked"}
+        try:
+            response = call_codex(prompt, task, temperature=temperature)
+            if response.get("ok") and not cancelled.is_set():
+                content = extract_assistant_content(response.get("body", "")) or str(
+                    (response.get("parsed") or {}).get("content") or ""
+                )
+                diff_text = model_output.extract_diff(content)
+                apply_check = check_diff(diff_text, app_root) if diff_text else {"ok": False, "stderr": "no unified diff"}
+        except Exception as exc:  # noqa: BLE001
+            response = {**response, "ok": False, "error": str(exc)}
+        with handoff:
+            abandoned = cancelled.is_set()
+            if not abandoned:
+                arrivals.put((index, response, content, diff_text, apply_check))
+        if abandoned:
+            bill_abandoned_candidate(task, index, response)
+        _CANDIDATE_THREADS.discard(threading.current_thread())
+
+    for index, temperature in enumerate(candidate_temperatures(count)):
+        ctx = contextvars.copy_context()
+        worker = threading.Thread(target=ctx.run, args=(generate, index, temperature), daemon=True)
+        _CANDIDATE_THREADS.add(worker)
+        worker.start()
+
+    summaries: list[dict] = []
+    winner: tuple[int, dict, str, str, dict] | None = None
+    first_response: dict | None = None
+    for _ in range(count):
+        index, response, content, diff_text, apply_check = arrivals.get()
+        first_response = first_response or response
+        summary = candidate_summary(index, response, apply_check)
+        if apply_check["ok"]:
+            if check_command(task):
+                runtime.set_stage("checks")
+                with isolated_worktree(app_root) as worktree:
+                    applied = apply_diff(diff_text, worktree)
+                    checks = maybe_run_checks(task, worktree, applied.get("changed_files"))
+            else:
+                checks = maybe_run_checks(task, app_root)
+            summary["checks_ok"] = bool(checks.get("ok"))
+            if checks.get("ok"):
+                winner = (index, response, content, diff_text, checks)
+                break
+        summaries.append(summary)
+    with handoff:
+        cancelled.set()
+        # Candidates that arrived after the winner was picked are reported and billed, not checked.
+        while not arrivals.empty():
+            index, late, *_ = arrivals.get_nowait()
+            summaries.append(candidate_summary(index, late, {"ok": False, "stderr": "arrived after the winner"}))
+
+    if winner is None:
+        # Every candidate, the first included, is billed from ``candidates``; the top-level usage would count it twice.
+        response = {**(first_response or {"ok": False}), "usage": {}}
+        response["candidates"] = summaries
+        response["automation"] = {"ok": False, "error": "No candidate patch applied and passed checks", "candidates": summaries}
+        return response
+
+    index, response, content, diff_text, checks = winner
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    raw_path = REPORTS_DIR / f"{task.get('id')}-codex-raw.md"
+    raw_path.write_text(content + "\n", encoding="utf-8")
+    runtime.set_stage("apply")
+    apply_result = apply_diff(diff_text, app_root)
+    automation: dict = {
+        "ok": bool(apply_result.get("ok")),
+        "raw_report": str(raw_path.relative_to(CONTROL_ROOT)),
+        "apply": apply_result,
+        "checks": checks,
+        "candidate": index,
+        "candidates": summaries,
+    }
+    if apply_result.get("ok"):
+        automation["status_update"] = set_task_status(str(task.get("id")), "review")
+    else:
+        automation["error"] = "Failed to apply winning candidate diff"
+    response["candidates"] = summaries
+    response["automation"] = automation
+    return response
+
+
+def call_metrics(response: dict) -> dict:
+    calls = [response] + [c for c in response.get("repair_responses") or [] if isinstance(c, dict)]
+    made = calls + [c for c in response.get("candidates") or [] if isinstance(c, dict)]
+    # Cache hits and replays cost nothing; their stored usage is not billed again.
+    billed = [c for c in made if not c.get("cached")]
+    automation = response.get("automation") if isinstance(response.get("automation"), dict) else {}
+    apply_result = automation.get("apply") if isinstance(automation.get("apply"), dict) else {}
+    return {
+        "model": response.get("model", ""),
+        "latency_ms": round(sum(float(c.get("elapsed_ms") or 0) for c in calls), 1),
+        "prompt_tokens": sum(int((c.get("usage") or {}).get("prompt_tokens") or 0) for c in billed),
+        "completion_tokens": sum(int((c.get("usage") or {}).get("completion_tokens") or 0) for c in billed),
+        "retries": len(calls) - 1 + sum(max(int(c.get("attempts") or 1) - 1, 0) for c in calls),
+        "retry_wait_ms": round(sum(float(c.get("retry_wait_ms") or 0) for c in calls), 1),
+        "rate_limit_wait_ms": round(sum(float(c.get("rate_limit_wait_ms") or 0) for c in calls), 1),
+        "diff_bytes": int(apply_result.get("diff_bytes") or automation.get("files_bytes") or 0),
+        **({"cached_calls": len(made) - len(billed)} if len(made) > len(billed) else {}),
+    }
+
+
+def run(task_id: str | None, dry_run: bool, stream: bool = False) -> int:
     load_env_file(CONTROL_ROOT / ".env")
 
     task = read_task(task_id) if task_id else latest_in_progress_task()
-    codex_prompt, kimi_prompt = render_prompts(task)
 
+    runtime.set_stage("repo_sync")
+    app_root, sync_report = sync_target_repo()
+    if sync_report.get("worktree_pool"):
+        runtime.set_stage("lease")
+        with worktree_pool.lease(app_root, sync_report["branch"]) as lease:
+            return run_task(task, Path(lease["path"]), sync_report, dry_run, stream, lease)
+    return run_task(task, app_root, sync_report, dry_run, stream)
+
+
+def run_task(task: dict, app_root: Path, sync_report: dict, dry_run: bool, stream: bool, lease: dict | None = None) -> int:
     owner = (task.get("owner_agent") or "").lower()
     now_iso = datetime.now(timezone.utc).isoformat()
 
-    app_root, sync_report = sync_target_repo()
+    runtime.set_stage("context")
+    context = context_pack.pack(task, CONTROL_ROOT, app_root)
+    codex_prompt, kimi_prompt = render_prompts(task, context["text"])
 
+    runtime.set_stage("generate")
+    stream = (stream or stream_enabled()) and not dry_run
     result: dict
     if owner == "frontend":
-        response = {"ok": True, "dry_run": True} if dry_run else call_kimi(kimi_prompt)
+        kimi_stream = open_stream(task, "kimi", app_root) if stream else None
+        response = {"ok": True, "dry_run": True} if dry_run else call_kimi(kimi_prompt, kimi_stream)
         result = {"target": "kimi", "response": response}
         if not dry_run and result["response"].get("ok"):
             automation = run_kimi_automation(task, result["response"], app_root)
@@ -470,31 +875,31 @@ def run(task_id: str | None, dry_run: bool) -> int:
             if not automation.get("ok"):
                 result["response"]["ok"] = False
     else:
-        response = {"ok": True, "dry_run": True} if dry_run else call_codex(codex_prompt, task)
+        webhook = runtime.getenv("CODEX_DISPATCH_WEBHOOK", "").strip()
+        candidates = candidate_count() if not webhook else 1
+        codex_stream = open_stream(task, "codex", app_root) if stream and not webhook and candidates == 1 else None
+        if dry_run:
+            response = {"ok": True, "dry_run": True}
+        elif candidates > 1:
+            response = run_codex_candidates(task, codex_prompt, app_root, candidates)
+            if not response["automation"].get("ok"):
+                response["ok"] = False
+        else:
+            response = call_codex(codex_prompt, task, codex_stream)
         result = {"target": "codex", "response": response}
 
-    direct_codex = bool(not dry_run and owner != "frontend" and not os.getenv("CODEX_DISPATCH_WEBHOOK", "").strip())
-    if direct_codex and result["response"].get("ok"):
+    direct_codex = bool(not dry_run and owner != "frontend" and not runtime.getenv("CODEX_DISPATCH_WEBHOOK", "").strip())
+    if direct_codex and result["response"].get("ok") and "automation" not in result["response"]:
         automation = run_codex_automation(task, result["response"], app_root)
         if not automation.get("ok") and "raw_content" in automation:
-            first_err = automation.get("apply", {}).get("stderr", "") if isinstance(automation.get("apply"), dict) else ""
-            retry_prompt = (
-                f"{codex_prompt}\n\n"
-                "Your previous patch failed to apply.\n"
-                f"Apply error: {first_err}\n"
-                "Return a corrected unified git diff only in one ```diff fenced block."
-            )
-            retry_response = call_codex(retry_prompt, task)
-            if retry_response.get("ok"):
-                retry_automation = run_codex_automation(task, retry_response, app_root)
-                retry_automation["retried"] = True
-                retry_automation["first_error"] = first_err
-                result["response"]["retry_response"] = retry_response
-                automation = retry_automation
+            automation, repairs = repair_codex_patch(task, codex_prompt, automation, app_root, stream)
+            if repairs:
+                result["response"]["repair_responses"] = repairs
         result["response"]["automation"] = automation
         if not automation.get("ok"):
             result["response"]["ok"] = False
 
+    runtime.set_stage("report")
     report = {
         "timestamp": now_iso,
         "task_id": task.get("id"),
@@ -503,8 +908,16 @@ def run(task_id: str | None, dry_run: bool) -> int:
         "target": result["target"],
         "app_root": str(app_root),
         "repo_sync": sync_report,
+        "context": {k: v for k, v in context.items() if k != "text"},
         "response": result["response"],
     }
+    if lease is not None:
+        exported = worktree_pool.export_diff(lease, REPORTS_DIR / f"{task.get('id')}-worktree.diff")
+        lease["changed_files"] = exported["changed_files"]
+        if "diff_path" in exported:
+            lease["diff"] = str(exported["diff_path"].relative_to(CONTROL_ROOT))
+            lease["diff_bytes"] = exported["diff_bytes"]
+        report["worktree"] = lease
 
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
     report_path = REPORTS_DIR / f"{task.get('id')}-runner.json"
@@ -515,10 +928,14 @@ def run(task_id: str | None, dry_run: bool) -> int:
             "timestamp": now_iso,
             "task_id": task.get("id"),
             "target": result["target"],
+            "owner_agent": owner,
             "ok": bool(result["response"].get("ok")),
             "status": result["response"].get("status", 0),
             "dry_run": dry_run,
             "app_root": str(app_root),
+            **call_metrics(result["response"]),
+            **({"sync_ms": sync_report["timings_ms"]["total"]} if "timings_ms" in sync_report else {}),
+            **({"lease_wait_ms": lease["wait_ms"]} if lease is not None else {}),
         }
     )
 
@@ -528,21 +945,43 @@ def run(task_id: str | None, dry_run: bool) -> int:
     return 0 if result["response"].get("ok") else 1
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Agent runner for Codex/Kimi dispatch")
     parser.add_argument("task_id", nargs="?", help="Task ID (defaults to latest in_progress)")
     parser.add_argument("--dry-run", action="store_true", help="Do not call remote APIs")
-    return parser.parse_args()
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the completion (SSE), parse and apply blocks as they arrive (also RUNNER_STREAM=1)",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        metavar="N",
+        help="Codex: request N patches concurrently, keep the first that applies and passes checks (RUNNER_CANDIDATES)",
+    )
+    parser.add_argument(
+        "--cache",
+        choices=response_cache.MODES,
+        help="LLM response cache mode (default RUNNER_CACHE or off); replay never calls the API",
+    )
+    return parser.parse_args(argv)
 
 
-def main() -> int:
-    args = parse_args()
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
     try:
-        return run(args.task_id, args.dry_run)
+        overrides = {"RUNNER_CACHE": args.cache} if args.cache else {}
+        if args.candidates:
+            overrides["RUNNER_CANDIDATES"] = str(args.candidates)
+        with runtime.env_overrides(overrides):
+            return run(args.task_id, args.dry_run, stream=args.stream)
     except Exception as exc:  # noqa: BLE001
         print(str(exc), file=sys.stderr)
         return 1
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    exit_code = main()
+    wait_abandoned_candidates()
+    raise SystemExit(exit_code)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import threading
+import traceback
+from contextvars import ContextVar
+from typing import Callable, Iterator, TextIO
+
+_ENV_OVERRIDES: ContextVar[dict[str, str] | None] = ContextVar("env_overrides", default=None)
+_STDOUT: ContextVar[TextIO | None] = ContextVar("stdout", default=None)
+_STDERR: ContextVar[TextIO | None] = ContextVar("stderr", default=None)
+_STAGE_HOOK: ContextVar[Callable[[str], None] | None] = ContextVar("stage_hook", default=None)
+_INSTALL_LOCK = threading.Lock()
+
+
+def getenv(key: str, default: str = "") -> str:
+    overrides = _ENV_OVERRIDES.get()
+    if overrides and key in overrides:
+        return overrides[key]
+    return os.environ.get(key, default)
+
+
+def environ() -> dict[str, str]:
+    env = os.environ.copy()
+    env.update(_ENV_OVERRIDES.get() or {})
+    return env
+
+
+@contextlib.contextmanager
+def env_overrides(values: dict[str, str]) -> Iterator[None]:
+    merged = dict(_ENV_OVERRIDES.get() or {})
+    merged.update(values)
+    token = _ENV_OVERRIDES.set(merged)
+    try:
+        yield
+    finally:
+        _ENV_OVERRIDES.reset(token)
+
+
+def set_stage(stage: str) -> None:
+    hook = _STAGE_HOOK.get()
+    if hook is not None:
+        hook(stage)
+
+
+@contextlib.contextmanager
+def stage_hook(hook: Callable[[str], None]) -> Iterator[None]:
+    token = _STAGE_HOOK.set(hook)
+    try:
+        yield
+    finally:
+        _STAGE_HOOK.reset(token)
+
+
+class _ContextStream(io.TextIOBase):
+    def __init__(self, var: ContextVar[TextIO | None], fallback: TextIO) -> None:
+        self._var = var
+        self._fallback = fallback
+
+    def _target(self) -> TextIO:
+        return self._var.get() or self._fallback
+
+    def write(self, s: str) -> int:
+        return self._target().write(s)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return self._target().isatty()
+
+    def fileno(self) -> int:
+        return self._fallback.fileno()
+
+    @property
+    def encoding(self) -> str:  # type: ignore[override]
+        return getattr(self._fallback, "encoding", "utf-8")
+
+
+def install_stream_proxies() -> None:
+    with _INSTALL_LOCK:
+        if not isinstance(sys.stdout, _ContextStream):
+            sys.stdout = _ContextStream(_STDOUT, sys.stdout)
+        if not isinstance(sys.stderr, _ContextStream):
+            sys.stderr = _ContextStream(_STDERR, sys.stderr)
+
+
+def invoke(
+    main: Callable[[list[str]], int],
+    argv: list[str],
+    env: dict[str, str] | None = None,
+    out: TextIO | None = None,
+    err: TextIO | None = None,
+) -> subprocess.CompletedProcess:
+    """Run ``main(argv)`` in-process with its own env overrides and captured output.
+
+    ``out``/``err`` default to StringIO; any stream with ``getvalue`` (such
+    as run_log.TailWriter) can be passed to bound what is kept in memory.
+    """
+    install_stream_proxies()
+    out = out if out is not None else io.StringIO()
+    err = err if err is not None else io.StringIO()
+    out_token = _STDOUT.set(out)
+    err_token = _STDERR.set(err)
+    try:
+        with env_overrides(env or {}):
+            try:
+                returncode = main(argv)
+            except SystemExit as exc:
+                if exc.code is None:
+                    returncode = 0
+                elif isinstance(exc.code, int):
+                    returncode = exc.code
+                else:
+                    print(exc.code, file=err)
+                    returncode = 1
+            except Exception:  # noqa: BLE001
+                traceback.print_exc(file=err)
+                returncode = 1
+    finally:
+        _STDOUT.reset(out_token)
+        _STDERR.reset(err_token)
+    return subprocess.CompletedProcess(argv, returncode or 0, out.getvalue(), err.getvalue())
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import heapq
+import re
+
+DEFAULT_PRIORITY_RANK = 99
+
+
+def priority_rank(priority: object) -> int:
+    match = re.fullmatch(r"[Pp]?(\d+)", str(priority or "").strip())
+    return int(match.group(1)) if match else DEFAULT_PRIORITY_RANK
+
+
+class TaskGraph:
+    def __init__(self, tasks: list[dict]) -> None:
+        self.status: dict[str, str] = {}
+        self.rank: dict[str, int] = {}
+        self.deps: dict[str, list[str]] = {}
+        self.dependents: dict[str, set[str]] = {}
+        self.pending: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+        self._queued: set[str] = set()
+        for task in tasks:
+            task_id = str(task.get("id"))
+            self.status[task_id] = str(task.get("status"))
+            self.rank[task_id] = priority_rank(task.get("priority"))
+            self.deps[task_id] = [str(dep) for dep in task.get("depends_on") or []]
+        for task_id, deps in self.deps.items():
+            for dep in deps:
+                self.dependents.setdefault(dep, set()).add(task_id)
+        for task_id in self.deps:
+            self.pending[task_id] = sum(1 for dep in self.deps[task_id] if self.status.get(dep) != "done")
+            self._maybe_queue(task_id)
+
+    def _is_ready(self, task_id: str) -> bool:
+        return self.status.get(task_id) == "todo" and self.pending.get(task_id, 1) == 0
+
+    def _maybe_queue(self, task_id: str) -> None:
+        if task_id not in self._queued and self._is_ready(task_id):
+            heapq.heappush(self._heap, (self.rank[task_id], task_id))
+            self._queued.add(task_id)
+
+    def _adjust_dependents(self, task_id: str, delta: int) -> None:
+        for child in self.dependents.get(task_id, set()):
+            if child in self.pending:
+                self.pending[child] += delta * self.deps[child].count(task_id)
+                self._maybe_queue(child)
+
+    def remove(self, task_id: str) -> None:
+        if task_id not in self.deps:
+            return
+        if self.status[task_id] == "done":
+            self._adjust_dependents(task_id, 1)
+        for dep in self.deps.pop(task_id):
+            self.dependents.get(dep, set()).discard(task_id)
+        del self.status[task_id], self.rank[task_id], self.pending[task_id]
+        self._queued.discard(task_id)
+
+    def update(self, task: dict) -> None:
+        task_id = str(task.get("id"))
+        deps = [str(dep) for dep in task.get("depends_on") or []]
+        status = str(task.get("status"))
+        if task_id in self.deps and self.deps[task_id] != deps:
+            self.remove(task_id)
+        if task_id not in self.deps:
+            self.status[task_id] = ""
+            self.rank[task_id] = priority_rank(task.get("priority"))
+            self.deps[task_id] = deps
+            for dep in deps:
+                self.dependents.setdefault(dep, set()).add(task_id)
+            self.pending[task_id] = sum(1 for dep in deps if self.status.get(dep) != "done")
+
+        old_status = self.status[task_id]
+        self.status[task_id] = status
+        new_rank = priority_rank(task.get("priority"))
+        if new_rank != self.rank[task_id]:
+            self.rank[task_id] = new_rank
+            self._queued.discard(task_id)
+        if old_status != "done" and status == "done":
+            self._adjust_dependents(task_id, -1)
+        elif old_status == "done" and status != "done":
+            self._adjust_dependents(task_id, 1)
+        self._maybe_queue(task_id)
+
+    def _prune_heap(self) -> None:
+        while self._heap:
+            rank, task_id = self._heap[0]
+            if self.rank.get(task_id) != rank:
+                heapq.heappop(self._heap)
+                if task_id not in self.rank:
+                    self._queued.discard(task_id)
+                continue
+            if task_id in self._queued and self._is_ready(task_id):
+                return
+            heapq.heappop(self._heap)
+            self._queued.discard(task_id)
+
+    def peek_ready(self) -> str | None:
+        self._prune_heap()
+        return self._heap[0][1] if self._heap else None
+
+    def ready(self) -> list[str]:
+        self._prune_heap()
+        return sorted((t for t in self._queued if self._is_ready(t)), key=lambda t: (self.rank[t], t))
+
+    def dangling(self) -> dict[str, list[str]]:
+        return {
+            task_id: missing
+            for task_id, deps in self.deps.items()
+            if (missing := [dep for dep in deps if dep not in self.deps])
+        }
+
+    def cycles(self) -> list[list[str]]:
+        indegree = {task_id: sum(1 for dep in deps if dep in self.deps) for task_id, deps in self.deps.items()}
+        queue = [task_id for task_id, count in indegree.items() if count == 0]
+        while queue:
+            task_id = queue.pop()
+            for child in self.dependents.get(task_id, set()):
+                if child in indegree:
+                    indegree[child] -= self.deps[child].count(task_id)
+                    if indegree[child] == 0:
+                        queue.append(child)
+        remaining = {task_id for task_id, count in indegree.items() if count > 0}
+
+        cycles: list[list[str]] = []
+        seen: set[str] = set()
+        for start in sorted(remaining):
+            if start in seen:
+                continue
+            path: list[str] = []
+            index: dict[str, int] = {}
+            node: str | None = start
+            while node is not None and node not in index and node not in seen:
+                index[node] = len(path)
+                path.append(node)
+                node = next((dep for dep in self.deps[node] if dep in remaining), None)
+            if node is not None and node in index:
+                cycles.append(path[index[node] :])
+            seen.update(path)
+        return cycles
+
+    def errors(self) -> list[str]:
+        errors = [f"{task_id}: unknown depends_on {', '.join(missing)}" for task_id, missing in sorted(self.dangling().items())]
+        errors.extend(f"dependency cycle: {' -> '.join([*cycle, cycle[0]])}" for cycle in self.cycles())
+        return errors
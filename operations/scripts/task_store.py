@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import scheduler
+
+TEMPLATE_NAME = "task-template.json"
+STAT_INTERVAL = float(os.getenv("TASK_STORE_STAT_INTERVAL", "1.0"))
+
+
+def dump_task(task: dict) -> str:
+    return json.dumps(task, indent=2) + "\n"
+
+
+def file_signature(st: os.stat_result) -> tuple[int, int, int]:
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class JsonTaskStore:
+    def __init__(self, tasks_dir: Path) -> None:
+        self.tasks_dir = tasks_dir
+        self.version = 0
+        self._lock = threading.RLock()
+        self._signatures: dict[str, tuple[int, int, int]] = {}
+        self._file_ids: dict[str, str] = {}
+        self._tasks: dict[str, dict] = {}
+        self._by_status: dict[str, list[str]] = {}
+        self._by_owner: dict[str, set[str]] = {}
+        self._dependents: dict[str, set[str]] = {}
+        self._dir_signature: tuple[int, int, int] | None = None
+        self._scanned_at = 0.0
+        self._graph: scheduler.TaskGraph | None = None
+
+    def _index(self, task: dict) -> None:
+        task_id = str(task.get("id"))
+        bisect.insort(self._by_status.setdefault(str(task.get("status")), []), task_id)
+        self._by_owner.setdefault(str(task.get("owner_agent") or "").lower(), set()).add(task_id)
+        for dep in task.get("depends_on") or []:
+            self._dependents.setdefault(str(dep), set()).add(task_id)
+
+    def _unindex(self, task: dict) -> None:
+        task_id = str(task.get("id"))
+        ids = self._by_status.get(str(task.get("status")), [])
+        pos = bisect.bisect_left(ids, task_id)
+        if pos < len(ids) and ids[pos] == task_id:
+            ids.pop(pos)
+        self._by_owner.get(str(task.get("owner_agent") or "").lower(), set()).discard(task_id)
+        for dep in task.get("depends_on") or []:
+            self._dependents.get(str(dep), set()).discard(task_id)
+
+    def _load(self, name: str, task: dict | None) -> None:
+        old_id = self._file_ids.pop(name, None)
+        if old_id is not None and old_id in self._tasks:
+            self._unindex(self._tasks.pop(old_id))
+            if self._graph is not None and (task is None or str(task.get("id")) != old_id):
+                self._graph.remove(old_id)
+        if task is not None:
+            task_id = str(task.get("id"))
+            if task_id in self._tasks:
+                self._unindex(self._tasks[task_id])
+            self._tasks[task_id] = task
+            self._file_ids[name] = task_id
+            self._index(task)
+            if self._graph is not None:
+                self._graph.update(task)
+        self.version += 1
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            try:
+                dir_signature = file_signature(self.tasks_dir.stat())
+            except FileNotFoundError:
+                dir_signature = None
+            fresh = time.monotonic() - self._scanned_at < STAT_INTERVAL
+            if not force and fresh and dir_signature == self._dir_signature:
+                return
+            self._dir_signature = dir_signature
+            self._scanned_at = time.monotonic()
+            seen: set[str] = set()
+            if dir_signature is not None:
+                with os.scandir(self.tasks_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(".json") or entry.name == TEMPLATE_NAME:
+                            continue
+                        seen.add(entry.name)
+                        signature = file_signature(entry.stat())
+                        if self._signatures.get(entry.name) == signature:
+                            continue
+                        task = json.loads(Path(entry.path).read_text(encoding="utf-8"))
+                        self._signatures[entry.name] = signature
+                        self._load(entry.name, task)
+            for name in set(self._signatures) - seen:
+                del self._signatures[name]
+                self._load(name, None)
+
+    def get(self, task_id: str) -> dict | None:
+        with self._lock:
+            self.refresh()
+            task = self._tasks.get(task_id)
+            return copy.deepcopy(task) if task is not None else None
+
+    def all(self) -> list[dict]:
+        with self._lock:
+            self.refresh()
+            return [copy.deepcopy(self._tasks[self._file_ids[name]]) for name in sorted(self._file_ids)]
+
+    def ids(self, status: str | None = None, owner: str | None = None) -> list[str]:
+        with self._lock:
+            self.refresh()
+            ids = list(self._by_status.get(status, [])) if status is not None else sorted(self._tasks)
+            if owner is not None:
+                owned = self._by_owner.get(owner.lower(), set())
+                ids = [task_id for task_id in ids if task_id in owned]
+            return ids
+
+    def latest(self, status: str) -> dict | None:
+        with self._lock:
+            self.refresh()
+            ids = self._by_status.get(status)
+            return copy.deepcopy(self._tasks[ids[-1]]) if ids else None
+
+    def dependents(self, task_id: str) -> set[str]:
+        with self._lock:
+            self.refresh()
+            return set(self._dependents.get(task_id, set()))
+
+    def graph(self) -> scheduler.TaskGraph:
+        with self._lock:
+            self.refresh()
+            if self._graph is None:
+                self._graph = scheduler.TaskGraph(list(self._tasks.values()))
+            return self._graph
+
+    def ready(self) -> list[dict]:
+        with self._lock:
+            return [copy.deepcopy(self._tasks[task_id]) for task_id in self.graph().ready()]
+
+    def first_runnable(self) -> dict | None:
+        with self._lock:
+            task_id = self.graph().peek_ready()
+            return copy.deepcopy(self._tasks[task_id]) if task_id else None
+
+    def put(self, task: dict) -> None:
+        with self._lock:
+            self.tasks_dir.mkdir(parents=True, exist_ok=True)
+            name = f"{task['id']}.json"
+            path = self.tasks_dir / name
+            write_json_file(path, dump_task(task))
+            self._signatures[name] = file_signature(path.stat())
+            self._load(name, copy.deepcopy(task))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner_agent TEXT NOT NULL DEFAULT '',
+    priority TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_owner ON tasks(owner_agent, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority, id);
+CREATE TABLE IF NOT EXISTS task_deps (
+    task_id TEXT NOT NULL,
+    depends_on TEXT NOT NULL,
+    PRIMARY KEY (task_id, depends_on)
+);
+CREATE INDEX IF NOT EXISTS idx_task_deps_depends_on ON task_deps(depends_on);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+class SqliteTaskStore:
+    def __init__(self, db_path: Path, tasks_dir: Path, mirror_json: bool = False) -> None:
+        self.db_path = db_path
+        self.tasks_dir = tasks_dir
+        self.mirror_json = mirror_json
+        self._local = threading.local()
+        self._graph_lock = threading.RLock()
+        self._graph: scheduler.TaskGraph | None = None
+        self._graph_version = -1
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def version(self) -> int:
+        return int(self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+
+    def refresh(self, force: bool = False) -> None:
+        return
+
+    def get(self, task_id: str) -> dict | None:
+        row = self._conn().execute("SELECT body FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self) -> list[dict]:
+        rows = self._conn().execute("SELECT body FROM tasks ORDER BY file_name")
+        return [json.loads(row[0]) for row in rows]
+
+    def ids(self, status: str | None = None, owner: str | None = None) -> list[str]:
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if owner is not None:
+            clauses.append("owner_agent = ?")
+            params.append(owner.lower())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [row[0] for row in self._conn().execute(f"SELECT id FROM tasks{where} ORDER BY id", params)]
+
+    def latest(self, status: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT body FROM tasks WHERE status = ? ORDER BY id DESC LIMIT 1", (status,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def dependents(self, task_id: str) -> set[str]:
+        rows = self._conn().execute("SELECT task_id FROM task_deps WHERE depends_on = ?", (task_id,))
+        return {row[0] for row in rows}
+
+    def graph(self) -> scheduler.TaskGraph:
+        with self._graph_lock:
+            version = self.version
+            if self._graph is None or self._graph_version != version:
+                self._graph = scheduler.TaskGraph(self.all())
+                self._graph_version = version
+            return self._graph
+
+    def ready(self) -> list[dict]:
+        return [task for task_id in self.graph().ready() if (task := self.get(task_id)) is not None]
+
+    def first_runnable(self) -> dict | None:
+        task_id = self.graph().peek_ready()
+        return self.get(task_id) if task_id else None
+
+    def put(self, task: dict, raw: str | None = None, file_name: str | None = None) -> None:
+        body = raw if raw is not None else dump_task(task)
+        task_id = str(task["id"])
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO tasks (id, file_name, status, owner_agent, priority, body, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET file_name = excluded.file_name, status = excluded.status, "
+                "owner_agent = excluded.owner_agent, priority = excluded.priority, body = excluded.body, "
+                "updated_at = excluded.updated_at",
+                (
+                    task_id,
+                    file_name or f"{task_id}.json",
+                    str(task.get("status")),
+                    str(task.get("owner_agent") or "").lower(),
+                    str(task.get("priority") or ""),
+                    body,
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            conn.execute("DELETE FROM task_deps WHERE task_id = ?", (task_id,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO task_deps (task_id, depends_on) VALUES (?, ?)",
+                [(task_id, str(dep)) for dep in task.get("depends_on") or []],
+            )
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            version = int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._graph_lock:
+            if self._graph is not None and self._graph_version == version - 1:
+                self._graph.update(task)
+                self._graph_version = version
+        if self.mirror_json:
+            write_json_file(self.tasks_dir / (file_name or f"{task_id}.json"), body)
+
+    def delete_missing(self, keep_ids: set[str]) -> int:
+        conn = self._conn()
+        stale = [task_id for task_id in self.ids() if task_id not in keep_ids]
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in stale])
+        conn.executemany("DELETE FROM task_deps WHERE task_id = ?", [(task_id,) for task_id in stale])
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        conn.execute("COMMIT")
+        return len(stale)
+
+    def raw_rows(self) -> list[tuple[str, str]]:
+        return list(self._conn().execute("SELECT file_name, body FROM tasks ORDER BY file_name"))
+
+
+TaskStore = JsonTaskStore | SqliteTaskStore
+
+_STORES: dict[Path, TaskStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def default_db_path(tasks_dir: Path) -> Path:
+    raw = os.getenv("TASK_STORE_DB", "").strip()
+    return Path(raw).expanduser() if raw else tasks_dir.parent / "tasks.sqlite3"
+
+
+def get_store(tasks_dir: Path) -> TaskStore:
+    key = tasks_dir.resolve()
+    backend = os.getenv("TASK_STORE_BACKEND", "json").strip().lower() or "json"
+    with _STORES_LOCK:
+        if key not in _STORES:
+            if backend == "sqlite":
+                mirror = os.getenv("TASK_STORE_MIRROR_JSON", "").strip().lower() in {"1", "true", "yes"}
+                _STORES[key] = SqliteTaskStore(default_db_path(key), key, mirror_json=mirror)
+            else:
+                _STORES[key] = JsonTaskStore(key)
+        return _STORES[key]
+
+
+def write_json_file(path: Path, body: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(body, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def import_json(tasks_dir: Path, db_path: Path, prune: bool) -> dict:
+    store = SqliteTaskStore(db_path, tasks_dir)
+    imported: set[str] = set()
+    for path in sorted(p for p in tasks_dir.glob("*.json") if p.name != TEMPLATE_NAME):
+        raw = path.read_text(encoding="utf-8")
+        task = json.loads(raw)
+        store.put(task, raw=raw, file_name=path.name)
+        imported.add(str(task["id"]))
+    pruned = store.delete_missing(imported) if prune else 0
+    return {"ok": True, "imported": len(imported), "pruned": pruned, "db": str(db_path)}
+
+
+def export_json(tasks_dir: Path, db_path: Path) -> dict:
+    store = SqliteTaskStore(db_path, tasks_dir)
+    rows = store.raw_rows()
+    for file_name, body in rows:
+        write_json_file(tasks_dir / file_name, body)
+    return {"ok": True, "exported": len(rows), "tasks_dir": str(tasks_dir)}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    tasks_dir = Path(__file__).resolve().parents[2] / "operations" / "hub" / "tasks"
+    parser = argparse.ArgumentParser(description="Task board storage (JSON files <-> SQLite)")
+    parser.add_argument("command", choices=["import", "export"], help="import JSON files into SQLite or export back")
+    parser.add_argument("--tasks-dir", type=Path, default=tasks_dir, help="JSON task directory")
+    parser.add_argument("--db", type=Path, default=None, help="SQLite path (default: TASK_STORE_DB or hub/tasks.sqlite3)")
+    parser.add_argument("--prune", action="store_true", help="On import, delete DB tasks that have no JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    db_path = args.db or default_db_path(args.tasks_dir)
+    if args.command == "import":
+        result = import_json(args.tasks_dir, db_path, prune=args.prune)
+    else:
+        result = export_json(args.tasks_dir, db_path)
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
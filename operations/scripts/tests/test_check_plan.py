@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import check_plan
+
+PASSED = {"ok": True, "command": "pytest -q", "returncode": 0, "stdout": "1 passed", "stderr": "", "elapsed_ms": 5.0}
+FAILED = {**PASSED, "ok": False, "returncode": 1, "stdout": "1 failed"}
+
+
+@pytest.fixture(autouse=True)
+def result_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "check-results.json"
+    monkeypatch.setenv("CHECK_RESULT_CACHE", str(path))
+    monkeypatch.setenv("IMPORT_GRAPH_CACHE", str(tmp_path / "import-graph.json"))
+    monkeypatch.delenv("RUNNER_CHECK_CACHE", raising=False)
+    return path
+
+
+def stats(capsys: pytest.CaptureFixture) -> dict:
+    assert check_plan.main(["stats"]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+def test_failures_are_not_cached(capsys: pytest.CaptureFixture) -> None:
+    check_plan.store("tree", "pytest -q", FAILED)
+    assert check_plan.lookup("tree", "pytest -q", "pytest -q") is None
+    assert stats(capsys)["entries"] == 0
+
+    check_plan.store("tree", "pytest -q", PASSED)
+    assert check_plan.lookup("tree", "pytest -q", "pytest -q")["stdout"] == "1 passed"
+    assert stats(capsys) | {"path": ""} == {"path": "", "entries": 1, "passed": 1, "failed": 0}
+
+
+def test_failure_left_by_an_older_cache_is_rerun(result_cache: Path) -> None:
+    result_cache.write_text(json.dumps({check_plan.cache_key("pytest -q a", "tree"): FAILED}), encoding="utf-8")
+    assert check_plan.lookup("tree", "pytest -q a", "pytest -q") is None
+
+
+def test_passing_full_run_answers_a_selected_run() -> None:
+    check_plan.store("tree", "pytest -q", PASSED)
+    assert check_plan.lookup("tree", "pytest -q tests/test_a.py", "pytest -q")["ok"]
+
+
+def test_clear_removes_both_caches(result_cache: Path, capsys: pytest.CaptureFixture) -> None:
+    check_plan.store("tree", "pytest -q", PASSED)
+    assert check_plan.main(["clear"]) == 0
+    assert not result_cache.exists()
@@ -0,0 +1,34 @@
+import subprocess
+from pathlib import Path
+
+import patch_engine
+
+ORIGINAL = "".join(f"{n}\n" for n in range(1, 7))
+INSERTS_U0 = """\
+diff --git a/f.txt b/f.txt
+--- a/f.txt
++++ b/f.txt
+@@ -1,0 +2 @@ 1
++after1
+@@ -3,0 +5 @@ 3
++after3
+@@ -5,0 +8 @@ 5
++after5
+"""
+EXPECTED = "1\nafter1\n2\n3\nafter3\n4\n5\nafter5\n6\n"
+
+
+def test_zero_context_insertions_keep_their_lines(tmp_path: Path) -> None:
+    (tmp_path / "f.txt").write_text(ORIGINAL, encoding="utf-8")
+    [result] = patch_engine.plan(patch_engine.parse_patch(INSERTS_U0), tmp_path)
+    assert result["ok"]
+    assert result["content"] == EXPECTED
+    assert [hunk["offset"] for hunk in result["hunks"]] == [0, 0, 0]
+
+
+def test_zero_context_insertions_match_git_apply(tmp_path: Path) -> None:
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    (tmp_path / "f.txt").write_text(ORIGINAL, encoding="utf-8")
+    (tmp_path / "f.patch").write_text(INSERTS_U0, encoding="utf-8")
+    subprocess.run(["git", "apply", "--unidiff-zero", "f.patch"], cwd=tmp_path, check=True)
+    assert (tmp_path / "f.txt").read_text(encoding="utf-8") == EXPECTED
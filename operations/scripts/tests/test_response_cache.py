@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import completion_stream
+import http_client
+import model_output
+import runner
+
+DIFF = "--- a/f.txt\n+++ b/f.txt\n@@ -1 +1 @@\n-old\n+new\n"
+
+
+@pytest.fixture
+def streamed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    for key, value in {
+        "RUNNER_CACHE": "readwrite",
+        "LLM_CACHE_DIR": str(tmp_path / "cache"),
+        "RATE_LIMIT_DB": str(tmp_path / "rate.db"),
+        "CIRCUIT_STATE_DIR": str(tmp_path / "circuits"),
+        "OPENAI_API_KEY": "test",
+        "KIMI_API_KEY": "test",
+    }.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.delenv("CODEX_DISPATCH_WEBHOOK", raising=False)
+    monkeypatch.setattr(runner, "CONTROL_ROOT", tmp_path)
+    monkeypatch.setattr(runner, "REPORTS_DIR", tmp_path / "reports")
+    calls: list[str] = []
+
+    def serve(text: str) -> None:
+        def post_sse(url, payload, on_data, headers=None, **kwargs):
+            calls.append(url)
+            for start in range(0, len(text), 7):
+                on_data(json.dumps({"choices": [{"delta": {"content": text[start : start + 7]}}]}))
+            return {"ok": True, "status": 200, "body": ""}
+
+        monkeypatch.setattr(http_client, "post_sse", post_sse)
+
+    return serve, calls
+
+
+def stream_for(target: str, app_root: Path) -> completion_stream.StreamCollector:
+    return runner.open_stream({"id": "T-1"}, target, app_root)
+
+
+def test_streamed_codex_reply_replays_from_cache(streamed, tmp_path: Path) -> None:
+    serve, calls = streamed
+    reply = f"Here it is.\n```diff\n{DIFF}```\n"
+    serve(reply)
+    first = runner.call_codex("prompt", {"id": "T-1"}, stream_for("codex", tmp_path))
+    assert first["ok"] and first["cache"]["stored"]
+
+    replayed = runner.call_codex("prompt", {"id": "T-1"})
+    assert len(calls) == 1
+    assert replayed["cached"]
+    assert replayed["parsed"]["content"] == reply
+    assert model_output.extract_diff(replayed["parsed"]["content"]) == first["parsed"]["diff"]
+
+
+def test_streamed_kimi_reply_replays_its_file_blocks(streamed, tmp_path: Path) -> None:
+    serve, calls = streamed
+    app_root = tmp_path / "app"
+    serve("src/a.tsx\n```tsx\nexport const a = 1;\n```\n")
+    first = runner.call_kimi("prompt", stream_for("kimi", app_root))
+    assert first["ok"] and first["parsed"]["files"] == ["src/a.tsx"]
+
+    replayed = runner.call_kimi("prompt")
+    assert len(calls) == 1
+    assert model_output.parse_file_blocks(runner.extract_kimi_content(replayed)) == [
+        ("src/a.tsx", "export const a = 1;\n")
+    ]
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+REPORTS_DIR = Path(__file__).resolve().parents[2] / "deliverables" / "reports"
+MAX_SEGMENT_BYTES = int(os.getenv("USAGE_LOG_MAX_BYTES", str(8 * 1024 * 1024)))
+SEGMENT_RE = re.compile(r"^usage-(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.jsonl$")
+LEGACY_RE = re.compile(r"^usage-(\d{4}-\d{2}-\d{2})\.json$")
+DEFAULT_PRICING = "gpt-4.1-mini=0.40:1.60,kimi-k2.5=0.60:2.50"
+LATENCY_BUCKET_BASE = 1.05
+
+
+def entry_day(entry: dict) -> str:
+    raw = str(entry.get("timestamp") or "")
+    try:
+        return datetime.fromisoformat(raw).astimezone(timezone.utc).date().isoformat()
+    except ValueError:
+        return datetime.now(timezone.utc).date().isoformat()
+
+
+def segment_path(reports_dir: Path, day: str, index: int = 0) -> Path:
+    return reports_dir / (f"usage-{day}.jsonl" if index == 0 else f"usage-{day}.{index}.jsonl")
+
+
+def rollup_path(reports_dir: Path, day: str) -> Path:
+    return reports_dir / f"usage-rollup-{day}.json"
+
+
+def segments(reports_dir: Path, day: str) -> list[Path]:
+    found: list[tuple[int, Path]] = []
+    for path in reports_dir.glob(f"usage-{day}*.jsonl"):
+        match = SEGMENT_RE.match(path.name)
+        if match and match.group(1) == day:
+            found.append((int(match.group(2) or 0), path))
+    return [path for _, path in sorted(found)]
+
+
+def append(entry: dict, reports_dir: Path = REPORTS_DIR) -> Path:
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    day = entry_day(entry)
+    line = (json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+    lock_path = reports_dir / ".usage.lock"
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            existing = segments(reports_dir, day)
+            path = existing[-1] if existing else segment_path(reports_dir, day)
+            if MAX_SEGMENT_BYTES > 0 and path.exists() and path.stat().st_size + len(line) > MAX_SEGMENT_BYTES:
+                path = segment_path(reports_dir, day, len(existing))
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return path
+
+
+def read_lines(path: Path, offset: int = 0) -> Iterator[tuple[dict, int]]:
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        position = offset
+        for raw in fh:
+            if not raw.endswith(b"\n"):
+                break
+            position += len(raw)
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                yield entry, position
+
+
+def iter_entries(reports_dir: Path = REPORTS_DIR, day: str | None = None) -> Iterator[dict]:
+    for current in [day] if day else days(reports_dir):
+        legacy = reports_dir / f"usage-{current}.json"
+        if legacy.exists():
+            try:
+                entries = json.loads(legacy.read_text(encoding="utf-8"))
+            except ValueError:
+                entries = []
+            yield from (e for e in entries if isinstance(e, dict))
+        for path in segments(reports_dir, current):
+            yield from (entry for entry, _ in read_lines(path))
+
+
+def days(reports_dir: Path = REPORTS_DIR) -> list[str]:
+    found: set[str] = set()
+    for path in reports_dir.glob("usage-*.json*"):
+        match = SEGMENT_RE.match(path.name) or LEGACY_RE.match(path.name)
+        if match:
+            found.add(match.group(1))
+    return sorted(found)
+
+
+def empty_rollup(day: str) -> dict:
+    return {
+        "day": day,
+        "calls": 0,
+        "ok": 0,
+        "fail": 0,
+        "dry_run": 0,
+        "targets": {},
+        "groups": {},
+        "offsets": {},
+        "legacy": False,
+    }
+
+
+def empty_group() -> dict:
+    return {"calls": 0, "ok": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0, "diff_bytes": 0, "latency": {}}
+
+
+def add_to_rollup(rollup: dict, entry: dict) -> None:
+    ok = bool(entry.get("ok"))
+    rollup["calls"] += 1
+    rollup["ok" if ok else "fail"] += 1
+    rollup["dry_run"] += 1 if entry.get("dry_run") else 0
+    target = rollup["targets"].setdefault(
+        str(entry.get("target") or "unknown"), {"calls": 0, "ok": 0, "fail": 0, "status": {}}
+    )
+    target["calls"] += 1
+    target["ok" if ok else "fail"] += 1
+    status = str(entry.get("status", 0))
+    target["status"][status] = target["status"].get(status, 0) + 1
+    if entry.get("dry_run"):
+        return
+
+    # Report groups (model -> agent): the sums and latency buckets the usage report is built from.
+    model = str(entry.get("model") or entry.get("target") or "unknown")
+    group = rollup["groups"].setdefault(model, {}).setdefault(str(entry.get("owner_agent") or "unknown"), empty_group())
+    group["calls"] += 1
+    group["ok"] += 1 if ok else 0
+    for field in ("retries", "prompt_tokens", "completion_tokens", "diff_bytes"):
+        group[field] += int(entry.get(field) or 0)
+    if entry.get("latency_ms"):
+        ms = float(entry["latency_ms"])
+        buckets = group["latency"].setdefault("buckets", {})
+        bucket = str(latency_bucket(ms))
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        group["latency"]["max"] = max(float(group["latency"].get("max") or 0.0), ms)
+
+
+def load_rollup(reports_dir: Path, day: str) -> dict:
+    """Stored rollup for ``day``; one written before report groups existed is rebuilt from scratch."""
+    path = rollup_path(reports_dir, day)
+    if path.exists():
+        try:
+            rollup = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            rollup = None
+        if isinstance(rollup, dict) and "groups" in rollup:
+            return rollup
+    return empty_rollup(day)
+
+
+def compact(reports_dir: Path, day: str) -> dict:
+    rollup = load_rollup(reports_dir, day)
+    legacy = reports_dir / f"usage-{day}.json"
+    if legacy.exists() and not rollup.get("legacy"):
+        try:
+            entries = json.loads(legacy.read_text(encoding="utf-8"))
+        except ValueError:
+            entries = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                add_to_rollup(rollup, entry)
+        rollup["legacy"] = True
+
+    for path in segments(reports_dir, day):
+        offset = int(rollup["offsets"].get(path.name, 0))
+        if offset >= path.stat().st_size:
+            continue
+        for entry, position in read_lines(path, offset):
+            add_to_rollup(rollup, entry)
+            offset = position
+        rollup["offsets"][path.name] = offset
+
+    rollup["generated_at"] = datetime.now(timezone.utc).isoformat()
+    path = rollup_path(reports_dir, day)
+    # Server threads compact in-process, so the pid alone does not make the temp file private.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(rollup, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    return rollup
+
+
+def load_pricing() -> dict[str, tuple[float, float]]:
+    pricing: dict[str, tuple[float, float]] = {}
+    for item in os.getenv("USAGE_PRICING", DEFAULT_PRICING).split(","):
+        model, _, prices = item.partition("=")
+        prompt_price, _, completion_price = prices.partition(":")
+        try:
+            pricing[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+        except ValueError:
+            continue
+    return pricing
+
+
+def latency_bucket(ms: float) -> int:
+    return int(math.log(max(ms, 1.0), LATENCY_BUCKET_BASE))
+
+
+class LatencyHistogram:
+    def __init__(self) -> None:
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        """Histogram from the ``{"buckets": {...}, "max": ms}`` form stored in rollup groups."""
+        histogram = cls()
+        for bucket, count in (data.get("buckets") or {}).items():
+            histogram.buckets[int(bucket)] = int(count)
+            histogram.count += int(count)
+        histogram.max = float(data.get("max") or 0.0)
+        return histogram
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return round(min(LATENCY_BUCKET_BASE ** (bucket + 0.5), self.max), 1)
+        return round(self.max, 1)
+
+
+def aggregate(reports_dir: Path = REPORTS_DIR, since: str | None = None, until: str | None = None) -> list[dict]:
+    """Report rows per day/model/agent, built from the daily rollups.
+
+    ``compact`` brings each rollup up to date first, which reads only the
+    entries past its stored offsets, so raw entries are never rescanned.
+    """
+    pricing = load_pricing()
+    rows: list[dict] = []
+    for day in days(reports_dir):
+        if (since and day < since) or (until and day > until):
+            continue
+        rollup = compact(reports_dir, day)
+        for model, agents in sorted(rollup["groups"].items()):
+            for agent, stored in sorted(agents.items()):
+                group = {key: value for key, value in stored.items() if key != "latency"}
+                latency = LatencyHistogram.from_dict(stored.get("latency") or {})
+                prompt_price, completion_price = pricing.get(model, (0.0, 0.0))
+                cost = (group["prompt_tokens"] * prompt_price + group["completion_tokens"] * completion_price) / 1_000_000
+                rows.append(
+                    {
+                        "day": day,
+                        "model": model,
+                        "agent": agent,
+                        **group,
+                        "p50_ms": latency.quantile(0.50),
+                        "p95_ms": latency.quantile(0.95),
+                        "est_cost_usd": round(cost, 4),
+                    }
+                )
+    return rows
+
+
+def format_report(rows: list[dict]) -> str:
+    if not rows:
+        return "No usage data found."
+    header = f"{'day':10} | {'model':16} | {'agent':10} | calls |   ok | retry |  p50 ms |  p95 ms | tokens in/out   | est $"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        tokens = f"{r['prompt_tokens']}/{r['completion_tokens']}"
+        lines.append(
+            f"{r['day']:10} | {r['model'][:16]:16} | {r['agent'][:10]:10} | {r['calls']:5} | {r['ok']:4} | "
+            f"{r['retries']:5} | {r['p50_ms']:7} | {r['p95_ms']:7} | {tokens:15} | {r['est_cost_usd']:.4f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Usage log maintenance (JSONL segments and daily rollups)")
+    parser.add_argument(
+        "command",
+        choices=["compact", "rollup", "report"],
+        help="compact: update rollups, rollup: print one, report: latency/token/cost per model/agent/day",
+    )
+    parser.add_argument("--day", help="UTC day (YYYY-MM-DD); compact defaults to every day with usage data")
+    parser.add_argument("--since", help="report: first UTC day to include")
+    parser.add_argument("--until", help="report: last UTC day to include")
+    parser.add_argument("--json", action="store_true", help="report: print JSON rows")
+    parser.add_argument("--reports-dir", type=Path, default=REPORTS_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.command == "report":
+        rows = aggregate(args.reports_dir, since=args.since, until=args.until)
+        print(json.dumps(rows, indent=2) if args.json else format_report(rows))
+        return 0
+    if args.command == "rollup":
+        day = args.day or datetime.now(timezone.utc).date().isoformat()
+        print(json.dumps(load_rollup(args.reports_dir, day), indent=2))
+        return 0
+
+    for day in [args.day] if args.day else days(args.reports_dir):
+        rollup = compact(args.reports_dir, day)
+        print(f"{day}: {rollup['calls']} calls ({rollup['ok']} ok, {rollup['fail']} fail)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
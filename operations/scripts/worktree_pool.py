@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import json
+import subprocess
+import time
+from pathlib import Path
+from typing import Iterator, TextIO
+
+import runtime
+
+DEFAULT_WAIT_SECONDS = 600.0
+POLL_SECONDS = 0.2
+
+
+def pool_size() -> int:
+    try:
+        return max(0, int(runtime.getenv("RUNNER_WORKTREE_POOL", "0") or 0))
+    except ValueError:
+        return 0
+
+
+def wait_limit() -> float:
+    try:
+        return float(runtime.getenv("RUNNER_WORKTREE_WAIT", str(DEFAULT_WAIT_SECONDS)))
+    except ValueError:
+        return DEFAULT_WAIT_SECONDS
+
+
+def pool_dir(base: Path) -> Path:
+    """RUNNER_WORKTREE_DIR, or ``<TARGET_DIR>-worktrees`` next to the target checkout."""
+    value = runtime.getenv("RUNNER_WORKTREE_DIR", "").strip()
+    return Path(value).expanduser() if value else base.with_name(f"{base.name}-worktrees")
+
+
+def _git(args: list[str], cwd: Path) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, text=True, capture_output=True, check=False)
+
+
+def resolve_tip(base: Path, branch: str) -> str:
+    """Commit the pool tracks: ``origin/<branch>`` when fetched, else the local branch, else HEAD."""
+    for ref in (f"refs/remotes/origin/{branch}", f"refs/heads/{branch}", "HEAD"):
+        proc = _git(["rev-parse", "--verify", "-q", f"{ref}^{{commit}}"], base)
+        if proc.returncode == 0 and proc.stdout.strip():
+            return proc.stdout.strip()
+    return ""
+
+
+def slot_path(base: Path, slot: int) -> Path:
+    return pool_dir(base) / f"wt-{slot}"
+
+
+def _try_lock(path: Path) -> TextIO | None:
+    fh = open(path, "a+")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        return None
+    return fh
+
+
+def _valid(path: Path) -> bool:
+    return (path / ".git").is_file() and _git(["rev-parse", "--is-inside-work-tree"], path).returncode == 0
+
+
+def prepare(base: Path, path: Path, tip: str) -> bool:
+    """Point a slot at ``tip`` with a clean tree, creating the worktree if needed; returns True when created.
+
+    Ignored files (dependency folders, build caches) are kept, which is
+    what makes a reused slot warm.
+    """
+    if _valid(path):
+        checkout = _git(["checkout", "-q", "--detach", "-f", tip], path)
+        if checkout.returncode != 0:
+            raise RuntimeError(f"worktree checkout failed: {checkout.stderr.strip()}")
+        _git(["clean", "-fdq"], path)
+        return False
+    _git(["worktree", "prune"], base)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    add = _git(["worktree", "add", "-f", "--detach", str(path), tip], base)
+    if add.returncode != 0:
+        raise RuntimeError(f"git worktree add failed: {add.stderr.strip()}")
+    return True
+
+
+def reset(path: Path) -> None:
+    """Cheap release: drop tracked changes and untracked files, keep ignored ones."""
+    _git(["reset", "-q", "--hard"], path)
+    _git(["clean", "-fdq"], path)
+
+
+@contextlib.contextmanager
+def lease(base: Path, branch: str, size: int | None = None) -> Iterator[dict]:
+    """Hold one pool slot for the duration of a run.
+
+    Slots are guarded by flock on ``wt-<n>.lock`` so concurrent runners
+    (threads or processes) never share a worktree, and a crashed holder
+    frees its slot automatically. Waits up to RUNNER_WORKTREE_WAIT seconds
+    for a free slot. The yielded dict has slot, path, tip and timings
+    (``wait_ms``, ``prepare_ms``); the slot is reset on release.
+    """
+    size = size or pool_size()
+    root = pool_dir(base)
+    root.mkdir(parents=True, exist_ok=True)
+    tip = resolve_tip(base, branch)
+    if not tip:
+        raise RuntimeError(f"cannot resolve {branch} in {base}")
+    started = time.monotonic()
+    limit = wait_limit()
+    handle = None
+    slot = -1
+    while handle is None:
+        for candidate in range(size):
+            handle = _try_lock(root / f"wt-{candidate}.lock")
+            if handle is not None:
+                slot = candidate
+                break
+        if handle is None:
+            if time.monotonic() - started >= limit:
+                raise RuntimeError(f"no free worktree in {root} after {limit:.0f}s ({size} slots busy)")
+            time.sleep(POLL_SECONDS)
+    try:
+        waited = time.monotonic()
+        path = slot_path(base, slot)
+        created = prepare(base, path, tip)
+        info = {
+            "slot": slot,
+            "path": str(path),
+            "tip": tip,
+            "branch": branch,
+            "created": created,
+            "wait_ms": round((waited - started) * 1000, 1),
+            "prepare_ms": round((time.monotonic() - waited) * 1000, 1),
+        }
+        try:
+            yield info
+        finally:
+            reset(path)
+    finally:
+        handle.close()
+
+
+def export_diff(info: dict, out_path: Path) -> dict:
+    """Write everything the run changed in the leased worktree (against the tip) as a binary-safe patch."""
+    path = Path(info["path"])
+    _git(["add", "-A"], path)
+    names = _git(["diff", "--cached", "--name-only", info["tip"]], path).stdout.splitlines()
+    if not names:
+        return {"changed_files": []}
+    diff = subprocess.run(["git", "diff", "--cached", "--binary", info["tip"]], cwd=path, capture_output=True, check=False).stdout
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(diff)
+    return {"changed_files": names, "diff_bytes": len(diff), "diff_path": out_path}
+
+
+def status(base: Path) -> list[dict]:
+    rows = []
+    for slot in range(pool_size()):
+        path = slot_path(base, slot)
+        lock = pool_dir(base) / f"wt-{slot}.lock"
+        handle = _try_lock(lock) if lock.exists() else None
+        row = {"slot": slot, "path": str(path), "exists": _valid(path), "leased": lock.exists() and handle is None}
+        if handle is not None:
+            handle.close()
+        if row["exists"]:
+            row["head"] = _git(["rev-parse", "--short", "HEAD"], path).stdout.strip()
+            row["dirty"] = bool(_git(["status", "--porcelain"], path).stdout.strip())
+        rows.append(row)
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage the pre-created worktree pool of the target repo")
+    parser.add_argument("command", choices=["status", "warm"], help="status: show slots; warm: create missing slots at the branch tip")
+    parser.add_argument("--target-dir", default=runtime.getenv("TARGET_DIR", ""), help="Target checkout (default TARGET_DIR)")
+    parser.add_argument("--branch", default=runtime.getenv("TARGET_BRANCH", "main") or "main", help="Branch (default TARGET_BRANCH)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.target_dir or not pool_size():
+        print(json.dumps({"ok": False, "error": "TARGET_DIR and RUNNER_WORKTREE_POOL must be set"}))
+        return 1
+    base = Path(args.target_dir).expanduser()
+    if args.command == "warm":
+        tip = resolve_tip(base, args.branch)
+        pool_dir(base).mkdir(parents=True, exist_ok=True)
+        for slot in range(pool_size()):
+            handle = _try_lock(pool_dir(base) / f"wt-{slot}.lock")
+            if handle is None:
+                continue
+            try:
+                prepare(base, slot_path(base, slot), tip)
+            finally:
+                handle.close()
+    print(json.dumps({"ok": True, "dir": str(pool_dir(base)), "slots": status(base)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())